@@ -1,6 +1,70 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
+import os
+import sys
+
+# func package of HSCI Simulation for the notebook in Output Files
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from func import returnIndex
+from func import outputStore
+from func import performanceCube
+from func import selectionIndex
+from func import segmentKernels
+
+def get_pyplot():
+    # matplotlib is imported with the first chart, summaries and cube slices work without it
+    import matplotlib.pyplot as plt
+    return plt
+
+# trade df and backtest df written with output_format parquet, typed and filtered while reading
+# e.g. trade_filters=[("review_type", "==", "Regular")] only reads the backtest rows of Regular trades
+def read_parquet_output_files(trade_file_path, backtest_file_path, trade_filters=None, backtest_columns=None):
+    trade_dataset_path = outputStore.get_dataset_path(trade_file_path)
+    trade_df = outputStore.read_dataset(trade_dataset_path, filters=trade_filters)
+    backtest_df = outputStore.read_backtest_dataset(trade_dataset_path=trade_dataset_path,
+                                                    backtest_dataset_path=outputStore.get_dataset_path(
+                                                        backtest_file_path),
+                                                    columns=backtest_columns, trade_filters=trade_filters)
+    return trade_df, backtest_df
+
+# prefix return index of a backtest df, built once and passed to get_hindsight_backtest_df
+def get_return_index(backtest_df):
+    return returnIndex.return_index(backtest_df=backtest_df)
+
+# trade ids and backtest rows of every review type, change and ipo_only of one loaded dataset, built once,
+# passed to the functions as selection_index so they take rows instead of masking and memoize their results
+def get_selection_index(backtest_df, trade_df, cache_size=64):
+    return selectionIndex.selection_index(backtest_df=backtest_df, trade_df=trade_df, cache_size=cache_size)
+
+def get_selection_backtest_df(backtest_df, trade_df, review_type, change, ipo_only=False, selection_index=None):
+    if selection_index is not None:
+        return selection_index.get_backtest_df(review_type=review_type, change=change, ipo_only=ipo_only)
+    if not ipo_only:
+        this_id_list = list(trade_df[(trade_df["review_type"] == review_type) &
+                                     (trade_df["change"] == change)]["trade_id"])
+    else:
+        this_id_list = list(trade_df[(trade_df["review_type"] == review_type) &
+                                     (trade_df["change"] == change) &
+                                     (trade_df["ipo_date"].isnull() == False) &
+                                     (trade_df["ipo_return"] != 0)]["trade_id"])
+    return backtest_df[backtest_df["trade_id"].isin(this_id_list)]
+
+# mean / median / count per date_index of every review type, change, ipo_only and group, built once,
+# passed to the charts as performance_cube so each chart is a slice of it
+def get_performance_cube(backtest_df, trade_df, group_by_list=("year", "month", "year_month", "sector")):
+    return performanceCube.get_performance_cube(backtest_df=backtest_df, trade_df=trade_df,
+                                                group_by_list=list(group_by_list))
+
+def read_performance_cube(cube_file_path):
+    return performanceCube.read_performance_cube(cube_file_path)
+
+def get_cube_performance_df(performance_cube, review_type, change, ipo_only, group_by="all"):
+    cube_slice = performanceCube.get_cube_slice(cube_df=performance_cube, review_type=review_type, change=change,
+                                                ipo_only=ipo_only, group_by=group_by)
+    return cube_slice.rename(columns={"long_short_return_mean": "long_short_return",
+                                      "stock_return_mean": "stock_return",
+                                      "fund_return_mean": "fund_return",
+                                      "count": "trade_id"})
 
 # Count Summary
 def get_count_summary(trade_df):
@@ -40,29 +104,39 @@ def align_yaxis(ax1, ax2):
     axes[1].set_ylim(t_new_b, extrema[1][1])
 
 # Aggregate Performance Chart
-def get_aggregate_performance_chart(backtest_df, trade_df, review_type, change, flip_side=False, ipo_only=False):
-    if not ipo_only:
-        this_id_list = list(trade_df[(trade_df["review_type"] == review_type) &
-                                     (trade_df["change"] == change)]["trade_id"])
-        ipo_string = ""
+def get_aggregate_performance_df(backtest_df, trade_df, review_type, change, ipo_only=False, selection_index=None):
+    def get_agg_performance_df():
+        this_backtest_df = get_selection_backtest_df(backtest_df=backtest_df, trade_df=trade_df,
+                                                     review_type=review_type, change=change, ipo_only=ipo_only,
+                                                     selection_index=selection_index)
+        return this_backtest_df.groupby(["date_index"]).agg({"long_short_return": "mean",
+                                                             "stock_return": "mean",
+                                                             "fund_return": "mean",
+                                                             "trade_id": "count"}).reset_index()
+
+    if selection_index is None:
+        return get_agg_performance_df()
+    return selection_index.get_result(("aggregate_performance", review_type, change, ipo_only),
+                                      get_agg_performance_df)
+
+def get_aggregate_performance_chart(backtest_df, trade_df, review_type, change, flip_side=False, ipo_only=False,
+                                    performance_cube=None, selection_index=None):
+    ipo_string = "" if not ipo_only else " (IPO Only)"
+    if performance_cube is not None:
+        agg_performance_df = get_cube_performance_df(performance_cube=performance_cube, review_type=review_type,
+                                                     change=change, ipo_only=ipo_only)
+        agg_performance_df = agg_performance_df[["long_short_return", "stock_return", "fund_return",
+                                                 "trade_id"]].reset_index()
     else:
-        this_id_list = list(trade_df[(trade_df["review_type"] == review_type) &
-                                     (trade_df["change"] == change) &
-                                     (trade_df["ipo_date"].isnull() == False) &
-                                     (trade_df["ipo_return"] != 0)]["trade_id"])
-        ipo_string = " (IPO Only)"
-
-    this_backtest_df = backtest_df[backtest_df["trade_id"].isin(this_id_list)].copy()
+        agg_performance_df = get_aggregate_performance_df(backtest_df=backtest_df, trade_df=trade_df,
+                                                          review_type=review_type, change=change, ipo_only=ipo_only,
+                                                          selection_index=selection_index)
 
     # chart
-    fig = plt.figure(figsize=(14, 28))
+    fig = get_pyplot().figure(figsize=(14, 28))
 
     # chart 1 - aggregate performance chart
     ax1 = fig.add_subplot(4, 1, 1)
-    agg_performance_df = this_backtest_df.groupby(["date_index"]).agg({"long_short_return": "mean",
-                                                                       "stock_return": "mean",
-                                                                       "fund_return": "mean",
-                                                                       "trade_id": "count"}).reset_index()
     agg_performance_df["long_short_return_diff"] = agg_performance_df["long_short_return"].diff()
     agg_performance_df["long_short_return_diff"] = agg_performance_df["long_short_return_diff"].fillna(0)
     agg_performance_df = agg_performance_df.set_index("date_index")
@@ -136,19 +210,16 @@ def get_aggregate_performance_chart(backtest_df, trade_df, review_type, change,
     return fig
 
 # Group Performance Chart
-def get_group_performance_df(backtest_df, trade_df, review_type, change, group_by, ipo_only=False):
-    if not ipo_only:
-        this_id_list = list(trade_df[(trade_df["review_type"] == review_type) &
-                                     (trade_df["change"] == change)]["trade_id"])
-    else:
-        this_id_list = list(trade_df[(trade_df["review_type"] == review_type) &
-                                     (trade_df["change"] == change) &
-                                     (trade_df["ipo_date"].isnull() == False) &
-                                     (trade_df["ipo_return"] != 0)]["trade_id"])
+def get_group_performance_df(backtest_df, trade_df, review_type, change, group_by, ipo_only=False,
+                             selection_index=None):
+    this_backtest_df = get_selection_backtest_df(backtest_df=backtest_df, trade_df=trade_df,
+                                                 review_type=review_type, change=change, ipo_only=ipo_only,
+                                                 selection_index=selection_index).copy()
 
-    this_backtest_df = backtest_df[backtest_df["trade_id"].isin(this_id_list)].copy()
+    if group_by == "sector":
+        this_backtest_df = pd.merge(this_backtest_df, trade_df[["trade_id", "sector"]], on=["trade_id"], how="left")
 
-    if group_by == "year_month":
+    elif group_by == "year_month":
         this_backtest_df["year"] = this_backtest_df["effective_date"].dt.year
         this_backtest_df["month"] = this_backtest_df["effective_date"].dt.month
         this_backtest_df["year_month"] = this_backtest_df["year"].astype(str) + "-" + this_backtest_df["month"].astype(
@@ -161,25 +232,39 @@ def get_group_performance_df(backtest_df, trade_df, review_type, change, group_b
         this_backtest_df["month"] = this_backtest_df["effective_date"].dt.month
 
     else:
-        raise Exception("group_by only accepts year_month, year, month")
+        raise Exception("group_by only accepts year_month, year, month, sector")
 
+    # one pass split into groups, in order of appearance
     df_list = []
     group_list = []
-    for group in list(this_backtest_df[group_by].drop_duplicates()):
-        this_df = this_backtest_df[this_backtest_df[group_by] == group].copy()
+    for group, this_df in this_backtest_df.groupby(group_by, sort=False):
         df_list.append(this_df)
         group_list.append(group)
     return df_list, group_list
 
 
-def get_group_performance_chart(backtest_df, trade_df, review_type, change, group_by, ipo_only=False):
-    df_list, gruop_list = get_group_performance_df(backtest_df=backtest_df, trade_df=trade_df,
-                                                   review_type=review_type, change=change,
-                                                   group_by=group_by, ipo_only=ipo_only)
+def get_group_performance_chart(backtest_df, trade_df, review_type, change, group_by, ipo_only=False,
+                                performance_cube=None, selection_index=None):
+    if performance_cube is not None:
+        cube_performance_df = get_cube_performance_df(performance_cube=performance_cube, review_type=review_type,
+                                                      change=change, ipo_only=ipo_only, group_by=group_by)
+        df_list = []
+        gruop_list = []
+        for group, this_df in cube_performance_df.groupby(level="group", sort=False):
+            df_list.append(this_df.droplevel("group").reset_index())
+            gruop_list.append(group)
+        cube_date_index = performance_cube.index.get_level_values("date_index")
+        min_date_index, max_date_index = cube_date_index.min(), cube_date_index.max()
+    else:
+        df_list, gruop_list = get_group_performance_df(backtest_df=backtest_df, trade_df=trade_df,
+                                                       review_type=review_type, change=change,
+                                                       group_by=group_by, ipo_only=ipo_only,
+                                                       selection_index=selection_index)
+        min_date_index, max_date_index = backtest_df["date_index"].min(), backtest_df["date_index"].max()
 
     ipo_string = "" if not ipo_only else " (IPO Only)"
 
-    fig = plt.figure(figsize=(14, 21))
+    fig = get_pyplot().figure(figsize=(14, 21))
     ax1 = fig.add_subplot(3, 1, 1)
     ax2 = fig.add_subplot(3, 1, 2)
     ax3 = fig.add_subplot(3, 1, 3)
@@ -188,9 +273,12 @@ def get_group_performance_chart(backtest_df, trade_df, review_type, change, grou
     max_drawdown_list = []
     stock_count_list = []
     for df, group in zip(df_list, gruop_list):
-        this_group_df = df.groupby(["date_index"]).agg({"long_short_return": "mean",
-                                                        "trade_id": "count"}).reset_index()
-        this_group_df = this_group_df.set_index("date_index")
+        if performance_cube is not None:
+            this_group_df = df[["date_index", "long_short_return", "trade_id"]].set_index("date_index")
+        else:
+            this_group_df = df.groupby(["date_index"]).agg({"long_short_return": "mean",
+                                                            "trade_id": "count"}).reset_index()
+            this_group_df = this_group_df.set_index("date_index")
 
         this_group_df["roll_max_return"] = this_group_df["long_short_return"].cummax()
         this_group_df["roll_ls_drawdown"] = this_group_df["long_short_return"] - this_group_df["roll_max_return"]
@@ -214,7 +302,7 @@ def get_group_performance_chart(backtest_df, trade_df, review_type, change, grou
     ax2.legend(bbox_to_anchor=(1.02, 1), loc="upper left")
     ax3.legend(bbox_to_anchor=(1.02, 1), loc="upper left")
 
-    ax1.set_title("HSCI Rebal [" + str(backtest_df["date_index"].min()) + "D ~ " + str(backtest_df["date_index"].max()) + "D] - " +
+    ax1.set_title("HSCI Rebal [" + str(min_date_index) + "D ~ " + str(max_date_index) + "D] - " +
                   review_type + " " + change + " - long_short_return" + ipo_string + " by " + group_by
                   + " - Average Return: " + "{:,.2f}%".format(sum(long_short_return_list) / len(long_short_return_list)) +
                   " - Hit Ratio: " + "{:,.2f}%".format(len([ls_return for ls_return in long_short_return_list if ls_return > 0]) /
@@ -228,50 +316,40 @@ def get_group_performance_chart(backtest_df, trade_df, review_type, change, grou
 
 # get hindsight df
 def get_hindsight_backtest_df(backtest_df, trade_df, review_type, change,
-                              begin_business_day, end_business_day, flip_side=False, ipo_only=False):
+                              begin_business_day, end_business_day, flip_side=False, ipo_only=False,
+                              return_index=None, selection_index=None):
+    # memoized per selection and window when a selection index is given
+    if selection_index is not None:
+        if return_index is None:
+            return_index = selection_index.get_return_index()
+        return selection_index.get_result(
+            ("hindsight_backtest", review_type, change, ipo_only, begin_business_day, end_business_day, flip_side),
+            lambda: get_window_backtest_df(backtest_df=selection_index.get_backtest_df(review_type, change, ipo_only),
+                                           begin_business_day=begin_business_day,
+                                           end_business_day=end_business_day, flip_side=flip_side,
+                                           return_index=return_index))
+
     # adjust backtest df trade df
-    if not ipo_only:
-        this_id_list = list(trade_df[(trade_df["review_type"] == review_type) &
-                                     (trade_df["change"] == change)]["trade_id"])
-    else:
-        this_id_list = list(trade_df[(trade_df["review_type"] == review_type) &
-                                     (trade_df["change"] == change) &
-                                     (trade_df["ipo_date"].isnull() == False) &
-                                     (trade_df["ipo_return"] != 0)]["trade_id"])
+    this_backtest_df = get_selection_backtest_df(backtest_df=backtest_df, trade_df=trade_df,
+                                                 review_type=review_type, change=change, ipo_only=ipo_only)
+    return get_window_backtest_df(backtest_df=this_backtest_df, begin_business_day=begin_business_day,
+                                  end_business_day=end_business_day, flip_side=flip_side, return_index=return_index)
 
-    this_backtest_df = backtest_df[(backtest_df["trade_id"].isin(this_id_list)) &
-                                   (backtest_df["date_index"] >= -begin_business_day) &
+def get_window_backtest_df(backtest_df, begin_business_day, end_business_day, flip_side=False, return_index=None):
+    this_backtest_df = backtest_df[(backtest_df["date_index"] >= -begin_business_day) &
                                    (backtest_df["date_index"] <= end_business_day)].copy()
 
     this_backtest_df = this_backtest_df[["trade_id", "bbg_ticker", "daily_stock_return", "daily_fund_return",
                                          "date", "date_index", "effective_date"]].copy()
 
-    # re-calculate backtest data
-    this_stock_pivot_df = pd.pivot_table(this_backtest_df, index="date_index", columns="trade_id",
-                                         values="daily_stock_return")
-
-    this_fund_pivot_df = pd.pivot_table(this_backtest_df, index="date_index", columns="trade_id",
-                                        values="daily_fund_return")
-
-    this_fund_pivot_df = this_fund_pivot_df[this_stock_pivot_df.columns].copy()
-
     # assume entering the trade at close on the first day
-    this_stock_pivot_df.iloc[0, :] = 0
-    this_stock_pivot_df = this_stock_pivot_df.fillna(0)
-    this_stock_pivot_df = (1 + this_stock_pivot_df / 100).cumprod() - 1
-
-    this_fund_pivot_df.iloc[0, :] = 0
-    this_fund_pivot_df = this_fund_pivot_df.fillna(0)
-    this_fund_pivot_df = (1 + this_fund_pivot_df / 100).cumprod() - 1
-
-    this_stock_return_df = this_stock_pivot_df.stack().reset_index().rename(columns={0: "stock_return"})
-    this_fund_return_df = this_fund_pivot_df.stack().reset_index().rename(columns={0: "fund_return"})
-
-    this_backtest_df = pd.merge(this_backtest_df, this_stock_return_df,
-                                on=["trade_id", "date_index"], how="left")
-    this_backtest_df = pd.merge(this_backtest_df, this_fund_return_df,
-                                on=["trade_id", "date_index"], how="left")
-    this_backtest_df[["stock_return", "fund_return"]] *= 100
+    if return_index is None:
+        return_index = returnIndex.return_index(backtest_df=this_backtest_df)
+    window_df = return_index.get_window_returns(trade_ids=this_backtest_df["trade_id"].values,
+                                                entry_date_index=this_backtest_df["date_index"].min(),
+                                                exit_date_index=this_backtest_df["date_index"].values)
+    this_backtest_df["stock_return"] = window_df["stock_return"].values
+    this_backtest_df["fund_return"] = window_df["fund_return"].values
 
     if flip_side:
         this_backtest_df["long_short_return"] = this_backtest_df["fund_return"] - this_backtest_df["stock_return"]
@@ -279,12 +357,11 @@ def get_hindsight_backtest_df(backtest_df, trade_df, review_type, change,
         this_backtest_df["long_short_return"] = this_backtest_df["stock_return"] - this_backtest_df["fund_return"]
 
     this_backtest_df = this_backtest_df.sort_values(["trade_id", "date_index"])
-    this_backtest_df["roll_max_abs_return"] = this_backtest_df.groupby(["trade_id"])["stock_return"].cummax()
-    this_backtest_df["roll_max_ls_return"] = this_backtest_df.groupby(["trade_id"])["long_short_return"].cummax()
-    this_backtest_df["roll_abs_drawdown"] = this_backtest_df["stock_return"] - this_backtest_df["roll_max_abs_return"]
-    this_backtest_df["roll_ls_drawdown"] = this_backtest_df["long_short_return"] - this_backtest_df[
-        "roll_max_ls_return"]
-    this_backtest_df = this_backtest_df.drop(columns=["roll_max_abs_return", "roll_max_ls_return"])
+    offsets = segmentKernels.get_offsets(this_backtest_df["trade_id"].values)
+    this_backtest_df["roll_abs_drawdown"] = segmentKernels.segment_drawdown(this_backtest_df["stock_return"].values,
+                                                                            offsets)
+    this_backtest_df["roll_ls_drawdown"] = segmentKernels.segment_drawdown(
+        this_backtest_df["long_short_return"].values, offsets)
 
     return this_backtest_df
 
@@ -342,29 +419,98 @@ def get_trade_summary(backtest_df, trade_df):
     trade_summary = pd.DataFrame.from_dict(trade_dict).round(2)
     return trade_summary
 
+# trade summary of the hindsight window of one selection, memoized in the selection index
+def get_hindsight_trade_summary(selection_index, review_type, change, begin_business_day, end_business_day,
+                                flip_side=False, ipo_only=False):
+    def get_summary():
+        hindsight_backtest_df = get_hindsight_backtest_df(
+            backtest_df=selection_index.backtest_df, trade_df=selection_index.trade_df, review_type=review_type,
+            change=change, begin_business_day=begin_business_day, end_business_day=end_business_day,
+            flip_side=flip_side, ipo_only=ipo_only, selection_index=selection_index)
+        return get_trade_summary(hindsight_backtest_df, selection_index.trade_df)
+
+    return selection_index.get_result(
+        ("hindsight_trade_summary", review_type, change, ipo_only, begin_business_day, end_business_day, flip_side),
+        get_summary)
+
 def get_group_trade_summary(backtest_df, trade_df, group_by):
+    # get_trade_summary of every group at once, grouped on one frame of trades, backtest_df is not changed
+    effective_date = backtest_df["effective_date"]
     if group_by == "year_month":
-        backtest_df["year"] = backtest_df["effective_date"].dt.year
-        backtest_df["month"] = backtest_df["effective_date"].dt.month
-        backtest_df["year_month"] = backtest_df["year"].astype(str) + "-" + backtest_df["month"].astype(
-            str)
+        # labelled once per year and month rather than per row
+        year_month = effective_date.dt.year * 100 + effective_date.dt.month
+        group = year_month.map({value: "%s-%s" % (value // 100, value % 100) for value in year_month.unique()})
 
     elif group_by == "year":
-        backtest_df["year"] = backtest_df["effective_date"].dt.year
+        group = effective_date.dt.year
 
     elif group_by == "month":
-        backtest_df["month"] = backtest_df["effective_date"].dt.month
+        group = effective_date.dt.month
 
     else:
         raise Exception("group_by only accepts year_month, year, month")
 
-    yearly_summary_df_list = []
-    for group in list(backtest_df[group_by].drop_duplicates()):
-        this_backtest_df = backtest_df[backtest_df[group_by] == group].copy()
-        this_trade_summary = get_trade_summary(this_backtest_df, trade_df)
-        this_trade_summary.index = [group]
-        yearly_summary_df_list.append(this_trade_summary)
-    yearly_summary_df = pd.concat(yearly_summary_df_list).T
+    group_list = list(pd.unique(group))
+    row_df = pd.DataFrame({"trade_id": backtest_df["trade_id"].values, "group": group.values,
+                           "date_index": backtest_df["date_index"].values,
+                           "long_short_return": backtest_df["long_short_return"].values,
+                           "roll_ls_drawdown": backtest_df["roll_ls_drawdown"].values})
+    row_df = row_df.sort_values(["trade_id", "date_index"], kind="stable")
+
+    # daily long short changes between consecutive date indices of the group, as the diff of the group pivot,
+    # which averages rows of the same trade and date index
+    trade_id_array = row_df["trade_id"].values
+    date_index_array = row_df["date_index"].values
+    key_start = np.flatnonzero(np.r_[True, (trade_id_array[1:] != trade_id_array[:-1]) |
+                                     (date_index_array[1:] != date_index_array[:-1])])
+    change_df = pd.DataFrame({"trade_id": trade_id_array[key_start], "group": row_df["group"].values[key_start],
+                              "date_index": date_index_array[key_start],
+                              "long_short_return": np.add.reduceat(row_df["long_short_return"].values, key_start) /
+                                                   np.diff(np.r_[key_start, len(row_df.index)])})
+    date_rank = change_df.groupby("group")["date_index"].rank(method="dense").values
+    previous_flag = np.r_[False, (change_df["trade_id"].values[1:] == change_df["trade_id"].values[:-1]) &
+                          (date_rank[1:] == date_rank[:-1] + 1)]
+    change_df["ls_change"] = np.where(previous_flag, np.diff(change_df["long_short_return"].values, prepend=np.nan),
+                                      np.nan)
+
+    trade_group = row_df.groupby("trade_id", sort=False)
+    trade_data_df = pd.DataFrame({"group": trade_group["group"].first(),
+                                  "long_short_return": trade_group["long_short_return"].last(),
+                                  "roll_ls_drawdown": trade_group["roll_ls_drawdown"].min(),
+                                  "ls_return_std": change_df.groupby("trade_id")["ls_change"].std()}).reset_index()
+    trade_data_df = pd.merge(trade_df[["trade_id"]], trade_data_df, on=["trade_id"], how="inner")
+
+    # holding days from the second to the last date index of each group
+    date_index_df = change_df[["group", "date_index"]].drop_duplicates().sort_values(["group", "date_index"])
+    date_index_df["position"] = date_index_df.groupby("group").cumcount()
+    second_date_index = date_index_df[date_index_df["position"] == 1].set_index("group")["date_index"]
+    last_date_index = date_index_df.groupby("group")["date_index"].last()
+    holding_business_days = (second_date_index.abs() + last_date_index.abs()).reindex(group_list)
+
+    summary_group = trade_data_df.groupby("group")
+    win_group = trade_data_df[trade_data_df["long_short_return"] > 0].groupby("group")["long_short_return"]
+    loss_group = trade_data_df[trade_data_df["long_short_return"] <= 0].groupby("group")["long_short_return"]
+    summary_df = pd.DataFrame({"mean_return": summary_group["long_short_return"].mean(),
+                               "mean_trade_max_drawdown": summary_group["roll_ls_drawdown"].mean(),
+                               "mean_std": summary_group["ls_return_std"].mean(),
+                               "mean_win_loss_ratio": (win_group.mean() / loss_group.mean()).abs(),
+                               "hit_ratio": win_group.count() / summary_group["trade_id"].count() * 100,
+                               "median_return": summary_group["long_short_return"].median(),
+                               "median_max_drawdown": summary_group["roll_ls_drawdown"].median(),
+                               "median_std": summary_group["ls_return_std"].median(),
+                               "median_win_loss_ratio": (win_group.median() / loss_group.median()).abs(),
+                               "trade_count": summary_group["trade_id"].count()}).reindex(group_list)
+    summary_df["hit_ratio"] = summary_df["hit_ratio"].fillna(0)
+
+    # sharpe ratio
+    for stat in ["mean", "median"]:
+        summary_df[stat + "_sharpe_ratio"] = ((1 + summary_df[stat + "_return"] / 100) ** (
+                252 / holding_business_days) - 1) / ((252 ** 0.5) * summary_df[stat + "_std"] / 100)
+
+    yearly_summary_df = summary_df[["mean_return", "mean_trade_max_drawdown", "mean_sharpe_ratio",
+                                    "mean_win_loss_ratio", "hit_ratio", "median_return", "median_max_drawdown",
+                                    "median_sharpe_ratio", "median_win_loss_ratio", "trade_count"]].round(2).T
+    yearly_summary_df.columns = group_list
     yearly_summary_df_index = list(yearly_summary_df.columns)
     yearly_summary_df["mean"] = yearly_summary_df.mean(axis=1)
     yearly_summary_df["median"] = yearly_summary_df.median(axis=1)
@@ -377,7 +523,7 @@ def get_return_scatter_plot(backtest_df, trade_df, item):
     ls_return_df = backtest_df.groupby(["trade_id"])["long_short_return"].last().reset_index()
     trade_df = pd.merge(trade_df, ls_return_df, on=["trade_id"], how="left")
 
-    fig = plt.figure(figsize=(14, 7))
+    fig = get_pyplot().figure(figsize=(14, 7))
     ax1 = fig.add_subplot(1, 1, 1)
     ax1.scatter(trade_df[item], trade_df["long_short_return"])
     ax1.set_title("long_short_return (Y) vs. " + item + "(X)", fontsize=16)
@@ -0,0 +1 @@
+# this is an __init__ file
@@ -0,0 +1,175 @@
+import pandas as pd
+import os
+import sys
+import json
+import tempfile
+import subprocess
+from datetime import datetime
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from config import log
+from func import updateHSCI
+from func import backtestHSCI
+from func import runReport
+from benchmark import syntheticData
+
+# performanceVisualization lives next to the notebook in Output Files
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + "/Output Files")
+import performanceVisualization
+
+logger = log.get_logger()
+
+stage_list = ["get_hsci_trade_file", "clean_trade_file", "get_backtest_files", "get_trade_summary",
+              "get_aggregate_performance_chart", "get_group_performance_chart"]
+
+def get_commit():
+    # commit of the benchmarked tree, None outside a git checkout
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def time_pipeline(year_num, event_num, tickers_per_event, begin_business_day=60, end_business_day=30,
+                  funding_source="2800 HK Equity", latency_seconds=0, seed=0):
+    '''
+    One run from the change workbook to the charts on synthetic data,
+    event_num effective dates over year_num years with about tickers_per_event changes each.
+    Returns wall / CPU seconds, peak memory and row counts per stage.
+    '''
+    start_year = 2020 - year_num + 1
+    report = runReport.run_report()
+    with tempfile.TemporaryDirectory() as temp_path:
+        download_hsci_file_path = temp_path + "/hsci_hist_change.xlsx"
+        syntheticData.write_synthetic_change_workbook(file_path=download_hsci_file_path,
+                                                      row_num=event_num * tickers_per_event, start_year=start_year,
+                                                      end_year=2020, seed=seed, date_num=event_num)
+        data_source = syntheticData.synthetic_data_source(latency_seconds=latency_seconds, seed=seed,
+                                                          full_history_tickers=[funding_source])
+
+        with report.stage("get_hsci_trade_file") as stage_dict:
+            main_file = updateHSCI.get_hsci_trade_file(start_year=start_year, end_year=2020,
+                                                       begin_business_day=begin_business_day,
+                                                       end_business_day=end_business_day,
+                                                       download_hsci_file_path=download_hsci_file_path,
+                                                       workbook_parse_workers=1).run()
+            stage_dict["rows"] = len(main_file.index)
+
+        with report.stage("clean_trade_file") as stage_dict:
+            main_file = backtestHSCI.clean_trade_file(trade_file=main_file, reuse_ticker_dict={}).run()
+            stage_dict["rows"] = len(main_file.index)
+
+        with report.stage("get_backtest_files") as stage_dict:
+            backtest_files = backtestHSCI.get_backtest_files(
+                trade_file=main_file, funding_source=funding_source,
+                output_hsci_trade_file_path=temp_path + "/hsci_trade_file.csv",
+                output_hsci_backtest_file_path=temp_path + "/hsci_backtest_file.csv",
+                resume=False, run_report=report, data_source=data_source)
+            trade_df = backtest_files.run()
+            backtest_df = backtest_files.read_backtest_df()
+            stage_dict["rows"] = len(backtest_df.index)
+
+        with report.stage("get_trade_summary") as stage_dict:
+            performanceVisualization.get_trade_summary(backtest_df=backtest_df, trade_df=trade_df)
+            stage_dict["rows"] = len(backtest_df.index)
+
+        # every review type and change with trades, as the notebook draws them
+        selection_list = list(trade_df[["review_type", "change"]].drop_duplicates().itertuples(index=False))
+        with report.stage("get_aggregate_performance_chart") as stage_dict:
+            for review_type, change in selection_list:
+                plt.close(performanceVisualization.get_aggregate_performance_chart(
+                    backtest_df=backtest_df, trade_df=trade_df, review_type=review_type, change=change))
+            stage_dict["rows"] = len(selection_list)
+
+        with report.stage("get_group_performance_chart") as stage_dict:
+            for review_type, change in selection_list:
+                plt.close(performanceVisualization.get_group_performance_chart(
+                    backtest_df=backtest_df, trade_df=trade_df, review_type=review_type, change=change,
+                    group_by="year"))
+            stage_dict["rows"] = len(selection_list)
+
+    # top level stages only, the nested get_backtest_files stages stay in the run report
+    return [stage_dict for stage_dict in report.stage_list if stage_dict["parent"] is None]
+
+def write_results(result_df, result_path):
+    # one JSON line per stage and scale, appended so runs of different commits can be compared
+    with open(result_path, "a") as f:
+        for result in result_df.to_dict("records"):
+            f.write(json.dumps(result, default=str) + "\n")
+
+def compare_results(result_path, commit=None):
+    '''
+    Seconds per stage and scale of a commit (default the last run) over the run of the commit before it.
+    '''
+    result_df = pd.read_json(result_path, lines=True, dtype={"commit": str})
+    run_list = list(result_df[["run_time", "commit"]].drop_duplicates().itertuples(index=False))
+    run_time_list = [run_time for run_time, run_commit in run_list if commit is None or run_commit == commit]
+    if run_time_list == []:
+        raise Exception("No Benchmark Results of commit %s in %s" % (commit, result_path))
+    this_run_time = run_time_list[-1]
+    this_commit = result_df[result_df["run_time"] == this_run_time]["commit"].iloc[0]
+    previous_run_time_list = [run_time for run_time, run_commit in run_list
+                              if run_time < this_run_time and run_commit != this_commit]
+    if previous_run_time_list == []:
+        raise Exception("No earlier Benchmark Results than commit %s in %s" % (this_commit, result_path))
+    keys = ["stage", "scale"]
+    compare_df = pd.merge(result_df[result_df["run_time"] == previous_run_time_list[-1]][keys + ["wall_seconds"]],
+                          result_df[result_df["run_time"] == this_run_time][keys + ["wall_seconds"]],
+                          on=keys, how="outer", suffixes=("_before", "_after"))
+    compare_df["ratio"] = compare_df["wall_seconds_after"] / compare_df["wall_seconds_before"]
+    logger.info("Benchmark of %s over %s\n%s" % (this_commit, result_df[result_df["run_time"] ==
+                                                                       previous_run_time_list[-1]]["commit"].iloc[0],
+                                                 compare_df.to_string(index=False)))
+    return compare_df
+
+def run(year_num=5, event_num=10, tickers_per_event=10, scale_list=(1, 10), scale_by="tickers_per_event",
+        result_path=None, max_scaling_ratio=1.0, min_seconds=0.05):
+    '''
+    Time every stage from the change workbook to the charts at each scale of scale_by
+    (year_num, event_num or tickers_per_event), saved to result_path when given.
+    Each stage has to take at most max_scaling_ratio x scale times its time at the smallest scale,
+    e.g. 10x tickers in at most 10x time, stages faster than min_seconds are too noisy to check.
+    '''
+    if scale_by not in ["year_num", "event_num", "tickers_per_event"]:
+        raise Exception("scale_by only accepts year_num, event_num, tickers_per_event")
+    base_params = {"year_num": year_num, "event_num": event_num, "tickers_per_event": tickers_per_event}
+
+    # warm up, the first run also builds the trading calendar
+    time_pipeline(year_num=1, event_num=2, tickers_per_event=2)
+
+    run_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    commit = get_commit()
+    result_list = []
+    for scale in scale_list:
+        params = dict(base_params, **{scale_by: int(base_params[scale_by] * scale)})
+        for stage_dict in time_pipeline(**params):
+            result_list.append({"run_time": run_time, "commit": commit, "scale": scale, **params,
+                                "stage": stage_dict["name"], "rows": stage_dict.get("rows"),
+                                "wall_seconds": stage_dict["wall_seconds"], "cpu_seconds": stage_dict["cpu_seconds"],
+                                "peak_rss_mb": stage_dict["peak_rss_mb"]})
+    result_df = pd.DataFrame(result_list)
+    logger.info("Pipeline Benchmark by %s\n%s" % (scale_by, result_df.pivot(index="stage", columns="scale",
+                                                                            values="wall_seconds")
+                                                  .reindex(stage_list).to_string()))
+    if result_path is not None:
+        write_results(result_df=result_df, result_path=result_path)
+
+    # time of every stage at each scale over its time at the smallest scale
+    wall_df = result_df.pivot(index="stage", columns="scale", values="wall_seconds")
+    base_scale = min(scale_list)
+    slow_list = []
+    for scale in scale_list:
+        if scale == base_scale:
+            continue
+        scaling_ratio = wall_df[scale] / wall_df[base_scale]
+        slow_flag = (wall_df[base_scale] >= min_seconds) & \
+                    (scaling_ratio > max_scaling_ratio * scale / base_scale)
+        slow_list += ["%s %.1fx at %sx" % (stage, ratio, scale / base_scale)
+                      for stage, ratio in scaling_ratio[slow_flag].items()]
+    if slow_list != []:
+        raise Exception("Stages scale worse than linearly in %s: %s" % (scale_by, ", ".join(slow_list)))
+    return result_df
+
+if __name__ == "__main__":
+    run(result_path=os.path.dirname(os.path.abspath(__file__)) + "/bench_pipeline_results.jsonl")
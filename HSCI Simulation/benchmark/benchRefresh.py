@@ -0,0 +1,150 @@
+import pandas as pd
+import os
+import time
+import hashlib
+import tempfile
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from config import log
+from func import updateHSCI
+from benchmark import syntheticData
+
+logger = log.get_logger()
+
+hsci_page = '''<html><body>
+<select id="constituentsSelect"><option>Hang Seng Index</option><option>Hang Seng Composite Index</option></select>
+<button onclick="window.location='/hsci_hist_change.xlsx'">View Now</button>
+</body></html>'''
+
+class hsi_stand_in():
+    '''
+    Local stand in for the HSI site: the page with the constituents select and View Now button at /,
+    the change file at /hsci_hist_change.xlsx with ETag / Last-Modified and 304 answers unless validators is False.
+    Counts requests and body bytes sent, set_content publishes a new version of the file.
+    '''
+    def __init__(self, content, validators=True):
+        self.validators = validators
+        self.request_count = 0
+        self.body_bytes = 0
+        self.set_content(content)
+        stand_in = self
+
+        class request_handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stand_in.request_count += 1
+                if self.path == "/":
+                    self.send_body(hsci_page.encode(), "text/html")
+                elif self.path == "/hsci_hist_change.xlsx":
+                    if stand_in.validators and stand_in.is_not_modified(self.headers):
+                        self.send_response(304)
+                        self.end_headers()
+                        return
+                    self.send_body(stand_in.content, "application/octet-stream",
+                                   {"Content-Disposition": "attachment; filename=hsci_hist_change.xlsx"})
+                else:
+                    self.send_error(404)
+
+            def send_body(self, body, content_type, header_dict=None):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                if stand_in.validators:
+                    self.send_header("ETag", stand_in.etag)
+                    self.send_header("Last-Modified", stand_in.last_modified)
+                for key, value in ({} if header_dict is None else header_dict).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+                stand_in.body_bytes += len(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), request_handler)
+        self.url = "http://127.0.0.1:%s" % self.server.server_address[1]
+        self.file_url = self.url + "/hsci_hist_change.xlsx"
+
+    def set_content(self, content):
+        # a new version gets a new ETag and Last-Modified, publishing the same content again changes nothing
+        if getattr(self, "content", None) == content:
+            return
+        self.content = content
+        self.etag = '"%s"' % hashlib.sha256(content).hexdigest()[:32]
+        self.last_modified = formatdate(time.time(), usegmt=True)
+
+    def is_not_modified(self, headers):
+        if headers.get("If-None-Match") is not None:
+            return headers["If-None-Match"] == self.etag
+        if headers.get("If-Modified-Since") is not None:
+            return parsedate_to_datetime(headers["If-Modified-Since"]) >= parsedate_to_datetime(self.last_modified)
+        return False
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+def get_workbook_content(temp_path, row_num, seed):
+    file_path = temp_path + "/published_%s.xlsx" % seed
+    syntheticData.write_synthetic_change_workbook(file_path=file_path, row_num=row_num, seed=seed)
+    with open(file_path, "rb") as f:
+        return f.read()
+
+def run(row_num=20000):
+    '''
+    Refresh of the change file against the local stand in: first download, unchanged file,
+    new published version, unchanged file checked at the url kept from the last download
+    and unchanged file from a server without validators (content hash only).
+    Checks the changed flag, the previous version and the bytes sent for every case.
+    '''
+    with tempfile.TemporaryDirectory() as temp_path:
+        content = get_workbook_content(temp_path, row_num=row_num, seed=0)
+        new_content = get_workbook_content(temp_path, row_num=row_num, seed=1)
+        download_hsci_file_path = temp_path + "/hsci_hist_change.xlsx"
+
+        result_list = []
+        with hsi_stand_in(content=content) as stand_in:
+            for case, validators, publish_content, expected_changed, expected_previous in [
+                    ("first download", True, content, True, None),
+                    ("unchanged", True, content, False, None),
+                    ("new version", True, new_content, True, content),
+                    ("unchanged from the cached url", True, new_content, False, content),
+                    ("unchanged without validators", False, new_content, False, content)]:
+                stand_in.validators = validators
+                stand_in.set_content(publish_content)
+                stand_in.request_count, stand_in.body_bytes = 0, 0
+                start_time = time.perf_counter()
+                # the last case relies on the url kept from the earlier downloads, as after a scrape
+                file_url = None if case == "unchanged from the cached url" else stand_in.file_url
+                changed = updateHSCI.refresh_hsci_file(download_path=temp_path,
+                                                       download_hsci_file_path=download_hsci_file_path,
+                                                       chrome_driver_path=None, file_url=file_url)
+                elapsed = time.perf_counter() - start_time
+                check_refresh(case=case, changed=changed, expected_changed=expected_changed,
+                              publish_content=publish_content, expected_previous=expected_previous,
+                              download_hsci_file_path=download_hsci_file_path)
+                result_list.append({"case": case, "changed": changed, "requests": stand_in.request_count,
+                                    "body_bytes": stand_in.body_bytes, "seconds": elapsed})
+    result_df = pd.DataFrame(result_list)
+    logger.info("HSCI File Refresh Benchmark\n%s" % result_df.to_string(index=False))
+    return result_df
+
+def check_refresh(case, changed, expected_changed, publish_content, expected_previous, download_hsci_file_path):
+    # the current file is the published one and the previous version the one before the last change
+    with open(download_hsci_file_path, "rb") as f:
+        file_ok = f.read() == publish_content
+    previous_file_path = updateHSCI.get_previous_file_path(download_hsci_file_path)
+    previous_content = None
+    if os.path.exists(previous_file_path):
+        with open(previous_file_path, "rb") as f:
+            previous_content = f.read()
+    if changed != expected_changed or not file_ok or previous_content != expected_previous:
+        raise Exception("HSCI File Refresh failed for %s: changed %s, file ok %s, previous version ok %s" % (
+            case, changed, file_ok, previous_content == expected_previous))
+
+if __name__ == "__main__":
+    run()
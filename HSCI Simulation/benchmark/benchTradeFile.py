@@ -0,0 +1,43 @@
+import pandas as pd
+import time
+from config import log
+from func import updateHSCI
+from benchmark import syntheticData
+
+logger = log.get_logger()
+
+def time_trade_file(row_num, repeat_num=3):
+    main_file, sector_file = syntheticData.get_synthetic_change_log(row_num=row_num)
+    trade_file_builder = updateHSCI.get_hsci_trade_file(start_year=2001, end_year=2020, begin_business_day=5,
+                                                        end_business_day=5, download_hsci_file_path=None)
+    # best of repeat_num runs
+    elapsed_list = []
+    for repeat in range(repeat_num):
+        start_time = time.perf_counter()
+        trade_file = trade_file_builder.get_trade_file(main_file=main_file.copy(), sector_file=sector_file)
+        elapsed_list.append(time.perf_counter() - start_time)
+    return len(trade_file.index), min(elapsed_list)
+
+def run(row_num_list=(25000, 50000, 100000, 200000, 400000), max_scaling_ratio=1.5):
+    '''
+    Time the trade file build on synthetic change logs of doubling size.
+    Time per row at the largest size has to stay within max_scaling_ratio of the smallest size.
+    '''
+    # warm up, the first call also builds the trading calendar
+    time_trade_file(row_num=row_num_list[0], repeat_num=1)
+
+    result_list = []
+    for row_num in row_num_list:
+        trade_num, elapsed = time_trade_file(row_num=row_num)
+        result_list.append({"row_num": row_num, "trade_num": trade_num, "seconds": elapsed,
+                            "microseconds_per_row": elapsed / row_num * 1e6})
+    result_df = pd.DataFrame(result_list)
+    scaling_ratio = result_df["microseconds_per_row"].iloc[-1] / result_df["microseconds_per_row"].iloc[0]
+    logger.info("Trade File Benchmark\n%s" % result_df.to_string(index=False))
+    logger.info("Time per row at %s rows over %s rows: %.2f" % (row_num_list[-1], row_num_list[0], scaling_ratio))
+    if scaling_ratio > max_scaling_ratio:
+        raise Exception("Trade File build does not scale linearly, time per row ratio %.2f" % scaling_ratio)
+    return result_df
+
+if __name__ == "__main__":
+    run()
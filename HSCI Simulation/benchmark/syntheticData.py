@@ -0,0 +1,147 @@
+import pandas as pd
+import numpy as np
+import time
+import zlib
+
+sector_list = ["CD", "CONG", "CS", "ENG", "FIN", "H", "IND", "IT", "MAT", "PROP", "TEL", "UTI"]
+
+def get_effective_dates(date_num, start_year, end_year, random_state):
+    # March / September regular reviews plus interim changes on random business days
+    regular_dates = pd.DatetimeIndex([pd.Timestamp(year, month, 1) + pd.offsets.WeekOfMonth(week=1, weekday=0)
+                                      for year in range(start_year, end_year + 1) for month in [3, 9]])
+    business_days = pd.bdate_range(pd.Timestamp(start_year, 1, 1), pd.Timestamp(end_year, 12, 31))
+    interim_num = max(date_num - len(regular_dates), 0)
+    interim_dates = pd.DatetimeIndex(random_state.choice(business_days.values, interim_num, replace=True))
+    return regular_dates.append(interim_dates).unique().sort_values()
+
+def get_synthetic_change_log(row_num, start_year=2001, end_year=2020, seed=0, date_num=None, stock_num=9999):
+    '''
+    main_file and sector_file in the layout workbookCache parses out of the HSCI change workbook,
+    with row_num rows of constituent changes on about date_num effective dates between start_year and end_year.
+    '''
+    random_state = np.random.RandomState(seed)
+    date_num = max(row_num // 20, 1) if date_num is None else date_num
+    effective_dates = get_effective_dates(date_num, start_year, end_year, random_state)
+
+    # rows are spread over the effective dates
+    date_array = effective_dates.values[np.sort(random_state.randint(0, len(effective_dates), row_num))]
+    change_array = np.where(random_state.rand(row_num) < 0.5, "Add 加入", "Delete 刪除").astype(object)
+    stock_code_array = random_state.randint(1, stock_num + 1, row_num)
+
+    # a few stocks appear twice on the same date under an old and a new name
+    name_change_flag = random_state.rand(row_num) < 0.001
+    name_change_flag[0] = False
+    previous_row = np.flatnonzero(name_change_flag) - 1
+    stock_code_array[name_change_flag] = stock_code_array[previous_row]
+    date_array[name_change_flag] = date_array[previous_row]
+    change_array[name_change_flag] = change_array[previous_row]
+
+    main_file = pd.DataFrame({"effective_date": date_array, "change": change_array,
+                              "stock_code": stock_code_array.astype(str).astype(object)})
+    change_count = main_file.groupby(["effective_date", "change"])["stock_code"].transform("count")
+    main_file["count"] = np.where(main_file["change"] == "Add 加入", "+", "-").astype(object) + \
+                         change_count.astype(str)
+    main_file["number_of_cons"] = "500"
+    main_file["listing_place"] = "Hong Kong 香港"
+    main_file["stock_name"] = "STOCK " + main_file["stock_code"]
+    main_file.loc[name_change_flag, "stock_name"] = "NEW " + main_file.loc[name_change_flag, "stock_name"]
+    main_file["stock_name_chinese"] = main_file["stock_name"]
+    main_file = main_file[["effective_date", "number_of_cons", "change", "count", "stock_code",
+                           "listing_place", "stock_name", "stock_name_chinese"]]
+
+    # every change is also listed on the sheet of its sector
+    sector_file = main_file[["effective_date", "change", "stock_code"]].drop_duplicates().copy()
+    sector_file["change"] = sector_file["change"].replace({"Add 加入": "Add", "Delete 刪除": "Delete"})
+    sector_file["sector"] = np.array(sector_list)[sector_file["stock_code"].astype(int) % len(sector_list)]
+    return main_file, sector_file
+
+def write_synthetic_change_workbook(file_path, row_num, start_year=2001, end_year=2020, seed=0, date_num=None,
+                                    stock_num=9999):
+    # HSCI change workbook as downloaded, main sheet and one "HSCI-<sector>" sheet per sector,
+    # every sheet with 5 rows of title above and 5 rows of notes below the changes
+    main_file, sector_file = get_synthetic_change_log(row_num=row_num, start_year=start_year, end_year=end_year,
+                                                      seed=seed, date_num=date_num, stock_num=stock_num)
+
+    def get_sheet_df(change_df):
+        # text in every column keeps stock codes as integers when the sheet is parsed, as in the real file
+        filler_df = pd.DataFrame([list(change_df.columns)] * 5, columns=change_df.columns)
+        return pd.concat([filler_df, change_df, filler_df], ignore_index=True)
+
+    sector_file = sector_file.copy()
+    sector_file["change"] = sector_file["change"].replace({"Add": "Add 加入", "Delete": "Delete 刪除"})
+    with pd.ExcelWriter(file_path) as writer:
+        get_sheet_df(main_file).to_excel(writer, sheet_name="HSCI", index=False)
+        for sector, this_sector_file in sector_file.groupby("sector"):
+            # sector sheets keep effective date, change and stock code in columns 0, 2 and 4
+            this_sheet_df = pd.DataFrame({"effective_date": this_sector_file["effective_date"].values,
+                                          "number_of_cons": "500", "change": this_sector_file["change"].values,
+                                          "count": "", "stock_code": this_sector_file["stock_code"].values})
+            get_sheet_df(this_sheet_df).to_excel(writer, sheet_name="HSCI-" + sector, index=False)
+    return main_file, sector_file
+
+class synthetic_data_source():
+    '''
+    Stand in for blp.bdh without a Bloomberg terminal: random walk last_price, volume and beta_adj_overridable
+    on weekdays, the same history for a ticker on every call. A share of the tickers list after history_start
+    (IPO), stop trading before history_end (delist) or never trade (halt), as the backtest expects to see them,
+    apart from the full_history_tickers e.g. the funding source.
+    latency_seconds is slept on every call to mimic the round trip.
+    '''
+    def __init__(self, history_start="2000-01-03", history_end="2022-12-30", ipo_ratio=0.1, delist_ratio=0.05,
+                 halt_ratio=0.01, latency_seconds=0, seed=0, full_history_tickers=("2800 HK Equity",)):
+        self.date_array = pd.bdate_range(history_start, history_end).values
+        self.ipo_ratio = ipo_ratio
+        self.delist_ratio = delist_ratio
+        self.halt_ratio = halt_ratio
+        self.latency_seconds = latency_seconds
+        self.seed = seed
+        self.full_history_tickers = list(full_history_tickers)
+        self.history_dict = {}
+        self.call_count = 0
+
+    def get_history(self, ticker):
+        # (first row, last row, date x field values) of a ticker, None when it never trades
+        if ticker not in self.history_dict:
+            random_state = np.random.RandomState((zlib.crc32(ticker.encode()) + self.seed) % 2 ** 32)
+            date_num = len(self.date_array)
+            ipo_flag, delist_flag, halt_flag = random_state.rand(3) < [self.ipo_ratio, self.delist_ratio,
+                                                                       self.halt_ratio]
+            if ticker in self.full_history_tickers:
+                ipo_flag, delist_flag, halt_flag = False, False, False
+            first_row = random_state.randint(0, date_num) if ipo_flag else 0
+            last_row = random_state.randint(first_row, date_num) if delist_flag else date_num - 1
+            last_price = 10 * np.exp(np.cumsum(random_state.normal(0.0002, 0.02, date_num)))
+            volume = np.round(random_state.lognormal(11, 1, date_num))
+            beta = np.round(np.clip(1 + np.cumsum(random_state.normal(0, 0.01, date_num)) * 0.1, 0.2, 2), 4)
+            self.history_dict[ticker] = None if halt_flag else (first_row, last_row,
+                                                                np.c_[last_price, volume, beta])
+        return self.history_dict[ticker]
+
+    def bdh(self, tickers, flds, start_date, end_date, **kwargs):
+        # date index, (ticker, field) columns, tickers without a price in the window are left out
+        self.call_count += 1
+        if self.latency_seconds > 0:
+            time.sleep(self.latency_seconds)
+        tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+        flds = [flds] if isinstance(flds, str) else list(flds)
+        field_list = ["last_price", "volume", "beta_adj_overridable"]
+        field_columns = [field_list.index(field) if field in field_list else -1 for field in flds]
+        start_row = np.searchsorted(self.date_array, np.datetime64(pd.Timestamp(start_date)), "left")
+        end_row = np.searchsorted(self.date_array, np.datetime64(pd.Timestamp(end_date)), "right")
+        frame_dict = {}
+        for ticker in dict.fromkeys(tickers):
+            history = self.get_history(ticker)
+            if history is None:
+                continue
+            first_row, last_row, value_array = history
+            this_start_row, this_end_row = max(start_row, first_row), min(end_row, last_row + 1)
+            if this_start_row >= this_end_row:
+                continue
+            this_value_array = np.full((this_end_row - this_start_row, len(flds)), np.nan)
+            this_value_array[:, np.array(field_columns) >= 0] = \
+                value_array[this_start_row:this_end_row][:, [column for column in field_columns if column >= 0]]
+            frame_dict[ticker] = pd.DataFrame(this_value_array, columns=flds,
+                                              index=pd.DatetimeIndex(self.date_array[this_start_row:this_end_row]))
+        if frame_dict == {}:
+            return pd.DataFrame()
+        return pd.concat(frame_dict, axis=1)
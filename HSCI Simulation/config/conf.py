@@ -10,9 +10,41 @@ simulation_params = {
     "end_business_day": 30,
     "funding_source": "2800 HK Equity",
     "update_hsci_file": True,
+    "use_price_cache": True,
+    "fetch_batch_size": 50,
+    "max_in_flight_requests": 4,
+    "fetch_max_retries": 3,
+    "fetch_backoff_seconds": 1,
     "hsci_file_name": "hsci_hist_change.xlsx",
+    "hsci_file_url": None,
+    "hsci_download_timeout_seconds": 60,
+    "workbook_parse_workers": 2,
     "trade_file_name": "hsci_trade_file.csv",
-    "backtest_file_name": "hsci_backtest_file.csv"
+    "backtest_file_name": "hsci_backtest_file.csv",
+    "output_format": "csv",
+    "resume_backtest": True,
+    "live_update": False,
+    "parameter_sweep": False,
+    "sweep_begin_business_day_list": [5, 10, 20, 30, 40, 60],
+    "sweep_end_business_day_list": [0, 5, 10, 20, 30],
+    "sweep_group_by": ["review_type", "change"],
+    "sweep_file_name": "hsci_sweep_file.csv",
+    "grid_trade_file_name": "hsci_grid_trade_file.csv",
+    "grid_backtest_file_name": "hsci_grid_backtest_file.csv",
+    "parameter_optimization": False,
+    "optimization_review_type_list": ["Regular", "Interim"],
+    "optimization_change_list": ["Add", "Delete"],
+    "optimization_ipo_only_list": [False, True],
+    "optimization_workers": 4,
+    "optimization_chunk_size": 50,
+    "optimization_file_name": "hsci_optimization_file.csv",
+    "performance_cube": False,
+    "performance_cube_group_by": ["year", "month", "year_month", "sector"],
+    "performance_cube_file_name": "hsci_performance_cube.pkl",
+    "run_report": True,
+    "run_report_file_name": "hsci_run_report.json",
+    "trace_memory": False,
+    "profile_slowest_stage": False
 }
 
 program_path = os.getcwd()
@@ -21,12 +53,18 @@ chrome_driver_path = program_path + "/chromedriver"
 working_directories = {
     "log_history": program_path + "/Log History",
     "raw_data_files": program_path + "/Raw Data Files",
-    "output_files": program_path + "/Output Files"
+    "price_cache": program_path + "/Raw Data Files/Price Cache",
+    "workbook_cache": program_path + "/Raw Data Files/Workbook Cache",
+    "output_files": program_path + "/Output Files",
+    "event_files": program_path + "/Output Files/Event Files",
+    "grid_event_files": program_path + "/Output Files/Grid Event Files"
 }
-for path in [program_path] + list(working_directories.values()):
-    print(path)
-    if not os.path.exists(path):
-        os.makedirs(path)
+
+def make_working_directories():
+    # created when a run starts, importing the config has no side effects
+    for path in [program_path] + list(working_directories.values()):
+        if not os.path.exists(path):
+            os.makedirs(path)
 
 # manual mapping for reuse ticker in BBG
 reuse_ticker_dict = {
@@ -71,6 +109,7 @@ log_config = {
                     "level": "DEBUG",
                     "formatter": "standard",
                     "class": "logging.FileHandler",
+                    "delay": True,
                     "filename": working_directories["log_history"] + "/" + time.strftime("%Y%m%d") + getpass.getuser() + ".log"
                 }
         },
@@ -1,11 +1,31 @@
 import logging
 import logging.config
+import os
 from config.conf import *
 
+# logging is configured once per process, console only until a run adds the log file
+configured_handler_list = None
+
+def configure_logging(handler_list):
+    global configured_handler_list
+    this_log_config = dict(log_config)
+    this_log_config["handlers"] = {handler: log_config["handlers"][handler] for handler in handler_list}
+    this_log_config["loggers"] = {"": dict(log_config["loggers"][""], handlers=list(handler_list))}
+    logging.config.dictConfig(this_log_config)
+    configured_handler_list = list(handler_list)
+
 def get_logger():
 
-    logging.config.dictConfig(log_config)
+    if configured_handler_list is None:
+        configure_logging(handler_list=["console"])
 
     log = logging.getLogger()
 
     return log
+
+def add_log_file():
+    # all handlers of log_config, Log History is created here instead of when the config is imported
+    if configured_handler_list is None or "rotateFile" not in configured_handler_list:
+        os.makedirs(working_directories["log_history"], exist_ok=True)
+        configure_logging(handler_list=list(log_config["handlers"].keys()))
+    return logging.getLogger()
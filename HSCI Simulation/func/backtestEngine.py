@@ -0,0 +1,126 @@
+import pandas as pd
+import numpy as np
+from config import log
+from func import tradingCalendar
+from func import segmentKernels
+
+logger = log.get_logger()
+
+def get_segment_returns(price_array, last_valid_array, next_valid_array, row_array, column_array,
+                        window_start_array, segment_start_flag):
+    # daily and cumulative return of one column per segment, prices padded forward inside each window only
+    valid_flag = last_valid_array[row_array, column_array] >= window_start_array
+    padded_row_array = np.where(valid_flag, last_valid_array[row_array, column_array], 0)
+    price = np.where(valid_flag, price_array[padded_row_array, column_array], np.nan)
+
+    base_row_array = next_valid_array[window_start_array, column_array]
+    base_price = price_array[np.minimum(base_row_array, len(price_array) - 1), column_array]
+    cumulative_return = np.where(valid_flag, price / base_price - 1, 0)
+
+    previous_price = np.roll(price, 1)
+    previous_valid_flag = np.roll(valid_flag, 1) & ~segment_start_flag
+    daily_return = np.where(valid_flag & previous_valid_flag, price / previous_price - 1, 0)
+    return daily_return, cumulative_return
+
+def get_trading_day_prices(price_array, date_array, trade_df, column_dict, funding_source):
+    # prices on holidays of the trading calendar are left out, such a row would share its date_index
+    # with the next trading day; the funding source only on days none of the listing places trade
+    non_trading_day_dict = {listing_place: ~tradingCalendar.get_trading_calendar(listing_place)
+                            .is_trading_day(date_array) for listing_place in pd.unique(trade_df["listing_place"])}
+    if not any(non_trading_flag.any() for non_trading_flag in non_trading_day_dict.values()):
+        return price_array
+    price_array = price_array.copy()
+    fund_non_trading_flag = np.logical_and.reduce(list(non_trading_day_dict.values()))
+    price_array[fund_non_trading_flag, column_dict[funding_source]] = np.nan
+    for listing_place, non_trading_flag in non_trading_day_dict.items():
+        stock_column = trade_df[trade_df["listing_place"] == listing_place]["bbg_ticker"].map(column_dict).unique()
+        dropped_flag = ~np.isnan(price_array[np.ix_(non_trading_flag, stock_column)]).all(axis=1)
+        if dropped_flag.any():
+            logger.warning("Prices on non-trading days of %s left out of BackTest: %s" % (
+                listing_place, ", ".join(pd.DatetimeIndex(date_array[non_trading_flag][dropped_flag])
+                                         .strftime("%Y-%m-%d"))))
+        price_array[np.ix_(non_trading_flag, stock_column)] = np.nan
+    return price_array
+
+def get_backtest_returns(trade_df, price_panel, funding_source):
+    '''
+    Daily, cumulative and long short returns with drawdowns of every trade in trade_df at once.
+    Each (effective_date, trade_start_date, trade_end_date) group sees the dates on which any of its stocks
+    or the funding source has a price, the same rows the per-window pivot used to hold, so one call over
+    a panel of the whole run gives the same rows as one call per effective date.
+    '''
+    trade_df = trade_df[trade_df["halt_flag"] == False]
+    column_dict = price_panel.ticker_dict
+    missing_ticker_list = list(trade_df[~trade_df["bbg_ticker"].isin(column_dict)]["bbg_ticker"].drop_duplicates())
+    if missing_ticker_list != []:
+        logger.warning("No last_price for %s, skipped in BackTest" % (", ".join(missing_ticker_list)))
+    trade_df = trade_df[trade_df["bbg_ticker"].isin(column_dict)].copy()
+    if trade_df.empty or funding_source not in column_dict:
+        return pd.DataFrame()
+
+    date_array = price_panel.date_array
+    price_array = get_trading_day_prices(price_array=price_panel.get_field("last_price"), date_array=date_array,
+                                         trade_df=trade_df, column_dict=column_dict, funding_source=funding_source)
+    date_num = len(date_array)
+
+    # position of the last and of the next available price on each date
+    has_price = ~np.isnan(price_array)
+    row_position = np.arange(date_num)[:, None]
+    last_valid_array = np.maximum.accumulate(np.where(has_price, row_position, -1), axis=0)
+    next_valid_array = np.minimum.accumulate(np.where(has_price, row_position, date_num)[::-1], axis=0)[::-1]
+
+    # dates held by each group: any stock of the group or the funding source has a price
+    group_keys = ["effective_date", "trade_start_date", "trade_end_date"]
+    trade_df["group_num"] = trade_df.groupby(group_keys, sort=False).ngroup()
+    group_num = trade_df["group_num"].max() + 1
+    member_array = np.zeros((price_array.shape[1], group_num), dtype="int64")
+    member_array[trade_df["bbg_ticker"].map(column_dict).values, trade_df["group_num"].values] = 1
+    member_array[column_dict[funding_source], :] = 1
+    group_date_flag = (has_price.astype("int64") @ member_array) > 0
+
+    # one contiguous segment of rows per trade
+    stock_column = trade_df["bbg_ticker"].map(column_dict).values
+    window_start = np.searchsorted(date_array, trade_df["trade_start_date"].values.astype("datetime64[ns]"), "left")
+    window_end = np.searchsorted(date_array, trade_df["trade_end_date"].values.astype("datetime64[ns]"), "right")
+    window_length = np.maximum(window_end - window_start, 0)
+    trade_position = np.repeat(np.arange(len(trade_df.index)), window_length)
+    row_array = window_start[trade_position] + np.arange(len(trade_position)) - np.repeat(
+        np.cumsum(window_length) - window_length, window_length)
+    keep_flag = group_date_flag[row_array, trade_df["group_num"].values[trade_position]] & \
+        tradingCalendar.is_trading_day(dates=date_array[row_array],
+                                       listing_places=trade_df["listing_place"].values[trade_position])
+    trade_position = trade_position[keep_flag]
+    row_array = row_array[keep_flag]
+    segment_start_flag = np.r_[True, trade_position[1:] != trade_position[:-1]]
+
+    daily_stock_return, stock_return = get_segment_returns(
+        price_array=price_array, last_valid_array=last_valid_array, next_valid_array=next_valid_array,
+        row_array=row_array, column_array=stock_column[trade_position],
+        window_start_array=window_start[trade_position], segment_start_flag=segment_start_flag)
+    daily_fund_return, fund_return = get_segment_returns(
+        price_array=price_array, last_valid_array=last_valid_array, next_valid_array=next_valid_array,
+        row_array=row_array, column_array=np.full(len(row_array), column_dict[funding_source]),
+        window_start_array=window_start[trade_position], segment_start_flag=segment_start_flag)
+
+    backtest_df = pd.DataFrame({"trade_id": trade_df["trade_id"].values[trade_position],
+                                "bbg_ticker": trade_df["bbg_ticker"].values[trade_position],
+                                "date": date_array[row_array],
+                                "daily_stock_return": daily_stock_return * 100,
+                                "daily_fund_return": daily_fund_return * 100,
+                                "stock_return": stock_return * 100,
+                                "fund_return": fund_return * 100,
+                                "effective_date": trade_df["effective_date"].values[trade_position]})
+    backtest_df["long_short_return"] = backtest_df["stock_return"] - backtest_df["fund_return"]
+
+    # get date index on the trading calendar of the listing place
+    backtest_df["date_index"] = tradingCalendar.get_date_index(
+        dates=backtest_df["date"].values, effective_dates=backtest_df["effective_date"].values,
+        listing_places=trade_df["listing_place"].values[trade_position])
+    backtest_df = backtest_df.sort_values(["trade_id", "date_index"]).reset_index(drop=True)
+
+    # calculate drawdown
+    offsets = segmentKernels.get_offsets(backtest_df["trade_id"].values)
+    backtest_df["roll_abs_drawdown"] = segmentKernels.segment_drawdown(backtest_df["stock_return"].values, offsets)
+    backtest_df["roll_ls_drawdown"] = segmentKernels.segment_drawdown(backtest_df["long_short_return"].values,
+                                                                      offsets)
+    return backtest_df.sort_index(axis=1)
@@ -1,14 +1,31 @@
 import pandas as pd
 import numpy as np
-import holidays
+import os
+import time
 from config import log
 from datetime import date
 from pandas.tseries.offsets import BDay
-from collections import defaultdict
-from xbbg import blp
+from func import priceCache
+from func import fetchPlanner
+from func import fetchScheduler
+from func import backtestEngine
+from func import pricePanel
+from func import tradingCalendar
+from func import outputStore
+from func import eventStore
+from func import liveUpdate
+from func import runReport
 
 logger = log.get_logger()
 
+def get_bloomberg_data_source():
+    # xbbg is imported when prices are fetched, so the package imports without a Bloomberg terminal
+    try:
+        from xbbg import blp
+    except ImportError:
+        raise Exception("No xbbg. Please install xbbg with a Bloomberg terminal or pass a data_source")
+    return blp
+
 class clean_trade_file():
     def __init__(self, trade_file, reuse_ticker_dict):
         self.trade_file = trade_file
@@ -23,38 +40,13 @@ class clean_trade_file():
             return trade_file
 
         def adjust_holiday(trade_file):
-            country_list = list(trade_file["listing_place"].drop_duplicates())
-            start_date_dict = defaultdict(list)
-            end_date_dict = defaultdict(list)
-            for country in country_list:
-                this_country_df = trade_file[trade_file["listing_place"] == country].copy()
-                this_holiday = holidays.CountryHoliday(country)
-                holiday_start_date = [start_date for start_date in list(this_country_df["trade_start_date"].drop_duplicates())
-                                      if start_date in this_holiday]
-                holiday_end_date = [end_date for end_date in list(this_country_df["trade_end_date"].drop_duplicates())
-                                    if end_date in this_holiday]
-
-                if holiday_start_date != []:
-                    for date in holiday_start_date:
-                        adjust_date = date + BDay(1)
-                        while adjust_date in this_holiday:
-                            adjust_date += BDay(1)
-                        start_date_dict[date] = [adjust_date]
-
-                if holiday_end_date != []:
-                    for date in holiday_end_date:
-                        adjust_date = date - BDay(1)
-                        while adjust_date in this_holiday:
-                            adjust_date -= BDay(1)
-                        end_date_dict[date] = [adjust_date]
-
-            adjust_num = 0
-            for adjust_dict in [start_date_dict, end_date_dict]:
-                date_column = "trade_start_date" if adjust_num == 0 else "trade_end_date"
-                for key, value in adjust_dict.items():
-                    adjust_index = trade_file[trade_file[date_column] == key].index
-                    trade_file.loc[adjust_index, date_column] = value[0]
-                adjust_num += 1
+            # roll start date forward and end date backward to a trading day of the listing place
+            trade_file["trade_start_date"] = tradingCalendar.roll_trading_days(
+                dates=trade_file["trade_start_date"], direction="forward",
+                listing_places=trade_file["listing_place"]).values
+            trade_file["trade_end_date"] = tradingCalendar.roll_trading_days(
+                dates=trade_file["trade_end_date"], direction="backward",
+                listing_places=trade_file["listing_place"]).values
             return trade_file
 
         # get trade id
@@ -78,195 +70,255 @@ class clean_trade_file():
         return trade_file
 
 class get_backtest_files():
-    def __init__(self, trade_file, funding_source, output_hsci_trade_file_path, output_hsci_backtest_file_path):
+    def __init__(self, trade_file, funding_source, output_hsci_trade_file_path, output_hsci_backtest_file_path,
+                 price_cache_path=None, fetch_batch_size=50, max_in_flight_requests=4, fetch_max_retries=3,
+                 fetch_backoff_seconds=1, output_format="csv", event_path=None, resume=True, event_params=None,
+                 live_update=False, run_report=None, data_source=None):
         self.trade_file = trade_file
         self.funding_source = funding_source
         self.output_hsci_trade_file_path = output_hsci_trade_file_path
         self.output_hsci_backtest_file_path = output_hsci_backtest_file_path
+        self.price_cache_path = price_cache_path
+        self.fetch_batch_size = fetch_batch_size
+        self.max_in_flight_requests = max_in_flight_requests
+        self.fetch_max_retries = fetch_max_retries
+        self.fetch_backoff_seconds = fetch_backoff_seconds
+        self.output_format = output_format
+        # per effective date results, next to the output files unless given
+        self.event_path = event_path if event_path is not None else \
+            os.path.dirname(os.path.abspath(output_hsci_backtest_file_path)) + "/Event Files"
+        self.resume = resume
+        # parameters the results depend on beyond the trade file rows, part of each event fingerprint
+        self.event_params = {} if event_params is None else event_params
+        # extend in flight effective dates by the new days only, needs end_business_day in event_params
+        self.live_update = live_update
+        if live_update and "end_business_day" not in self.event_params:
+            raise Exception("live_update needs end_business_day in event_params")
+        # stage and effective date timings, kept in memory only unless the caller writes the report
+        self.run_report = run_report if run_report is not None else runReport.run_report()
+        # anything with the call and output layout of blp.bdh, e.g. the synthetic data source of the benchmarks,
+        # bloomberg when not given
+        self.data_source = data_source
 
     def run(self):
 
-        def reconstruct_price_data(price_data):
-            price_data = price_data.unstack().reset_index()
-            price_data.columns = ["bbg_ticker", "item_name", "date", "item_value"]
-            price_data["item_value"] = price_data["item_value"].astype("float")
-            price_data["date"] = price_data["date"].astype("datetime64[ns]")
-            return price_data
+        def adjust_start_end_date_based_on_trade_data(this_trade_df, price_panel):
+            # first and last traded day of every stock in the window in one pass
+            date_array, volume_array = price_panel.get_window("volume", this_stock_list, start_date, end_date)
+            _, price_array = price_panel.get_window("last_price", this_stock_list, start_date, end_date)
+            stock_position = np.arange(len(this_stock_list))
+            active_array = ~np.isnan(volume_array)
+            active_flag = active_array.any(axis=0)
+            # a sentinel row keeps argmax defined for empty windows, halted stocks point to the NaT after the window
+            sentinel_row = np.ones((1, len(stock_position)), dtype=bool)
+            first_row = np.argmax(np.r_[active_array, sentinel_row], axis=0)
+            last_row = len(date_array) - 1 - np.argmax(np.r_[active_array[::-1], sentinel_row], axis=0)
+            date_array = np.r_[date_array, np.datetime64("NaT")]
+            first_row[~active_flag] = -1
+            last_row[~active_flag] = -1
 
-        def adjust_start_end_date_based_on_trade_data(this_trade_df, price_data):
             # halt flag dataframe
-            active_df = price_data[price_data["item_name"] == "volume"].copy()
-            active_df = active_df.dropna(subset=["item_value"])
-            active_stock = list(active_df["bbg_ticker"].drop_duplicates())
-            halt_list = [stock for stock in this_stock_list if stock not in active_stock]
-            halt_df = pd.DataFrame(index=halt_list).reset_index().rename(columns={"index": "bbg_ticker"})
-            halt_df["halt_flag"] = True
+            stock_df = pd.DataFrame({"bbg_ticker": this_stock_list, "halt_flag": ~active_flag})
             logger.info("Got Halt Flag")
 
             # ipo or delist dataframe
-            start_end_date_df = active_df.groupby(["bbg_ticker"])["date"].agg(["min", "max"])
-            ipo_df = start_end_date_df[start_end_date_df["min"] != start_date].reset_index().rename(
-                columns={"min": "ipo_date"}).drop(columns="max")
-            delist_df = start_end_date_df[start_end_date_df["max"] != end_date].reset_index().rename(
-                columns={"max": "delist_date"}).drop(columns="min")
+            ipo_flag = active_flag & (date_array[first_row] != np.datetime64(pd.Timestamp(start_date)))
+            delist_flag = active_flag & (date_array[last_row] != np.datetime64(pd.Timestamp(end_date)))
+            stock_df["ipo_date"] = np.where(ipo_flag, date_array[first_row], np.datetime64("NaT"))
+            stock_df["delist_date"] = np.where(delist_flag, date_array[last_row], np.datetime64("NaT"))
             logger.info("Got IPO Date and Delist Date")
 
-            # ipo return
-            ipo_return_list = []
-            if not ipo_df.empty:
-                for ticker in list(ipo_df["bbg_ticker"].drop_duplicates()):
-                    ipo_return = list(price_data[(price_data["item_name"] == "last_price") &
-                                                 (price_data["bbg_ticker"] == ticker)].sort_values("date")[
-                                          "item_value"].dropna())[:2]
-                    ipo_return = (ipo_return[-1] / ipo_return[0] - 1) * 100
-                    ipo_return_list.append(ipo_return)
-            ipo_df["ipo_return"] = ipo_return_list
+            # ipo return from the first two prices
+            price_array = np.r_[price_array, np.full((1, len(stock_position)), np.nan)]
+            valid_price_array = ~np.isnan(price_array)
+            first_price_row = valid_price_array.argmax(axis=0)
+            valid_price_array[first_price_row, stock_position] = False
+            second_price_row = np.where(valid_price_array.any(axis=0), valid_price_array.argmax(axis=0),
+                                        first_price_row)
+            ipo_return = (price_array[second_price_row, stock_position] /
+                          price_array[first_price_row, stock_position] - 1) * 100
+            stock_df["ipo_return"] = np.where(ipo_flag, ipo_return, np.nan)
             logger.info("Got IPO Return")
 
             # get adjusted trade df
-            if not halt_df.empty:
-                this_trade_df = pd.merge(this_trade_df, halt_df, on=["bbg_ticker"], how="left")
-                this_trade_df["halt_flag"] = this_trade_df["halt_flag"].fillna(False)
-            else:
-                this_trade_df["halt_flag"] = False
-
-            if not ipo_df.empty:
-                this_trade_df = pd.merge(this_trade_df, ipo_df, on=["bbg_ticker"], how="left")
-            else:
-                this_trade_df["ipo_date"] = pd.NaT
-                this_trade_df["ipo_return"] = np.nan
-
-            if not delist_df.empty:
-                this_trade_df = pd.merge(this_trade_df, delist_df, on=["bbg_ticker"], how="left")
-            else:
-                this_trade_df["delist_date"] = pd.NaT
-
-            this_trade_df["trade_start_date"] = [trade_start_date if pd.isnull(ipo_date) else ipo_date
-                                                 for trade_start_date, ipo_date
-                                                 in np.array(this_trade_df[["trade_start_date", "ipo_date"]])]
-            this_trade_df["trade_end_date"] = [trade_end_date if pd.isnull(delist_date) else delist_date
-                                               for trade_end_date, delist_date
-                                               in np.array(this_trade_df[["trade_end_date", "delist_date"]])]
+            this_trade_df = pd.merge(this_trade_df, stock_df, on=["bbg_ticker"], how="left")
+            this_trade_df["trade_start_date"] = this_trade_df["ipo_date"].fillna(this_trade_df["trade_start_date"])
+            this_trade_df["trade_end_date"] = this_trade_df["delist_date"].fillna(this_trade_df["trade_end_date"])
             return this_trade_df
 
-        def get_beta(this_trade_df, price_data, funding_source):
-            stock_beta_df = price_data[(price_data["item_name"] == "beta_adj_overridable") &
-                                       (price_data["date"].isin(
-                                           list(this_trade_df["trade_start_date"].drop_duplicates())))].copy()
-            stock_beta_df = stock_beta_df[["bbg_ticker", "date", "item_value"]].rename(
-                columns={"item_value": "stock_beta",
-                         "date": "trade_start_date"})
-            this_trade_df = pd.merge(this_trade_df, stock_beta_df, on=["bbg_ticker", "trade_start_date"], how="left")
-            fund_beta_df = stock_beta_df[stock_beta_df["bbg_ticker"] == funding_source].rename(
-                columns={"stock_beta": "fund_beta"})
-            this_trade_df = pd.merge(this_trade_df, fund_beta_df.drop(columns=["bbg_ticker"]), on=["trade_start_date"],
-                                     how="left")
+        def get_beta(this_trade_df, price_panel, funding_source):
+            # beta on trade start date, NaN when there is no data on that day
+            beta_array = price_panel.get_field("beta_adj_overridable")
+            if beta_array.size == 0:
+                this_trade_df["stock_beta"], this_trade_df["fund_beta"] = np.nan, np.nan
+                return this_trade_df
+            start_rows = price_panel.get_exact_date_rows(this_trade_df["trade_start_date"].values)
+            stock_columns = price_panel.get_ticker_columns(this_trade_df["bbg_ticker"])
+            fund_columns = price_panel.get_ticker_columns([funding_source] * len(this_trade_df.index))
+            this_trade_df["stock_beta"] = np.where((start_rows >= 0) & (stock_columns >= 0),
+                                                   beta_array[start_rows, stock_columns], np.nan)
+            this_trade_df["fund_beta"] = np.where((start_rows >= 0) & (fund_columns >= 0),
+                                                  beta_array[start_rows, fund_columns], np.nan)
             return this_trade_df
 
-        def get_backtesting_returns(this_trade_df, price_data, funding_source, trade_start_date, trade_end_date):
-            this_return_df = this_trade_df[(this_trade_df["trade_start_date"] == trade_start_date) &
-                                           (this_trade_df["trade_end_date"] == trade_end_date) &
-                                           (this_trade_df["halt_flag"] == False)].copy()
-            if not this_return_df.empty:
-                this_ticker_list = list(this_return_df["bbg_ticker"].drop_duplicates())
-                this_price_data = price_data[(price_data["bbg_ticker"].isin(this_ticker_list + [funding_source])) &
-                                             (price_data["date"] >= trade_start_date) &
-                                             (price_data["date"] <= trade_end_date) &
-                                             (price_data["item_name"] == "last_price")].copy()
-
-                # calculate return [stock, funding, long_short]
-                this_pivot_return_df = pd.pivot_table(this_price_data, index="date", columns="bbg_ticker",
-                                                      values="item_value")
-                this_pivot_return_df = this_pivot_return_df.pct_change()
-                this_pivot_return_df = this_pivot_return_df.fillna(0)
-
-                this_daily_stock_return_df = this_pivot_return_df.stack().reset_index().rename(columns={0: "daily_stock_return"})
-                this_daily_fund_return_df = this_daily_stock_return_df[this_daily_stock_return_df["bbg_ticker"] == funding_source].rename(
-                    columns={"daily_stock_return": "daily_fund_return"})
-
-                this_pivot_return_df = (1 + this_pivot_return_df).cumprod() - 1
-                this_stock_return_df = this_pivot_return_df.stack().reset_index().rename(columns={0: "stock_return"})
-                this_fund_return_df = this_stock_return_df[this_stock_return_df["bbg_ticker"] == funding_source].rename(
-                    columns={"stock_return": "fund_return"})
-
-                this_backtest_df = this_return_df[["trade_id", "bbg_ticker"]].copy()
-                this_backtest_df = pd.merge(this_backtest_df, this_daily_stock_return_df, on=["bbg_ticker"], how="left")
-                this_backtest_df = pd.merge(this_backtest_df, this_daily_fund_return_df.drop(columns=["bbg_ticker"]), on=["date"], how="left")
-                this_backtest_df = pd.merge(this_backtest_df, this_stock_return_df, on=["bbg_ticker", "date"], how="left")
-                this_backtest_df = pd.merge(this_backtest_df, this_fund_return_df.drop(columns=["bbg_ticker"]), on=["date"], how="left")
-
-                this_backtest_df[["stock_return", "fund_return", "daily_fund_return", "daily_stock_return"]] *= 100
-                this_backtest_df["long_short_return"] = this_backtest_df["stock_return"] - this_backtest_df["fund_return"]
-
-                # get date index
-                this_backtest_df = pd.merge(this_backtest_df, this_trade_df[["trade_id", "effective_date"]],
-                                            on=["trade_id"], how="left")
-                this_backtest_df["date_index"] = [np.busday_count(pd.Timestamp(effect_date).date(), pd.Timestamp(date).date())
-                                                  for date, effect_date in np.array(this_backtest_df[["date", "effective_date"]])]
-                this_backtest_df = this_backtest_df.sort_values(["trade_id", "date_index"])
-
-                # calculate drawdown
-                this_backtest_df["roll_max_abs_return"] = this_backtest_df.groupby(["trade_id"])["stock_return"].cummax()
-                this_backtest_df["roll_max_ls_return"] = this_backtest_df.groupby(["trade_id"])["long_short_return"].cummax()
-                this_backtest_df["roll_abs_drawdown"] = this_backtest_df["stock_return"] - this_backtest_df["roll_max_abs_return"]
-                this_backtest_df["roll_ls_drawdown"] = this_backtest_df["long_short_return"] - this_backtest_df["roll_max_ls_return"]
-                this_backtest_df = this_backtest_df.drop(columns=["roll_max_abs_return", "roll_max_ls_return"])
-
-            else:
-                this_backtest_df = pd.DataFrame()
-            return this_backtest_df
-
-        trade_df_list = []
-        backtest_df_list = []
-        for date, start_date, end_date in np.array(self.trade_file[["effective_date",
-                                                                    "trade_start_date",
-                                                                    "trade_end_date"]].drop_duplicates()):
-
-            logger.info("Updateing Effective Date: " + pd.Timestamp(date).strftime("%Y-%m-%d"))
-            this_trade_df = self.trade_file[self.trade_file["effective_date"] == date].copy()
-            this_stock_list = list(this_trade_df["bbg_ticker"].drop_duplicates())
-            this_id_list = this_stock_list + [self.funding_source]
-
-            # get price_data from bloomberg from xbbg
-            price_data = blp.bdh(
-                tickers=this_id_list, flds=["last_price", "volume", "beta_adj_overridable"],
-                start_date=start_date.strftime("%Y-%m-%d"), end_date=end_date.strftime("%Y-%m-%d"),
-            )
-            logger.info("Got Price Data from BBG for Effective Date: " + date.strftime("%Y-%m-%d"))
-
-            # Reconstruct price_data
-            price_data = reconstruct_price_data(price_data=price_data)
-            logger.info("Reconstructed Price Data for Effective Date: " + pd.Timestamp(date).strftime("%Y-%m-%d"))
-
-            # Adjust Start End Date based on Halt Flag, IPO Date and Delist Date
-            this_trade_df = adjust_start_end_date_based_on_trade_data(this_trade_df=this_trade_df, price_data=price_data)
-            logger.info("Adjusted Trade Start End Date based on Halt Flag, IPO Date and Delist Date for Effective Date: " + pd.Timestamp(date).strftime("%Y-%m-%d"))
-
-            # get final trade dataframe with beta
-            this_trade_df = get_beta(this_trade_df=this_trade_df, price_data=price_data,
-                                     funding_source=self.funding_source)
-            trade_df_list.append(this_trade_df)
-            logger.info("Got Final Trade DataFrame with Beta for Effective Date: " + pd.Timestamp(date).strftime("%Y-%m-%d"))
-
-            # get backtesting returns
-            for trade_start_date, trade_end_date in np.array(this_trade_df[["trade_start_date",
-                                                                            "trade_end_date"]].drop_duplicates()):
-                this_backtest_df = get_backtesting_returns(this_trade_df=this_trade_df, price_data=price_data,
-                                                           funding_source=self.funding_source,
-                                                           trade_start_date=trade_start_date, trade_end_date=trade_end_date)
-                if not this_backtest_df.empty:
-                    backtest_df_list.append(this_backtest_df)
-            logger.info("Got BackTesting Returns for Effective Date: " + pd.Timestamp(date).strftime("%Y-%m-%d"))
-
-        trade_df = pd.concat(trade_df_list, sort=True)
-        backtest_df = pd.concat(backtest_df_list, sort=True)
-
-        trade_df.to_csv(self.output_hsci_trade_file_path, index=False)
-        backtest_df.to_csv(self.output_hsci_backtest_file_path, index=False)
+        price_fields = ["last_price", "volume", "beta_adj_overridable"]
+
+        # serve price data from local cache and only fetch missing gaps from bloomberg
+        # calls reaching bloomberg are counted in the run report
+        remote_data_source = runReport.remote_data_source(
+            data_source=self.data_source if self.data_source is not None else get_bloomberg_data_source(),
+            run_report=self.run_report)
+        if self.price_cache_path is not None:
+            data_source = priceCache.price_cache(cache_path=self.price_cache_path, data_source=remote_data_source)
+            logger.info("Use Price Cache in " + self.price_cache_path)
+        else:
+            data_source = remote_data_source
+
+        # effective dates computed earlier from the same rows and parameters are kept in the event store,
+        # only new or changed effective dates are fetched and recomputed
+        store = eventStore.event_store(event_path=self.event_path)
+        if not self.resume:
+            store.clear()
+        event_params = {**self.event_params, "funding_source": self.funding_source, "price_fields": price_fields}
+        fingerprint_dict = {}
+        base_fingerprint_dict = {}
+        end_date_dict = {}
+        in_flight_dict = {}
+        live_date_list = []
+        with self.run_report.stage("fingerprint_events") as stage_dict:
+            for date, event_trade_df in self.trade_file.groupby("effective_date"):
+                fingerprint_dict[date] = eventStore.get_event_fingerprint(event_trade_df=event_trade_df,
+                                                                          event_params=event_params)
+                # same rows apart from the end date clipped to yesterday
+                base_fingerprint_dict[date] = eventStore.get_event_fingerprint(
+                    event_trade_df=event_trade_df.drop(columns=["trade_end_date"]), event_params=event_params)
+                end_date_dict[date] = event_trade_df["trade_end_date"].max()
+                in_flight_dict[date] = self.live_update and liveUpdate.is_in_flight(
+                    event_trade_df=event_trade_df, end_business_day=self.event_params["end_business_day"])
+                is_finished = store.is_finished(date, fingerprint_dict[date])
+                # in flight effective dates are extended by the new days, until their window is complete
+                if not is_finished and in_flight_dict[date] and \
+                        store.is_live(date, base_fingerprint_dict[date], end_date_dict[date]):
+                    live_date_list.append(date)
+                # trade ids move when new reviews are added on top of the change file
+                if is_finished or date in live_date_list:
+                    trade_ids = sorted(int(trade_id) for trade_id in event_trade_df["trade_id"])
+                    if store.get_trade_ids(date) != trade_ids:
+                        store.renumber_event(effective_date=date, trade_ids=trade_ids)
+            stage_dict["events"] = len(fingerprint_dict)
+
+        with self.run_report.stage("live_update") as stage_dict:
+            for date in list(live_date_list):
+                logger.info("Live Update of Effective Date: " + date.strftime("%Y-%m-%d"))
+                live_result = liveUpdate.extend_event(
+                    trade_df=store.read_event_df(date, "trade"), backtest_df=store.read_event_df(date, "backtest"),
+                    state_df=store.read_event_df(date, "state"), end_date=end_date_dict[date], data_source=data_source,
+                    funding_source=self.funding_source)
+                # changed halt or delist flags, left for the full recompute below
+                if live_result is None:
+                    live_date_list.remove(date)
+                    continue
+                this_trade_df, this_backtest_df, this_state_df = live_result
+                store.write_event(effective_date=date, trade_df=this_trade_df, backtest_df=this_backtest_df,
+                                  fingerprint=fingerprint_dict[date], state_df=this_state_df,
+                                  base_fingerprint=base_fingerprint_dict[date], end_date=end_date_dict[date])
+            stage_dict["events"] = len(live_date_list)
+
+        event_array = np.array(self.trade_file[["effective_date", "trade_start_date", "trade_end_date"]].drop_duplicates())
+        effective_dates = list(event_array[:, 0])
+        event_array = np.array([event for event in event_array if not store.is_finished(
+            event[0], fingerprint_dict[pd.Timestamp(event[0])])]).reshape(-1, 3)
+        logger.info("Incremental BackTest with %s unchanged, %s live updated and %s new or changed Effective Dates" % (
+            len(effective_dates) - len(event_array) - len(live_date_list), len(live_date_list), len(event_array)))
+        remaining_trade_file = self.trade_file[self.trade_file["effective_date"].isin(event_array[:, 0])]
+
+        # get price_data from bloomberg from xbbg in bulk requests covering all remaining effective dates,
+        # fetched concurrently while earlier effective dates are computed
+        fetch_plan = fetchPlanner.get_fetch_plan(trade_file=remaining_trade_file, funding_source=self.funding_source,
+                                                 batch_size=self.fetch_batch_size)
+        event_list = [(list(remaining_trade_file[remaining_trade_file["effective_date"] == date]["bbg_ticker"].drop_duplicates()) +
+                       [self.funding_source], start_date, end_date) for date, start_date, end_date in event_array]
+        scheduler = fetchScheduler.fetch_scheduler(data_source=data_source,
+                                                   flds=price_fields,
+                                                   max_in_flight=self.max_in_flight_requests,
+                                                   max_retries=self.fetch_max_retries,
+                                                   backoff_seconds=self.fetch_backoff_seconds)
+        price_data_generator = scheduler.get_event_price_data(fetch_plan=fetch_plan, event_list=event_list)
+
+        with self.run_report.stage("backtest_events") as stage_dict:
+            stage_dict["events"] = len(event_array)
+            stage_dict["rows"] = 0
+            event_end = time.perf_counter()
+            for (date, start_date, end_date), price_data in zip(event_array, price_data_generator):
+                # waiting on the scheduler is fetch time, the rest of the loop is compute time
+                compute_start = time.perf_counter()
+                fetch_wait_seconds = compute_start - event_end
+
+                logger.info("Updateing Effective Date: " + pd.Timestamp(date).strftime("%Y-%m-%d"))
+                this_trade_df = remaining_trade_file[remaining_trade_file["effective_date"] == date].copy()
+                this_stock_list = list(this_trade_df["bbg_ticker"].drop_duplicates())
+                logger.info("Got Price Data for Effective Date: " + pd.Timestamp(date).strftime("%Y-%m-%d"))
+
+                # Reconstruct price_data as a price panel
+                price_panel = pricePanel.get_price_panel_from_bdh(price_data=price_data, flds=price_fields)
+                logger.info("Reconstructed Price Panel for Effective Date: " + pd.Timestamp(date).strftime("%Y-%m-%d"))
+
+                # Adjust Start End Date based on Halt Flag, IPO Date and Delist Date
+                this_trade_df = adjust_start_end_date_based_on_trade_data(this_trade_df=this_trade_df,
+                                                                          price_panel=price_panel)
+                logger.info("Adjusted Trade Start End Date based on Halt Flag, IPO Date and Delist Date for Effective Date: " + pd.Timestamp(date).strftime("%Y-%m-%d"))
+
+                # get final trade dataframe with beta
+                this_trade_df = get_beta(this_trade_df=this_trade_df, price_panel=price_panel,
+                                         funding_source=self.funding_source)
+                logger.info("Got Final Trade DataFrame with Beta for Effective Date: " + pd.Timestamp(date).strftime("%Y-%m-%d"))
+
+                # get backtesting returns of the effective date and stream both frames to disk,
+                # the engine takes any number of windows at once but is run per effective date here,
+                # so it overlaps the fetch scheduler and each finished event can be resumed from the store
+                this_backtest_df = backtestEngine.get_backtest_returns(trade_df=this_trade_df, price_panel=price_panel,
+                                                                       funding_source=self.funding_source)
+                # in flight effective dates keep the last state of their trades for the next live update
+                this_state_df = None
+                if in_flight_dict[pd.Timestamp(date)]:
+                    this_state_df = liveUpdate.get_live_state(trade_df=this_trade_df, backtest_df=this_backtest_df,
+                                                              price_panel=price_panel,
+                                                              funding_source=self.funding_source)
+                store.write_event(effective_date=date, trade_df=this_trade_df, backtest_df=this_backtest_df,
+                                  fingerprint=fingerprint_dict[pd.Timestamp(date)], state_df=this_state_df,
+                                  base_fingerprint=base_fingerprint_dict[pd.Timestamp(date)],
+                                  end_date=end_date_dict[pd.Timestamp(date)])
+                logger.info("Saved BackTesting Returns for Effective Date: " + pd.Timestamp(date).strftime("%Y-%m-%d"))
+                event_end = time.perf_counter()
+                self.run_report.add_event(effective_date=date, fetch_wait_seconds=round(fetch_wait_seconds, 4),
+                                          compute_seconds=round(event_end - compute_start, 4),
+                                          trade_rows=len(this_trade_df.index),
+                                          backtest_rows=len(this_backtest_df.index),
+                                          price_rows=len(price_panel.date_array) * len(price_panel.ticker_list))
+                stage_dict["rows"] += len(this_backtest_df.index)
+
+        # output files are concatenated from the event store one effective date at a time
+        self.event_store = store
+        self.effective_dates = effective_dates
+        with self.run_report.stage("write_output_files") as stage_dict:
+            trade_df = store.read_trade_df(effective_dates=effective_dates)
+            output_path_list = outputStore.write_output_files(
+                trade_df=trade_df,
+                get_backtest_df_list=lambda: store.iter_event_df(effective_dates=effective_dates,
+                                                                 file_type="backtest"),
+                output_hsci_trade_file_path=self.output_hsci_trade_file_path,
+                output_hsci_backtest_file_path=self.output_hsci_backtest_file_path, output_format=self.output_format)
+            stage_dict["rows"] = len(trade_df.index)
+
+        if self.price_cache_path is not None:
+            logger.info("Remote Calls from Price Cache: " + str(data_source.remote_call_count))
 
         logger.info('''
-        Output Trade DataFrame to:
-        %s
-        Output BackTest DataFrame to:
+        Output Trade DataFrame and BackTest DataFrame to:
         %s
-        ''' % (self.output_hsci_trade_file_path, self.output_hsci_backtest_file_path))
\ No newline at end of file
+        ''' % ("\n        ".join(output_path_list)))
+        return trade_df
+
+    def read_backtest_df(self, columns=None):
+        # backtest returns of all effective dates of the last run, read from the event store
+        return self.event_store.read_backtest_df(effective_dates=self.effective_dates, columns=columns)
@@ -0,0 +1,135 @@
+import pandas as pd
+import os
+import json
+import glob
+import hashlib
+from config import log
+
+logger = log.get_logger()
+
+def get_event_fingerprint(event_trade_df, event_params):
+    # rows of one effective date in trade id order without the ids, which move when new reviews are added,
+    # plus the parameters the results depend on
+    event_trade_df = event_trade_df.sort_values("trade_id").drop(columns=["trade_id"]).sort_index(axis=1)
+    event_hash = hashlib.sha256(event_trade_df.to_csv(index=False).encode("utf-8"))
+    event_hash.update(json.dumps(event_params, sort_keys=True, default=str).encode("utf-8"))
+    return event_hash.hexdigest()
+
+class event_store():
+    '''
+    Results of get_backtest_files kept per effective date on disk.
+    Each finished event writes its trade frame and backtest frame, then is recorded in manifest.json with
+    the fingerprint of its input, so a rerun only recomputes new or changed events and the output files
+    are concatenated from here when read. Events still in flight also keep the last state of their trades,
+    so live updates append new days to them instead of recomputing.
+    '''
+    def __init__(self, event_path):
+        self.event_path = event_path
+        self.manifest_path = event_path + "/manifest.json"
+        if not os.path.exists(event_path):
+            os.makedirs(event_path)
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r") as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {"events": {}}
+
+    @staticmethod
+    def get_event_key(effective_date):
+        return pd.Timestamp(effective_date).strftime("%Y-%m-%d")
+
+    def get_event_file_path(self, effective_date, file_type):
+        return self.event_path + "/" + self.get_event_key(effective_date) + "_" + file_type + ".pkl"
+
+    def save_manifest(self):
+        temp_manifest_path = self.manifest_path + ".tmp"
+        with open(temp_manifest_path, "w") as f:
+            json.dump(self.manifest, f, indent=1, sort_keys=True)
+        os.replace(temp_manifest_path, self.manifest_path)
+
+    def is_finished(self, effective_date, fingerprint=None):
+        # finished, and computed from the same input when a fingerprint is given
+        event_dict = self.manifest["events"].get(self.get_event_key(effective_date))
+        if event_dict is None:
+            return False
+        return fingerprint is None or event_dict.get("fingerprint") == fingerprint
+
+    def get_trade_ids(self, effective_date):
+        return self.manifest["events"][self.get_event_key(effective_date)]["trade_ids"]
+
+    def renumber_event(self, effective_date, trade_ids):
+        # same rows under new trade ids, in trade id order, unfinished until every file is renumbered
+        trade_id_dict = dict(zip(self.get_trade_ids(effective_date), trade_ids))
+        event_dict = self.manifest["events"].pop(self.get_event_key(effective_date))
+        self.save_manifest()
+        for file_type in ["trade", "backtest", "state"]:
+            event_file_path = self.get_event_file_path(effective_date, file_type)
+            if not os.path.exists(event_file_path):
+                continue
+            event_df = pd.read_pickle(event_file_path)
+            if not event_df.empty:
+                event_df["trade_id"] = event_df["trade_id"].map(trade_id_dict)
+            event_df.to_pickle(event_file_path + ".tmp")
+            os.replace(event_file_path + ".tmp", event_file_path)
+        event_dict["trade_ids"] = list(trade_ids)
+        self.manifest["events"][self.get_event_key(effective_date)] = event_dict
+        self.save_manifest()
+
+    def is_live(self, effective_date, base_fingerprint, end_date):
+        # in flight event of the same rows apart from the end date, which can be extended up to end_date
+        event_dict = self.manifest["events"].get(self.get_event_key(effective_date))
+        if event_dict is None or event_dict.get("base_fingerprint") != base_fingerprint:
+            return False
+        if not os.path.exists(self.get_event_file_path(effective_date, "state")):
+            return False
+        return event_dict.get("end_date") is not None and pd.Timestamp(event_dict["end_date"]) < pd.Timestamp(end_date)
+
+    def write_event(self, effective_date, trade_df, backtest_df, fingerprint=None, state_df=None,
+                    base_fingerprint=None, end_date=None):
+        # files first, the manifest entry marks the event as finished
+        file_list = [("trade", trade_df), ("backtest", backtest_df)]
+        if state_df is not None:
+            file_list.append(("state", state_df))
+        elif os.path.exists(self.get_event_file_path(effective_date, "state")):
+            os.remove(self.get_event_file_path(effective_date, "state"))
+        for file_type, df in file_list:
+            event_file_path = self.get_event_file_path(effective_date, file_type)
+            df.to_pickle(event_file_path + ".tmp")
+            os.replace(event_file_path + ".tmp", event_file_path)
+        self.manifest["events"][self.get_event_key(effective_date)] = {
+            "fingerprint": fingerprint,
+            "trade_ids": sorted(int(trade_id) for trade_id in trade_df["trade_id"]),
+            "trade_count": len(trade_df.index),
+            "backtest_rows": len(backtest_df.index),
+            "base_fingerprint": base_fingerprint,
+            "end_date": None if end_date is None else self.get_event_key(end_date)}
+        self.save_manifest()
+
+    def clear(self):
+        for event_file_path in glob.glob(self.event_path + "/*.pkl"):
+            os.remove(event_file_path)
+        self.manifest = {"events": {}}
+        self.save_manifest()
+
+    def read_event_df(self, effective_date, file_type):
+        return pd.read_pickle(self.get_event_file_path(effective_date, file_type))
+
+    def iter_event_df(self, effective_dates, file_type, columns=None):
+        # one finished event at a time, in the order of effective_dates
+        for effective_date in effective_dates:
+            if not self.is_finished(effective_date):
+                continue
+            event_df = pd.read_pickle(self.get_event_file_path(effective_date, file_type))
+            if event_df.empty:
+                continue
+            yield event_df if columns is None else event_df[columns]
+
+    def read_trade_df(self, effective_dates):
+        trade_df_list = list(self.iter_event_df(effective_dates, "trade"))
+        return pd.concat(trade_df_list, sort=True) if trade_df_list != [] else pd.DataFrame()
+
+    def read_backtest_df(self, effective_dates, columns=None):
+        backtest_df_list = list(self.iter_event_df(effective_dates, "backtest", columns=columns))
+        if backtest_df_list == []:
+            return pd.DataFrame()
+        return pd.concat(backtest_df_list).sort_values(["trade_id", "date_index"]).reset_index(drop=True)
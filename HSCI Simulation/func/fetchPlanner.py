@@ -0,0 +1,60 @@
+import pandas as pd
+from config import log
+from func.priceCache import merge_date_ranges
+
+logger = log.get_logger()
+
+def get_fetch_plan(trade_file, funding_source, batch_size):
+    # every ticker needs its [trade_start_date, trade_end_date] window, the funding source needs all windows
+    window_df = trade_file[["bbg_ticker", "trade_start_date", "trade_end_date"]].drop_duplicates()
+    fund_window_df = trade_file[["trade_start_date", "trade_end_date"]].drop_duplicates()
+    fund_window_df["bbg_ticker"] = funding_source
+    window_df = pd.concat([window_df, fund_window_df], sort=True)
+
+    # merge overlapping windows per ticker into the smallest set of disjoint ranges
+    range_dict = {}
+    for ticker, ticker_window_df in window_df.groupby("bbg_ticker"):
+        for start_date, end_date in merge_date_ranges(
+                zip(ticker_window_df["trade_start_date"], ticker_window_df["trade_end_date"])):
+            range_dict.setdefault((start_date, end_date), []).append(ticker)
+
+    # tickers sharing a range go into the same multi-ticker request
+    fetch_plan = []
+    for (start_date, end_date), tickers in sorted(range_dict.items()):
+        for batch_start in range(0, len(tickers), batch_size):
+            fetch_plan.append({"tickers": tickers[batch_start:batch_start + batch_size],
+                               "start_date": start_date,
+                               "end_date": end_date})
+    logger.info("Planned %s Bulk Requests for %s Effective Date Windows" % (
+        len(fetch_plan), len(fund_window_df.index)))
+    return fetch_plan
+
+def add_price_data(price_store, price_data):
+    # split a bdh result into the per ticker frames of price_store
+    if price_data.empty:
+        return price_store
+    for ticker in price_data.columns.get_level_values(0).drop_duplicates():
+        ticker_data = price_data[ticker].dropna(how="all")
+        ticker_data.index = pd.DatetimeIndex(ticker_data.index)
+        if ticker in price_store:
+            ticker_data = pd.concat([price_store[ticker], ticker_data], sort=True)
+            ticker_data = ticker_data[~ticker_data.index.duplicated(keep="last")].sort_index()
+        price_store[ticker] = ticker_data
+    return price_store
+
+def get_event_price_data(price_store, tickers, start_date, end_date):
+    # slice one effective date out of the bulk result, same layout as blp.bdh
+    start_date = pd.Timestamp(start_date)
+    end_date = pd.Timestamp(end_date)
+    price_data_dict = {}
+    for ticker in tickers:
+        if ticker not in price_store:
+            continue
+        ticker_data = price_store[ticker]
+        ticker_data = ticker_data[(ticker_data.index >= start_date) & (ticker_data.index <= end_date)]
+        if not ticker_data.empty:
+            price_data_dict[ticker] = ticker_data
+
+    if price_data_dict == {}:
+        return pd.DataFrame()
+    return pd.concat(price_data_dict, axis=1, sort=True)
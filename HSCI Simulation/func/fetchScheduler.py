@@ -0,0 +1,78 @@
+import pandas as pd
+import time
+from config import log
+from concurrent.futures import ThreadPoolExecutor
+from func import fetchPlanner
+
+logger = log.get_logger()
+
+class fetch_scheduler():
+    '''
+    Runs the bulk requests of a fetch plan on a bounded thread pool and hands out the price data of each
+    effective date as soon as the requests it depends on are done, so fetching overlaps the per-event computation.
+    '''
+    def __init__(self, data_source, flds, max_in_flight, max_retries, backoff_seconds):
+        self.data_source = data_source
+        self.flds = flds
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.price_store = {}
+
+    def fetch_request(self, request):
+        attempt = 0
+        while True:
+            try:
+                return self.data_source.bdh(tickers=request["tickers"], flds=self.flds,
+                                            start_date=request["start_date"].strftime("%Y-%m-%d"),
+                                            end_date=request["end_date"].strftime("%Y-%m-%d"))
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    raise
+                wait_seconds = self.backoff_seconds * 2 ** attempt
+                logger.warning("Request for %s tickers from %s to %s failed (%s), retry in %s seconds" % (
+                    len(request["tickers"]), request["start_date"].strftime("%Y-%m-%d"),
+                    request["end_date"].strftime("%Y-%m-%d"), e, wait_seconds))
+                time.sleep(wait_seconds)
+                attempt += 1
+
+    def get_event_request_list(self, fetch_plan, event_list):
+        # requests each effective date depends on
+        event_request_list = []
+        for tickers, start_date, end_date in event_list:
+            start_date = pd.Timestamp(start_date)
+            end_date = pd.Timestamp(end_date)
+            ticker_set = set(tickers)
+            event_request_list.append([request_num for request_num, request in enumerate(fetch_plan)
+                                       if request["end_date"] >= start_date and request["start_date"] <= end_date
+                                       and not ticker_set.isdisjoint(request["tickers"])])
+        return event_request_list
+
+    def get_event_price_data(self, fetch_plan, event_list):
+        # event_list holds (tickers, start_date, end_date), price data is yielded in the same order
+        event_request_list = self.get_event_request_list(fetch_plan=fetch_plan, event_list=event_list)
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            # submit in the order the events need them
+            future_dict = {}
+            for request_list in event_request_list:
+                for request_num in request_list:
+                    if request_num not in future_dict:
+                        future_dict[request_num] = executor.submit(self.fetch_request, fetch_plan[request_num])
+
+            # last event needing each ticker, its data is released once that event is handed out
+            last_event_dict = {ticker: event_num for event_num, (tickers, start_date, end_date)
+                               in enumerate(event_list) for ticker in tickers}
+
+            merged_request_set = set()
+            for event_num, ((tickers, start_date, end_date), request_list) in enumerate(
+                    zip(event_list, event_request_list)):
+                for request_num in request_list:
+                    if request_num not in merged_request_set:
+                        self.price_store = fetchPlanner.add_price_data(price_store=self.price_store,
+                                                                       price_data=future_dict[request_num].result())
+                        merged_request_set.add(request_num)
+                yield fetchPlanner.get_event_price_data(price_store=self.price_store, tickers=tickers,
+                                                        start_date=start_date, end_date=end_date)
+                for ticker in list(self.price_store.keys()):
+                    if last_event_dict.get(ticker, -1) <= event_num:
+                        del self.price_store[ticker]
@@ -0,0 +1,173 @@
+import pandas as pd
+import numpy as np
+from config import log
+from func import pricePanel
+from func import tradingCalendar
+
+logger = log.get_logger()
+
+def get_live_state(trade_df, backtest_df, price_panel, funding_source):
+    '''
+    Last state of every backtested trade of one effective date: last date, cumulative returns,
+    running maxima for the drawdowns and the last (padded) stock and fund price,
+    enough to append new days without the history.
+    '''
+    if backtest_df.empty:
+        return pd.DataFrame()
+    backtest_df = backtest_df.sort_values(["trade_id", "date_index"])
+    trade_group = backtest_df.groupby("trade_id")
+    state_df = trade_group[["bbg_ticker", "date", "date_index", "stock_return", "fund_return"]].last()
+    state_df["max_stock_return"] = trade_group["stock_return"].max()
+    state_df["max_long_short_return"] = trade_group["long_short_return"].max()
+    state_df = state_df.reset_index().rename(columns={"date": "last_date", "date_index": "last_date_index"})
+    state_df = pd.merge(state_df, trade_df[["trade_id", "trade_start_date"]], on=["trade_id"], how="left")
+
+    # last price on or before the last date inside the trade window, as the backtest pads it
+    price_array = price_panel.get_field("last_price")
+    row_position = np.arange(len(price_panel.date_array))[:, None]
+    last_valid_array = np.maximum.accumulate(np.where(~np.isnan(price_array), row_position, -1), axis=0)
+    last_rows = price_panel.get_exact_date_rows(state_df["last_date"].values)
+    start_rows = np.searchsorted(price_panel.date_array, state_df["trade_start_date"].values.astype("datetime64[ns]"))
+    for column, tickers in [("last_stock_price", state_df["bbg_ticker"]),
+                            ("last_fund_price", [funding_source] * len(state_df.index))]:
+        columns = price_panel.get_ticker_columns(tickers)
+        valid_rows = np.where(columns >= 0, last_valid_array[last_rows, columns], -1)
+        valid_flag = (columns >= 0) & (last_rows >= 0) & (valid_rows >= start_rows)
+        state_df[column] = np.where(valid_flag, price_array[valid_rows, columns], np.nan)
+    return state_df.drop(columns=["trade_start_date"])
+
+def is_in_flight(event_trade_df, end_business_day):
+    # window clipped before its planned end, e.g. an effective date within the last end_business_day days
+    planned_end_date = tradingCalendar.shift_trading_days(dates=event_trade_df["effective_date"],
+                                                          business_days=end_business_day,
+                                                          listing_places=event_trade_df["listing_place"])
+    return bool((pd.DatetimeIndex(event_trade_df["trade_end_date"]) < planned_end_date).any())
+
+def get_flag_change(trade_df, price_panel, start_date, end_date):
+    '''
+    Trades whose halt or delist flag would differ with the new days, as the full backtest sets them from volume:
+    halted or delisted trades with volume after the stored window, or open trades without volume on end_date.
+    '''
+    date_array, volume_array = price_panel.get_window("volume", trade_df["bbg_ticker"], start_date, end_date)
+    active_array = ~np.isnan(volume_array)
+    delist_array = pd.DatetimeIndex(trade_df["delist_date"]).values
+    halt_flag = (trade_df["halt_flag"] == True).values
+    delist_flag = ~halt_flag & ~np.isnat(delist_array)
+    reopen_flag = (halt_flag & active_array.any(axis=0)) | \
+                  (delist_flag & (active_array & (date_array[:, None] > delist_array[None, :])).any(axis=0))
+    close_flag = ~halt_flag & ~delist_flag & ~active_array[date_array == np.datetime64(end_date)].any(axis=0)
+    return reopen_flag | close_flag
+
+def extend_event(trade_df, backtest_df, state_df, end_date, data_source, funding_source):
+    '''
+    Append the days after the last stored date of every open trade up to end_date to the trades of one
+    effective date. Only last_price and volume of the new days are requested, cumulative returns and drawdowns
+    continue from state_df, so the cost does not depend on how long the trades have been running.
+    Returns None when the new days change a halt or delist flag, the effective date is then fully recomputed.
+    '''
+    end_date = pd.Timestamp(end_date)
+    open_flag = (trade_df["halt_flag"] == False) & trade_df["delist_date"].isnull()
+    if state_df.empty:
+        return None
+    open_state_df = state_df[state_df["trade_id"].isin(trade_df[open_flag]["trade_id"])]
+    if open_state_df.empty:
+        return None
+    trade_df = trade_df.copy()
+    # halted trades move with the window as well, only a delist date ends a trade early
+    trade_df.loc[trade_df["delist_date"].isnull(), "trade_end_date"] = end_date
+    # new days of the open trades, and the days after each delist date where a delisted stock must stay quiet
+    start_date = min(pd.Timestamp(open_state_df["last_date"].min()),
+                     pd.Timestamp(trade_df["delist_date"].min()) if trade_df["delist_date"].notnull().any()
+                     else end_date) + pd.Timedelta(days=1)
+    if start_date > end_date:
+        return trade_df, backtest_df, state_df
+
+    ticker_list = list(trade_df["bbg_ticker"].drop_duplicates()) + [funding_source]
+    price_fields = ["last_price", "volume"]
+    price_data = data_source.bdh(tickers=ticker_list, flds=price_fields, start_date=start_date.strftime("%Y-%m-%d"),
+                                 end_date=end_date.strftime("%Y-%m-%d"))
+    price_panel = pricePanel.get_price_panel_from_bdh(price_data=price_data, flds=price_fields)
+    logger.info("Got %s new days of Price Data for %s open Trades" % (len(price_panel.date_array),
+                                                                      len(open_state_df.index)))
+    flag_change = get_flag_change(trade_df=trade_df, price_panel=price_panel, start_date=start_date,
+                                  end_date=end_date)
+    if flag_change.any():
+        logger.info("Halt or Delist Flag of %s Trades changed, Effective Date is fully recomputed" % (
+            flag_change.sum()))
+        return None
+
+    new_backtest_df_list = []
+    new_state_df_list = []
+    open_trade_df = pd.merge(open_state_df, trade_df[["trade_id", "effective_date", "trade_start_date",
+                                                      "listing_place"]], on=["trade_id"], how="left")
+    for (_, last_date, listing_place), group_state_df in open_trade_df.groupby(["trade_start_date", "last_date",
+                                                                                 "listing_place"]):
+        # every trade continues after its own last stored day, the dates of a group are the trading days
+        # of its listing place on which any of its stocks or the funding source has a price
+        group_start_date = pd.Timestamp(last_date) + pd.Timedelta(days=1)
+        date_array, stock_price_array = price_panel.get_window("last_price", group_state_df["bbg_ticker"],
+                                                               group_start_date, end_date)
+        _, fund_price_array = price_panel.get_window("last_price", [funding_source], group_start_date, end_date)
+        group_date_flag = ~np.isnan(np.c_[stock_price_array, fund_price_array]).all(axis=1) & \
+            tradingCalendar.get_trading_calendar(listing_place).is_trading_day(date_array)
+        date_array = date_array[group_date_flag]
+        if len(date_array) == 0:
+            new_state_df_list.append(group_state_df[state_df.columns])
+            continue
+
+        # padded prices starting from the last stored price of each trade
+        stock_price = pd.DataFrame(np.r_[[group_state_df["last_stock_price"].values],
+                                         stock_price_array[group_date_flag]]).ffill().values
+        fund_price = pd.DataFrame(np.r_[[group_state_df["last_fund_price"].values],
+                                        np.repeat(fund_price_array[group_date_flag], len(group_state_df.index),
+                                                  axis=1)]).ffill().values
+        this_new_df_list = []
+        for prefix, price in [("stock", stock_price), ("fund", fund_price)]:
+            last_return = group_state_df[prefix + "_return"].values / 100
+            # base price of the window, the first new price when the trade had none yet
+            first_price = pd.DataFrame(price[1:]).bfill().values[0] if len(price) > 1 else price[0]
+            base_price = np.where(np.isnan(price[0]), first_price, price[0] / (1 + last_return))
+            cumulative_return = np.where(np.isnan(price[1:]), 0, price[1:] / base_price - 1)
+            daily_return = np.where(np.isnan(price[1:]) | np.isnan(price[:-1]), 0, price[1:] / price[:-1] - 1)
+            this_new_df_list.append((cumulative_return * 100, daily_return * 100))
+
+        (stock_return, daily_stock_return), (fund_return, daily_fund_return) = this_new_df_list
+        long_short_return = stock_return - fund_return
+        max_stock_return = np.maximum(np.maximum.accumulate(stock_return, axis=0),
+                                      group_state_df["max_stock_return"].values)
+        max_long_short_return = np.maximum(np.maximum.accumulate(long_short_return, axis=0),
+                                           group_state_df["max_long_short_return"].values)
+
+        date_num, trade_num = stock_return.shape
+        new_backtest_df = pd.DataFrame({"trade_id": np.tile(group_state_df["trade_id"].values, date_num),
+                                        "bbg_ticker": np.tile(group_state_df["bbg_ticker"].values, date_num),
+                                        "date": np.repeat(date_array, trade_num),
+                                        "daily_stock_return": daily_stock_return.ravel(),
+                                        "daily_fund_return": daily_fund_return.ravel(),
+                                        "stock_return": stock_return.ravel(),
+                                        "fund_return": fund_return.ravel(),
+                                        "effective_date": np.tile(group_state_df["effective_date"].values, date_num),
+                                        "long_short_return": long_short_return.ravel(),
+                                        "roll_abs_drawdown": (stock_return - max_stock_return).ravel(),
+                                        "roll_ls_drawdown": (long_short_return - max_long_short_return).ravel()})
+        new_backtest_df["date_index"] = tradingCalendar.get_date_index(
+            dates=new_backtest_df["date"].values, effective_dates=new_backtest_df["effective_date"].values,
+            listing_places=np.tile(group_state_df["listing_place"].values, date_num))
+        new_backtest_df_list.append(new_backtest_df)
+
+        # state after the last new day
+        group_state_df = group_state_df.copy()
+        group_state_df["last_date"] = date_array[-1]
+        group_state_df["last_date_index"] = new_backtest_df["date_index"].values[-trade_num:]
+        group_state_df["stock_return"] = stock_return[-1]
+        group_state_df["fund_return"] = fund_return[-1]
+        group_state_df["max_stock_return"] = max_stock_return[-1]
+        group_state_df["max_long_short_return"] = max_long_short_return[-1]
+        group_state_df["last_stock_price"] = stock_price[-1]
+        group_state_df["last_fund_price"] = fund_price[-1]
+        new_state_df_list.append(group_state_df[state_df.columns])
+
+    backtest_df = pd.concat([backtest_df] + new_backtest_df_list, sort=True)
+    backtest_df = backtest_df.sort_values(["trade_id", "date_index"]).reset_index(drop=True)
+    state_df = pd.concat([state_df[~state_df["trade_id"].isin(open_state_df["trade_id"])]] + new_state_df_list)
+    return trade_df, backtest_df.sort_index(axis=1), state_df.reset_index(drop=True)
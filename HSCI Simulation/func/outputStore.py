@@ -0,0 +1,111 @@
+import pandas as pd
+import os
+import shutil
+from config import log
+
+logger = log.get_logger()
+
+partition_column = "effective_year"
+
+def get_parquet():
+    # pyarrow is only needed for the parquet output format
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise Exception("pyarrow is required for output_format parquet. Please pip install pyarrow")
+    return pyarrow, pyarrow.parquet
+
+def get_dataset_path(file_path):
+    # hsci_backtest_file.csv -> hsci_backtest_file.parquet (a directory of year partitions)
+    return os.path.splitext(file_path)[0] + ".parquet"
+
+def write_dataset(df_list, dataset_path):
+    '''
+    Write the frames of df_list as one zstd compressed parquet dataset partitioned by year of effective_date
+    (effective_year=2020/...). Column types are kept, so dates come back as datetime64 without parsing.
+    Frames are written one at a time, df_list may be a generator.
+    '''
+    pyarrow, parquet = get_parquet()
+
+    # write next to the old dataset and swap, readers never see a half written dataset
+    temp_dataset_path = dataset_path + ".tmp"
+    if os.path.exists(temp_dataset_path):
+        shutil.rmtree(temp_dataset_path)
+    os.makedirs(temp_dataset_path)
+    for part_num, df in enumerate(df_list):
+        if df.empty:
+            continue
+        df = df.copy()
+        df[partition_column] = df["effective_date"].dt.year
+        table = pyarrow.Table.from_pandas(df, preserve_index=False)
+        parquet.write_to_dataset(table, root_path=temp_dataset_path, partition_cols=[partition_column],
+                                 compression="zstd", basename_template="part-%s-{i}.parquet" % part_num)
+    if os.path.exists(dataset_path):
+        shutil.rmtree(dataset_path)
+    os.replace(temp_dataset_path, dataset_path)
+
+def write_csv_file(df_list, file_path):
+    # frames appended one at a time under the header of the first frame, every frame needs the same columns
+    temp_file_path = file_path + ".tmp"
+    column_list = None
+    try:
+        with open(temp_file_path, "w", newline="") as f:
+            for df in df_list:
+                if df.empty:
+                    continue
+                if column_list is None:
+                    column_list = list(df.columns)
+                    df.to_csv(f, index=False)
+                    continue
+                if set(df.columns) != set(column_list):
+                    raise Exception("Columns of %s differ from its first frame, missing %s, extra %s" % (
+                        file_path, [column for column in column_list if column not in df.columns],
+                        [column for column in df.columns if column not in column_list]))
+                df[column_list].to_csv(f, index=False, header=False)
+    except BaseException:
+        # the old file stays as it was, no half written temp file is left behind
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+        raise
+    os.replace(temp_file_path, file_path)
+
+def read_dataset(dataset_path, columns=None, filters=None):
+    '''
+    Read a dataset written by write_dataset.
+    columns only reads those columns, filters are pyarrow filters pushed down to the files,
+    e.g. [("review_type", "==", "Regular")] or [("effective_year", ">=", 2015)] which also skips partitions.
+    '''
+    pyarrow, parquet = get_parquet()
+    if not os.path.exists(dataset_path):
+        raise Exception("No Parquet Dataset in " + dataset_path)
+    read_columns = None if columns is None else [column for column in columns if column != partition_column]
+    table = parquet.read_table(dataset_path, columns=read_columns, filters=filters, partitioning="hive")
+    df = table.to_pandas()
+    return df.drop(columns=[partition_column], errors="ignore")
+
+def read_backtest_dataset(trade_dataset_path, backtest_dataset_path, columns=None, filters=None,
+                          trade_filters=None):
+    # backtest rows of the trades selected by trade_filters, only reading the years those trades are in
+    if trade_filters is not None:
+        trade_df = read_dataset(trade_dataset_path, columns=["trade_id", "effective_date"], filters=trade_filters)
+        filters = list(filters or []) + [("trade_id", "in", list(trade_df["trade_id"])),
+                                         (partition_column, "in", list(trade_df["effective_date"].dt.year.unique()))]
+    return read_dataset(backtest_dataset_path, columns=columns, filters=filters)
+
+def write_output_files(trade_df, get_backtest_df_list, output_hsci_trade_file_path,
+                       output_hsci_backtest_file_path, output_format):
+    # csv, parquet or both, get_backtest_df_list returns the backtest frames for one pass over them
+    if output_format not in ["csv", "parquet", "both"]:
+        raise Exception("output_format only accepts csv, parquet, both")
+    output_path_list = []
+    if output_format in ["csv", "both"]:
+        trade_df.to_csv(output_hsci_trade_file_path, index=False)
+        write_csv_file(get_backtest_df_list(), output_hsci_backtest_file_path)
+        output_path_list += [output_hsci_trade_file_path, output_hsci_backtest_file_path]
+    if output_format in ["parquet", "both"]:
+        write_dataset([trade_df], get_dataset_path(output_hsci_trade_file_path))
+        write_dataset(get_backtest_df_list(), get_dataset_path(output_hsci_backtest_file_path))
+        output_path_list += [get_dataset_path(output_hsci_trade_file_path),
+                             get_dataset_path(output_hsci_backtest_file_path)]
+    return output_path_list
@@ -0,0 +1,223 @@
+import pandas as pd
+import numpy as np
+import os
+import json
+import time
+import hashlib
+import itertools
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from config import log
+from func import returnIndex
+from func import parameterSweep
+
+logger = log.get_logger()
+
+grid_keys = ["begin_business_day", "end_business_day", "review_type", "change", "ipo_only"]
+# columns of every row, a grid point without trades only has its trade_count
+summary_keys = ["mean_return", "mean_trade_max_drawdown", "mean_sharpe_ratio", "mean_win_loss_ratio", "hit_ratio",
+                "median_return", "median_max_drawdown", "median_sharpe_ratio", "median_win_loss_ratio", "trade_count"]
+
+# arrays of the shared return panel, attached once in each worker
+panel_dict = {}
+
+def create_shared_array(value_array):
+    shared_block = shared_memory.SharedMemory(create=True, size=max(value_array.nbytes, 1))
+    shared_array = np.ndarray(value_array.shape, dtype=value_array.dtype, buffer=shared_block.buf)
+    shared_array[:] = value_array
+    return shared_block, {"name": shared_block.name, "shape": value_array.shape, "dtype": value_array.dtype.str}
+
+def attach_shared_panel(shared_spec_dict, min_date_index, review_type_list, change_list):
+    # worker initializer, views on the parent's shared memory without copying
+    for key, shared_spec in shared_spec_dict.items():
+        shared_block = shared_memory.SharedMemory(name=shared_spec["name"])
+        panel_dict[key + "_block"] = shared_block
+        panel_dict[key] = np.ndarray(shared_spec["shape"], dtype=np.dtype(shared_spec["dtype"]),
+                                     buffer=shared_block.buf)
+    panel_dict["min_date_index"] = min_date_index
+    panel_dict["review_type_list"] = review_type_list
+    panel_dict["change_list"] = change_list
+
+def get_grid_point_result(begin_business_day, end_business_day, review_type, change, ipo_only, flip_side):
+    # statistics of one grid point read from the prefix panel, same definitions as parameterSweep
+    trade_flag = (panel_dict["review_type_code"] == panel_dict["review_type_list"].index(review_type)) & \
+                 (panel_dict["change_code"] == panel_dict["change_list"].index(change))
+    if ipo_only:
+        trade_flag &= panel_dict["ipo_flag"]
+    position_num = panel_dict["stock_log_array"].shape[1]
+    entry_position = min(max(-begin_business_day - panel_dict["min_date_index"], 0), position_num - 1)
+    exit_position = min(max(end_business_day - panel_dict["min_date_index"], 0), position_num - 1)
+
+    has_row = panel_dict["has_row_array"][trade_flag, entry_position:exit_position + 1]
+    keep_flag = has_row.any(axis=1)
+    has_row = has_row[keep_flag]
+    stock_log = panel_dict["stock_log_array"][trade_flag, entry_position:exit_position + 1][keep_flag]
+    fund_log = panel_dict["fund_log_array"][trade_flag, entry_position:exit_position + 1][keep_flag]
+
+    # assume entering the trade at close on the first day
+    stock_return = np.expm1(stock_log - stock_log[:, :1]) * 100
+    fund_return = np.expm1(fund_log - fund_log[:, :1]) * 100
+    long_short_return = fund_return - stock_return if flip_side else stock_return - fund_return
+
+    # drawdown and daily long short changes on the rows each trade really has, no change across a gap
+    row_return = np.where(has_row, long_short_return, np.nan)
+    roll_ls_drawdown = np.nanmin(row_return - np.fmax.accumulate(row_return, axis=1), axis=1) \
+        if row_return.size > 0 else np.empty(0)
+    change_flag = has_row[:, 1:] & has_row[:, :-1]
+    ls_change = np.where(change_flag, np.diff(long_short_return, axis=1), 0)
+    change_count = change_flag.sum(axis=1).astype("float64")
+    change_variance = ((ls_change ** 2).sum(axis=1) - ls_change.sum(axis=1) ** 2 /
+                       np.where(change_count > 0, change_count, np.nan)) / np.where(change_count > 1,
+                                                                                     change_count - 1, np.nan)
+    exit_trade_df = pd.DataFrame({"long_short_return": long_short_return[:, -1] if has_row.size > 0 else [],
+                                  "roll_ls_drawdown": roll_ls_drawdown,
+                                  "ls_return_std": np.sqrt(np.maximum(change_variance, 0))})
+
+    point_dict = dict(zip(grid_keys, [begin_business_day, end_business_day, review_type, change, ipo_only]))
+    if exit_trade_df.empty:
+        return {**point_dict, "trade_count": 0}
+    # holding days counted as in get_trade_summary, from the second to the last date index held
+    held_position = np.flatnonzero(has_row.any(axis=0)) + entry_position + panel_dict["min_date_index"]
+    holding_business_days = abs(held_position[min(1, len(held_position) - 1)]) + abs(held_position[-1])
+    return {**point_dict, **parameterSweep.get_point_summary(exit_trade_df, holding_business_days)}
+
+def get_grid_chunk_result(grid_chunk, flip_side):
+    return [get_grid_point_result(*grid_point, flip_side=flip_side) for grid_point in grid_chunk]
+
+def get_input_fingerprint(backtest_df, trade_df, flip_side):
+    # rows and columns the grid statistics are computed from, plus the side of the trade
+    input_hash = hashlib.sha256()
+    for df, sort_columns in [(backtest_df, ["trade_id", "date_index"]), (trade_df, ["trade_id"])]:
+        df = df.sort_values(sort_columns).reset_index(drop=True)
+        input_hash.update(json.dumps(list(df.columns)).encode("utf-8"))
+        input_hash.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    input_hash.update(json.dumps({"flip_side": flip_side}).encode("utf-8"))
+    return input_hash.hexdigest()
+
+class get_optimization_file():
+    '''
+    Grid search over entry / exit offsets, review types, changes and the IPO filter on all cores.
+    The trade x date_index prefix log return panel is put in shared memory once, workers only receive
+    grid points and send back one row of statistics each. Finished grid points are appended to
+    output_optimization_file_path, so an interrupted search resumes where it stopped. The fingerprint of the
+    input is kept next to it, a search over a different backtest or side starts over.
+    '''
+    def __init__(self, backtest_df, trade_df, begin_business_day_list, end_business_day_list, review_type_list,
+                 change_list, ipo_only_list, output_optimization_file_path, max_workers=4, chunk_size=50,
+                 flip_side=False):
+        self.backtest_df = backtest_df
+        self.trade_df = trade_df
+        self.begin_business_day_list = begin_business_day_list
+        self.end_business_day_list = end_business_day_list
+        self.review_type_list = review_type_list
+        self.change_list = change_list
+        self.ipo_only_list = ipo_only_list
+        self.output_optimization_file_path = output_optimization_file_path
+        self.max_workers = max(max_workers, 1)
+        self.chunk_size = max(chunk_size, 1)
+        self.flip_side = flip_side
+
+    def run(self):
+        def get_panel_array_dict(backtest_df, trade_df, review_type_list, change_list):
+            return_index = returnIndex.return_index(backtest_df=backtest_df)
+            position_num = return_index.stock_log_array.shape[1]
+            has_row_array = np.zeros((len(return_index.trade_id_array), position_num), dtype=bool)
+            has_row_array[return_index.trade_id_index.get_indexer(backtest_df["trade_id"].values),
+                          backtest_df["date_index"].values - return_index.min_date_index] = True
+
+            # trade attributes aligned with the rows of the panel
+            trade_df = trade_df.drop_duplicates("trade_id").set_index("trade_id").reindex(return_index.trade_id_array)
+            review_type_code = np.array([review_type_list.index(review_type) if review_type in review_type_list
+                                         else -1 for review_type in trade_df["review_type"]], dtype="int64")
+            change_code = np.array([change_list.index(change) if change in change_list else -1
+                                    for change in trade_df["change"]], dtype="int64")
+            ipo_flag = (trade_df["ipo_date"].notnull() & (trade_df["ipo_return"] != 0)).values
+            panel_array_dict = {"stock_log_array": return_index.stock_log_array,
+                                "fund_log_array": return_index.fund_log_array,
+                                "has_row_array": has_row_array,
+                                "review_type_code": review_type_code,
+                                "change_code": change_code,
+                                "ipo_flag": ipo_flag}
+            return panel_array_dict, return_index.min_date_index
+
+        def get_fingerprint_file_path(output_optimization_file_path):
+            return output_optimization_file_path + ".fingerprint.json"
+
+        def reset_changed_input(output_optimization_file_path, fingerprint):
+            # results of another input are removed before the new fingerprint is recorded
+            fingerprint_file_path = get_fingerprint_file_path(output_optimization_file_path)
+            if os.path.exists(fingerprint_file_path):
+                with open(fingerprint_file_path, "r") as f:
+                    if json.load(f).get("fingerprint") == fingerprint:
+                        return
+            if os.path.exists(output_optimization_file_path):
+                logger.info("Input of Optimization changed, removed " + output_optimization_file_path)
+                os.remove(output_optimization_file_path)
+            with open(fingerprint_file_path + ".tmp", "w") as f:
+                json.dump({"fingerprint": fingerprint}, f)
+            os.replace(fingerprint_file_path + ".tmp", fingerprint_file_path)
+
+        def get_finished_grid_points(output_optimization_file_path):
+            if not os.path.exists(output_optimization_file_path):
+                return set()
+            finished_df = pd.read_csv(output_optimization_file_path, usecols=grid_keys)
+            return set(finished_df.itertuples(index=False, name=None))
+
+        def append_results(result_list, output_optimization_file_path):
+            result_df = pd.DataFrame(result_list, columns=grid_keys + summary_keys)
+            result_df.to_csv(output_optimization_file_path, mode="a", index=False,
+                             header=not os.path.exists(output_optimization_file_path))
+
+        backtest_df = self.backtest_df[["trade_id", "date_index", "daily_stock_return", "daily_fund_return"]]
+        trade_df = self.trade_df[["trade_id", "review_type", "change", "ipo_date", "ipo_return"]]
+        reset_changed_input(output_optimization_file_path=self.output_optimization_file_path,
+                            fingerprint=get_input_fingerprint(backtest_df=backtest_df, trade_df=trade_df,
+                                                              flip_side=self.flip_side))
+        grid_list = list(itertools.product(self.begin_business_day_list, self.end_business_day_list,
+                                           self.review_type_list, self.change_list, self.ipo_only_list))
+        finished_grid_points = get_finished_grid_points(self.output_optimization_file_path)
+        grid_list = [grid_point for grid_point in grid_list if grid_point not in finished_grid_points]
+        logger.info("Resumed Optimization with %s finished and %s remaining Grid Points" % (
+            len(finished_grid_points), len(grid_list)))
+        if grid_list == []:
+            return pd.read_csv(self.output_optimization_file_path)
+
+        panel_array_dict, min_date_index = get_panel_array_dict(backtest_df=backtest_df, trade_df=trade_df,
+                                                                review_type_list=list(self.review_type_list),
+                                                                change_list=list(self.change_list))
+        shared_block_list = []
+        shared_spec_dict = {}
+        try:
+            for key, value_array in panel_array_dict.items():
+                shared_block, shared_spec_dict[key] = create_shared_array(value_array)
+                shared_block_list.append(shared_block)
+            logger.info("Put Return Panel of %s Trades x %s Date Index in Shared Memory" % (
+                panel_array_dict["stock_log_array"].shape))
+
+            start_time = time.perf_counter()
+            finished_num = 0
+            grid_chunk_list = [grid_list[start:start + self.chunk_size]
+                               for start in range(0, len(grid_list), self.chunk_size)]
+            with ProcessPoolExecutor(max_workers=self.max_workers, initializer=attach_shared_panel,
+                                     initargs=(shared_spec_dict, min_date_index, list(self.review_type_list),
+                                               list(self.change_list))) as executor:
+                future_list = [executor.submit(get_grid_chunk_result, grid_chunk, self.flip_side)
+                               for grid_chunk in grid_chunk_list]
+                for future in as_completed(future_list):
+                    result_list = future.result()
+                    append_results(result_list=result_list,
+                                   output_optimization_file_path=self.output_optimization_file_path)
+                    finished_num += len(result_list)
+                    logger.info("Optimized %s / %s Grid Points, %.1f Grid Points per second" % (
+                        finished_num, len(grid_list), finished_num / (time.perf_counter() - start_time)))
+        finally:
+            for shared_block in shared_block_list:
+                shared_block.close()
+                shared_block.unlink()
+
+        elapsed = time.perf_counter() - start_time
+        logger.info('''
+        Output Optimization DataFrame of %s Grid Points in %.2fs (%.1f Grid Points per second) to:
+        %s
+        ''' % (len(grid_list), elapsed, len(grid_list) / elapsed, self.output_optimization_file_path))
+        return pd.read_csv(self.output_optimization_file_path)
@@ -0,0 +1,132 @@
+import pandas as pd
+import numpy as np
+from config import log
+from func import segmentKernels
+
+logger = log.get_logger()
+
+def get_window_prefix_df(backtest_df, begin_business_day, max_end_business_day, flip_side=False):
+    '''
+    Rows of every trade from date index -begin_business_day, re-based to enter at close of the first day,
+    with running drawdown and running sums of daily long short changes.
+    The value on a row is the statistic of the window ending on that row, so any exit day reads one row.
+    '''
+    window_df = backtest_df[(backtest_df["date_index"] >= -begin_business_day) &
+                            (backtest_df["date_index"] <= max_end_business_day)]
+    trade_id_array = window_df["trade_id"].values
+    offsets = segmentKernels.get_offsets(trade_id_array)
+    segment_position = segmentKernels.get_segment_positions(offsets)
+    segment_start_flag = segment_position == 0
+
+    # assume entering the trade at close on the first day
+    stock_growth = np.where(segment_start_flag, 1, 1 + window_df["daily_stock_return"].values / 100)
+    fund_growth = np.where(segment_start_flag, 1, 1 + window_df["daily_fund_return"].values / 100)
+    stock_return = (segmentKernels.segment_cumprod(stock_growth, offsets) - 1) * 100
+    fund_return = (segmentKernels.segment_cumprod(fund_growth, offsets) - 1) * 100
+    long_short_return = fund_return - stock_return if flip_side else stock_return - fund_return
+    roll_ls_drawdown = segmentKernels.segment_drawdown(long_short_return, offsets)
+
+    # running count, sum and sum of squares of daily long short changes for the std of each window
+    ls_change = np.where(segment_start_flag, 0, np.diff(long_short_return, prepend=0))
+    prefix_df = pd.DataFrame({"trade_id": trade_id_array, "date_index": window_df["date_index"].values,
+                              "long_short_return": long_short_return,
+                              "roll_ls_drawdown": roll_ls_drawdown,
+                              "max_ls_drawdown": segmentKernels.segment_cummin(roll_ls_drawdown, offsets),
+                              "change_count": segment_position,
+                              "change_sum": segmentKernels.segment_cumsum(ls_change, offsets),
+                              "change_square_sum": segmentKernels.segment_cumsum(ls_change ** 2, offsets)})
+    return prefix_df
+
+def get_exit_trade_df(prefix_df, end_business_day):
+    # statistics of every trade exiting on its last row at or before end_business_day
+    exit_df = prefix_df[prefix_df["date_index"] <= end_business_day]
+    exit_df = exit_df[np.r_[exit_df["trade_id"].values[1:] != exit_df["trade_id"].values[:-1], True]]
+    change_count = exit_df["change_count"].values.astype("float64")
+    change_variance = (exit_df["change_square_sum"].values - exit_df["change_sum"].values ** 2 /
+                       np.where(change_count > 0, change_count, np.nan)) / np.where(change_count > 1,
+                                                                                     change_count - 1, np.nan)
+    return pd.DataFrame({"trade_id": exit_df["trade_id"].values,
+                         "long_short_return": exit_df["long_short_return"].values,
+                         "roll_ls_drawdown": exit_df["max_ls_drawdown"].values,
+                         "ls_return_std": np.sqrt(np.maximum(change_variance, 0))})
+
+def get_point_summary(exit_trade_df, holding_business_days):
+    # same statistics as performanceVisualization.get_trade_summary
+    long_short_return = exit_trade_df["long_short_return"]
+    win_return = long_short_return[long_short_return > 0]
+    loss_return = long_short_return[long_short_return <= 0]
+    mean_return = long_short_return.mean()
+    median_return = long_short_return.median()
+    mean_std = exit_trade_df["ls_return_std"].mean()
+    median_std = exit_trade_df["ls_return_std"].median()
+    if holding_business_days > 0:
+        mean_sharpe_ratio = ((1 + mean_return / 100) ** (252 / holding_business_days) - 1) / (
+                (252 ** 0.5) * mean_std / 100)
+        median_sharpe_ratio = ((1 + median_return / 100) ** (252 / holding_business_days) - 1) / (
+                (252 ** 0.5) * median_std / 100)
+    else:
+        mean_sharpe_ratio = np.nan
+        median_sharpe_ratio = np.nan
+    return {"mean_return": mean_return,
+            "mean_trade_max_drawdown": exit_trade_df["roll_ls_drawdown"].mean(),
+            "mean_sharpe_ratio": mean_sharpe_ratio,
+            "mean_win_loss_ratio": abs(win_return.mean() / loss_return.mean()),
+            "hit_ratio": len(win_return.index) / len(long_short_return.index) * 100,
+            "median_return": median_return,
+            "median_max_drawdown": exit_trade_df["roll_ls_drawdown"].median(),
+            "median_sharpe_ratio": median_sharpe_ratio,
+            "median_win_loss_ratio": abs(win_return.median() / loss_return.median()),
+            "trade_count": len(long_short_return.index)}
+
+class get_sweep_file():
+    '''
+    Evaluate a grid of (begin_business_day, end_business_day) on one backtest run over the widest window.
+    For every entry offset the daily returns are compounded once, then every exit offset reads the
+    running statistics on one row per trade, optionally split by group_by columns of the trade file.
+    '''
+    def __init__(self, backtest_df, trade_df, begin_business_day_list, end_business_day_list, output_sweep_file_path,
+                 group_by=None, flip_side=False):
+        self.backtest_df = backtest_df
+        self.trade_df = trade_df
+        self.begin_business_day_list = sorted(begin_business_day_list)
+        self.end_business_day_list = sorted(end_business_day_list)
+        self.output_sweep_file_path = output_sweep_file_path
+        self.group_by = [] if group_by is None else list(group_by)
+        self.flip_side = flip_side
+
+    def run(self):
+        backtest_df = self.backtest_df[["trade_id", "date_index", "daily_stock_return", "daily_fund_return"]]
+        backtest_df = backtest_df.sort_values(["trade_id", "date_index"])
+        group_df = self.trade_df[["trade_id"] + self.group_by].drop_duplicates("trade_id")
+
+        sweep_list = []
+        for begin_business_day in self.begin_business_day_list:
+            prefix_df = get_window_prefix_df(backtest_df=backtest_df, begin_business_day=begin_business_day,
+                                             max_end_business_day=self.end_business_day_list[-1],
+                                             flip_side=self.flip_side)
+            for end_business_day in self.end_business_day_list:
+                exit_trade_df = get_exit_trade_df(prefix_df=prefix_df, end_business_day=end_business_day)
+                if exit_trade_df.empty:
+                    continue
+                exit_trade_df = pd.merge(exit_trade_df, group_df, on=["trade_id"], how="left")
+
+                # holding days counted as in get_trade_summary
+                holding_business_days = abs(-begin_business_day + 1) + abs(end_business_day)
+                point_dict = {"begin_business_day": begin_business_day, "end_business_day": end_business_day}
+                if self.group_by == []:
+                    sweep_list.append({**point_dict, **get_point_summary(exit_trade_df, holding_business_days)})
+                else:
+                    for group, this_exit_trade_df in exit_trade_df.groupby(self.group_by):
+                        group = group if isinstance(group, tuple) else (group,)
+                        sweep_list.append({**point_dict, **dict(zip(self.group_by, group)),
+                                           **get_point_summary(this_exit_trade_df, holding_business_days)})
+            logger.info("Swept Begin Business Day %s over %s End Business Days" % (
+                begin_business_day, len(self.end_business_day_list)))
+
+        sweep_df = pd.DataFrame(sweep_list)
+        sweep_df.to_csv(self.output_sweep_file_path, index=False)
+        logger.info('''
+        Output Parameter Sweep DataFrame of %s Grid Points to:
+        %s
+        ''' % (len(self.begin_business_day_list) * len(self.end_business_day_list), self.output_sweep_file_path))
+        return sweep_df
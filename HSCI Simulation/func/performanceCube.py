@@ -0,0 +1,70 @@
+import pandas as pd
+import os
+from config import log
+
+logger = log.get_logger()
+
+cube_keys = ["review_type", "change", "ipo_only", "group_by", "group", "date_index"]
+return_columns = ["stock_return", "fund_return", "long_short_return"]
+group_by_list = ["year", "month", "year_month", "sector"]
+
+def get_group_columns(trade_df):
+    # trade level dimensions of the cube, year_month labelled as in the group charts e.g. 2015-3
+    group_df = trade_df[["trade_id", "review_type", "change", "sector"]].copy()
+    group_df["ipo"] = (trade_df["ipo_date"].notnull() & (trade_df["ipo_return"] != 0)).values
+    effective_date = pd.to_datetime(trade_df["effective_date"])
+    group_df["year"] = effective_date.dt.year.values
+    group_df["month"] = effective_date.dt.month.values
+    group_df["year_month"] = group_df["year"].astype(str) + "-" + group_df["month"].astype(str)
+    return group_df
+
+def get_performance_cube(backtest_df, trade_df, group_by_list=group_by_list):
+    '''
+    Mean / median of stock, fund and long short return and trade count per date_index for every
+    review_type x change x ipo_only x (group_by, group) cell, group_by "all" being the whole review type and change.
+    ipo_only False holds all trades, True only IPO trades with non zero IPO return, as ipo_only in the charts.
+    '''
+    for group_by in group_by_list:
+        if group_by not in ["year", "month", "year_month", "sector"]:
+            raise Exception("group_by only accepts year_month, year, month, sector")
+    group_df = get_group_columns(trade_df.drop_duplicates("trade_id"))
+    row_df = backtest_df[["trade_id", "date_index"] + return_columns]
+    row_df = pd.merge(row_df, group_df, on=["trade_id"], how="inner")
+    row_df["all"] = "all"
+
+    # medians do not add up from finer cells, so every grouping set is one groupby over the rows
+    cube_df_list = []
+    for ipo_only in [False, True]:
+        this_row_df = row_df[row_df["ipo"]] if ipo_only else row_df
+        for group_by in ["all"] + list(group_by_list):
+            this_cube_df = this_row_df.groupby(["review_type", "change", group_by, "date_index"]).agg(
+                **{column + "_" + stat: (column, stat) for column in return_columns for stat in ["mean", "median"]},
+                count=("trade_id", "count")).reset_index()
+            this_cube_df = this_cube_df.rename(columns={group_by: "group"})
+            this_cube_df["group"] = this_cube_df["group"].astype(str)
+            this_cube_df["group_by"] = group_by
+            this_cube_df["ipo_only"] = ipo_only
+            cube_df_list.append(this_cube_df)
+    cube_df = pd.concat(cube_df_list, ignore_index=True)
+    cube_df = cube_df.set_index(cube_keys).sort_index()
+    logger.info("Built Performance Cube of %s Cells" % (len(cube_df.index)))
+    return cube_df
+
+def get_cube_slice(cube_df, review_type, change, ipo_only=False, group_by="all"):
+    # date_index x statistics of one view, (group, date_index) rows for a group_by
+    try:
+        cube_slice = cube_df.xs((review_type, change, ipo_only, group_by),
+                                level=["review_type", "change", "ipo_only", "group_by"])
+    except KeyError:
+        raise Exception("No %s %s (ipo_only=%s, group_by=%s) in Performance Cube" % (review_type, change, ipo_only,
+                                                                                  group_by))
+    return cube_slice.droplevel("group") if group_by == "all" else cube_slice
+
+def write_performance_cube(cube_df, cube_file_path):
+    cube_df.to_pickle(cube_file_path + ".tmp")
+    os.replace(cube_file_path + ".tmp", cube_file_path)
+
+def read_performance_cube(cube_file_path):
+    if not os.path.exists(cube_file_path):
+        raise Exception("No Performance Cube in " + cube_file_path)
+    return pd.read_pickle(cube_file_path)
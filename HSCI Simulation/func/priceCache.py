@@ -0,0 +1,205 @@
+import pandas as pd
+import os
+import json
+import threading
+from config import log
+from datetime import date
+
+logger = log.get_logger()
+
+def merge_date_ranges(date_ranges):
+    # merge overlapping or adjacent [start, end] date ranges into disjoint sorted ranges
+    date_ranges = sorted([[pd.Timestamp(start), pd.Timestamp(end)] for start, end in date_ranges])
+    merged_ranges = []
+    for start, end in date_ranges:
+        if merged_ranges and start <= merged_ranges[-1][1] + pd.Timedelta(days=1):
+            merged_ranges[-1][1] = max(merged_ranges[-1][1], end)
+        else:
+            merged_ranges.append([start, end])
+    return merged_ranges
+
+def get_missing_date_ranges(covered_ranges, start_date, end_date):
+    # parts of [start_date, end_date] not held by covered_ranges
+    start_date = pd.Timestamp(start_date)
+    end_date = pd.Timestamp(end_date)
+    missing_ranges = []
+    for covered_start, covered_end in merge_date_ranges(covered_ranges):
+        if covered_end < start_date or covered_start > end_date:
+            continue
+        if covered_start > start_date:
+            missing_ranges.append([start_date, covered_start - pd.Timedelta(days=1)])
+        start_date = max(start_date, covered_end + pd.Timedelta(days=1))
+    if start_date <= end_date:
+        missing_ranges.append([start_date, end_date])
+    return missing_ranges
+
+def get_file_format():
+    # parquet when pyarrow is installed, pickle otherwise
+    try:
+        import pyarrow
+    except ImportError:
+        return "pkl"
+    return "parquet"
+
+class price_cache():
+    '''
+    On-disk store of Bloomberg history in front of blp.bdh.
+    Each ticker is kept as one date x field parquet file, loaded once and then held in memory,
+    and manifest.json records the date ranges already held for every (ticker, field),
+    so only the missing gaps are requested remotely.
+    Gaps being fetched are recorded as in flight, an overlapping call waits for them instead of fetching again.
+    '''
+    def __init__(self, cache_path, data_source):
+        self.cache_path = cache_path
+        self.data_source = data_source
+        self.manifest_path = cache_path + "/manifest.json"
+        self.file_format = get_file_format()
+        self.remote_call_count = 0
+        self.lock = threading.Lock()
+        self.ticker_data_dict = {}
+        self.in_flight_dict = {}
+        if not os.path.exists(cache_path):
+            os.makedirs(cache_path)
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r") as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {}
+
+    def get_ticker_file_path(self, ticker, file_format=None):
+        file_format = self.file_format if file_format is None else file_format
+        return self.cache_path + "/" + ticker.replace(" ", "_").replace("/", "_") + "." + file_format
+
+    def get_covered_ranges(self, ticker, field):
+        return self.manifest.get(ticker, {}).get(field, [])
+
+    def read_ticker_data(self, ticker):
+        # disk is only read the first time a ticker is asked for, pickles of older caches are still read
+        if ticker not in self.ticker_data_dict:
+            ticker_data = pd.DataFrame()
+            if self.file_format == "parquet" and os.path.exists(self.get_ticker_file_path(ticker)):
+                ticker_data = pd.read_parquet(self.get_ticker_file_path(ticker))
+            elif os.path.exists(self.get_ticker_file_path(ticker, file_format="pkl")):
+                ticker_data = pd.read_pickle(self.get_ticker_file_path(ticker, file_format="pkl"))
+            self.ticker_data_dict[ticker] = ticker_data
+        return self.ticker_data_dict[ticker]
+
+    def write_ticker_data(self, ticker, ticker_data):
+        ticker_data = ticker_data.sort_index()
+        ticker_file_path = self.get_ticker_file_path(ticker)
+        if self.file_format == "parquet":
+            ticker_data.to_parquet(ticker_file_path + ".tmp", compression="zstd")
+        else:
+            ticker_data.to_pickle(ticker_file_path + ".tmp")
+        os.replace(ticker_file_path + ".tmp", ticker_file_path)
+        if self.file_format == "parquet" and os.path.exists(self.get_ticker_file_path(ticker, file_format="pkl")):
+            os.remove(self.get_ticker_file_path(ticker, file_format="pkl"))
+        self.ticker_data_dict[ticker] = ticker_data
+
+    def save_manifest(self):
+        temp_manifest_path = self.manifest_path + ".tmp"
+        with open(temp_manifest_path, "w") as f:
+            json.dump(self.manifest, f, indent=1, sort_keys=True)
+        os.replace(temp_manifest_path, self.manifest_path)
+
+    def update_covered_ranges(self, ticker, field, start_date, end_date):
+        # never mark today or later as held, the day is not complete yet
+        end_date = min(pd.Timestamp(end_date), pd.Timestamp(date.today()) - pd.Timedelta(days=1))
+        if pd.Timestamp(start_date) > end_date:
+            return
+        covered_ranges = merge_date_ranges(self.get_covered_ranges(ticker, field) + [[start_date, end_date]])
+        self.manifest.setdefault(ticker, {})[field] = [[start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")]
+                                                       for start, end in covered_ranges]
+
+    def fetch_missing_data(self, tickers, flds, start_date, end_date):
+        while True:
+            # group the gaps so tickers missing the same range are requested together,
+            # gaps already in flight in another call are waited for instead
+            gap_dict = {}
+            wait_event_list = []
+            fetch_event = threading.Event()
+            with self.lock:
+                for ticker in tickers:
+                    for field in flds:
+                        in_flight_list = self.in_flight_dict.get((ticker, field), [])
+                        for (in_flight_start, in_flight_end), event in in_flight_list:
+                            if in_flight_start <= end_date and in_flight_end >= start_date and \
+                                    event not in wait_event_list:
+                                wait_event_list.append(event)
+                        held_ranges = self.get_covered_ranges(ticker, field) + \
+                            [date_range for date_range, _ in in_flight_list]
+                        for gap_start, gap_end in get_missing_date_ranges(held_ranges, start_date, end_date):
+                            this_gap = gap_dict.setdefault((gap_start, gap_end), [[], []])
+                            if ticker not in this_gap[0]:
+                                this_gap[0].append(ticker)
+                            if field not in this_gap[1]:
+                                this_gap[1].append(field)
+                            self.in_flight_dict.setdefault((ticker, field), []).append(
+                                ([gap_start, gap_end], fetch_event))
+
+            try:
+                for (gap_start, gap_end), (gap_tickers, gap_flds) in gap_dict.items():
+                    gap_data = self.data_source.bdh(tickers=gap_tickers, flds=gap_flds,
+                                                    start_date=gap_start.strftime("%Y-%m-%d"),
+                                                    end_date=gap_end.strftime("%Y-%m-%d"))
+                    logger.debug("Fetched %s tickers from %s to %s into Price Cache" % (
+                        len(gap_tickers), gap_start.strftime("%Y-%m-%d"), gap_end.strftime("%Y-%m-%d")))
+
+                    # remote calls may run concurrently, updates of the store may not
+                    with self.lock:
+                        self.update_cache(gap_data=gap_data, gap_tickers=gap_tickers, gap_flds=gap_flds,
+                                          gap_start=gap_start, gap_end=gap_end)
+            finally:
+                # failed gaps are released too, the calls waiting on them look for the gaps again
+                with self.lock:
+                    for key in list(self.in_flight_dict.keys()):
+                        self.in_flight_dict[key] = [(date_range, event) for date_range, event
+                                                    in self.in_flight_dict[key] if event is not fetch_event]
+                        if self.in_flight_dict[key] == []:
+                            del self.in_flight_dict[key]
+                fetch_event.set()
+
+            if wait_event_list == []:
+                return
+            for event in wait_event_list:
+                event.wait()
+
+    def update_cache(self, gap_data, gap_tickers, gap_flds, gap_start, gap_end):
+        self.remote_call_count += 1
+        for ticker in gap_tickers:
+            if not gap_data.empty and ticker in gap_data.columns.get_level_values(0):
+                new_data = gap_data[ticker].copy()
+                new_data.index = pd.DatetimeIndex(new_data.index)
+                new_data = new_data.astype("float")
+                ticker_data = self.read_ticker_data(ticker)
+                ticker_data = new_data.combine_first(ticker_data) if not ticker_data.empty else new_data
+                self.write_ticker_data(ticker, ticker_data)
+            # tickers without data are still covered, e.g. halted stocks
+            for field in gap_flds:
+                self.update_covered_ranges(ticker, field, gap_start, gap_end)
+        self.save_manifest()
+
+    def bdh(self, tickers, flds, start_date, end_date):
+        # same call and output layout as blp.bdh, columns are (ticker, field)
+        tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+        flds = [flds] if isinstance(flds, str) else list(flds)
+        start_date = pd.Timestamp(start_date)
+        end_date = pd.Timestamp(end_date)
+
+        self.fetch_missing_data(tickers=tickers, flds=flds, start_date=start_date, end_date=end_date)
+
+        price_data_dict = {}
+        for ticker in tickers:
+            with self.lock:
+                ticker_data = self.read_ticker_data(ticker)
+            if ticker_data.empty:
+                continue
+            ticker_data = ticker_data.reindex(columns=flds)
+            ticker_data = ticker_data[(ticker_data.index >= start_date) & (ticker_data.index <= end_date)]
+            ticker_data = ticker_data.dropna(how="all")
+            if not ticker_data.empty:
+                price_data_dict[ticker] = ticker_data
+
+        if price_data_dict == {}:
+            return pd.DataFrame()
+        return pd.concat(price_data_dict, axis=1, sort=True)
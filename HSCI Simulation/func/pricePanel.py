@@ -0,0 +1,85 @@
+import pandas as pd
+import numpy as np
+
+class price_panel():
+    '''
+    Wide store of Bloomberg history: one contiguous dates x tickers float array per field,
+    with integer ticker and date positions for O(1) lookup by ticker and date range.
+    '''
+    def __init__(self, date_array, ticker_list, field_dict):
+        self.date_array = np.asarray(date_array, dtype="datetime64[ns]")
+        self.ticker_list = list(ticker_list)
+        self.ticker_dict = {ticker: column_num for column_num, ticker in enumerate(self.ticker_list)}
+        self.field_dict = {field: np.ascontiguousarray(value_array, dtype="float64")
+                           for field, value_array in field_dict.items()}
+
+    def get_field(self, field):
+        return self.field_dict[field]
+
+    def get_ticker_column(self, ticker):
+        return self.ticker_dict.get(ticker)
+
+    def get_ticker_columns(self, tickers):
+        # -1 for tickers without any data
+        return np.array([self.ticker_dict.get(ticker, -1) for ticker in tickers], dtype="int64")
+
+    def get_date_rows(self, start_date, end_date):
+        start_row = np.searchsorted(self.date_array, np.datetime64(pd.Timestamp(start_date)), "left")
+        end_row = np.searchsorted(self.date_array, np.datetime64(pd.Timestamp(end_date)), "right")
+        return slice(start_row, end_row)
+
+    def get_exact_date_rows(self, dates):
+        # row of each date, -1 when the date is not in the panel
+        dates = np.asarray(dates, dtype="datetime64[ns]")
+        if len(self.date_array) == 0:
+            return np.full(len(dates), -1)
+        rows = np.minimum(np.searchsorted(self.date_array, dates, "left"), len(self.date_array) - 1)
+        return np.where(self.date_array[rows] == dates, rows, -1)
+
+    def get_values(self, field, ticker, start_date, end_date):
+        column_num = self.get_ticker_column(ticker)
+        date_rows = self.get_date_rows(start_date, end_date)
+        if column_num is None:
+            return self.date_array[date_rows], np.full(date_rows.stop - date_rows.start, np.nan)
+        return self.date_array[date_rows], self.field_dict[field][date_rows, column_num]
+
+    def get_window(self, field, tickers, start_date, end_date):
+        # dates x tickers block of one field, NaN columns for tickers without data
+        date_rows = self.get_date_rows(start_date, end_date)
+        ticker_columns = self.get_ticker_columns(tickers)
+        has_column = ticker_columns >= 0
+        value_array = np.full((date_rows.stop - date_rows.start, len(ticker_columns)), np.nan)
+        value_array[:, has_column] = self.field_dict[field][date_rows][:, ticker_columns[has_column]]
+        return self.date_array[date_rows], value_array
+
+def get_price_panel_from_bdh(price_data, flds):
+    # blp.bdh layout: date index, (ticker, field) columns
+    if price_data.empty:
+        return price_panel(date_array=[], ticker_list=[], field_dict={field: np.empty((0, 0)) for field in flds})
+    ticker_list = list(price_data.columns.get_level_values(0).drop_duplicates())
+    date_array = pd.DatetimeIndex(price_data.index).values
+    sort_order = np.argsort(date_array, kind="stable")
+    field_dict = {}
+    for field in flds:
+        if field in price_data.columns.get_level_values(1):
+            field_df = price_data.xs(field, axis=1, level=1).reindex(columns=ticker_list)
+            field_dict[field] = field_df.values.astype("float64")[sort_order]
+        else:
+            field_dict[field] = np.full((len(date_array), len(ticker_list)), np.nan)
+    return price_panel(date_array=date_array[sort_order], ticker_list=ticker_list, field_dict=field_dict)
+
+def get_price_panel_from_store(price_store, flds):
+    # price_store holds one date x field frame per ticker
+    ticker_list = list(price_store.keys())
+    if ticker_list == []:
+        return price_panel(date_array=[], ticker_list=[], field_dict={field: np.empty((0, 0)) for field in flds})
+    date_array = np.unique(np.concatenate([pd.DatetimeIndex(ticker_data.index).values
+                                           for ticker_data in price_store.values()]))
+    field_dict = {field: np.full((len(date_array), len(ticker_list)), np.nan) for field in flds}
+    for column_num, ticker in enumerate(ticker_list):
+        ticker_data = price_store[ticker]
+        rows = np.searchsorted(date_array, pd.DatetimeIndex(ticker_data.index).values)
+        for field in flds:
+            if field in ticker_data.columns:
+                field_dict[field][rows, column_num] = ticker_data[field].values
+    return price_panel(date_array=date_array, ticker_list=ticker_list, field_dict=field_dict)
@@ -0,0 +1,75 @@
+import pandas as pd
+import numpy as np
+from func import segmentKernels
+
+class return_index():
+    '''
+    Prefix index of cumulative log returns of every trade, aligned on date_index.
+    stock_log_array[trade, position] is the sum of log(1 + daily return) of the trade up to that date index,
+    carried forward over date indices without a row, so the return of any (entry, exit) window
+    is exp of the difference of two lookups, entering at close of the entry day.
+    '''
+    def __init__(self, backtest_df):
+        backtest_df = backtest_df[["trade_id", "date_index", "daily_stock_return", "daily_fund_return"]]
+        backtest_df = backtest_df.sort_values(["trade_id", "date_index"])
+        self.trade_id_array = backtest_df["trade_id"].drop_duplicates().values
+        self.trade_id_index = pd.Index(self.trade_id_array)
+        self.min_date_index = int(backtest_df["date_index"].min()) if not backtest_df.empty else 0
+        self.max_date_index = int(backtest_df["date_index"].max()) if not backtest_df.empty else -1
+
+        trade_num_array = self.trade_id_index.get_indexer(backtest_df["trade_id"].values)
+        position_array = backtest_df["date_index"].values - self.min_date_index
+        shape = (len(self.trade_id_array), self.max_date_index - self.min_date_index + 1)
+
+        # position of the last row at or before each date index, -1 before the first row of the trade
+        last_row_array = np.full(shape, -1, dtype="int64")
+        last_row_array[trade_num_array, position_array] = np.arange(len(position_array))
+        last_row_array = np.maximum.accumulate(last_row_array, axis=1)
+
+        offsets = segmentKernels.get_offsets(trade_num_array)
+        self.stock_log_array = self.get_prefix_array(backtest_df["daily_stock_return"].values, offsets,
+                                                     last_row_array)
+        self.fund_log_array = self.get_prefix_array(backtest_df["daily_fund_return"].values, offsets,
+                                                    last_row_array)
+
+    @staticmethod
+    def get_prefix_array(daily_return, offsets, last_row_array):
+        # cumulative log return of each row within its trade, looked up through last_row_array
+        log_return = np.log1p(np.nan_to_num(daily_return) / 100)
+        cumulative_log_return = segmentKernels.segment_cumsum(log_return, offsets)
+        return np.where(last_row_array >= 0, np.r_[cumulative_log_return, 0][last_row_array], 0)
+
+    def get_trade_nums(self, trade_ids):
+        trade_ids = np.atleast_1d(trade_ids)
+        trade_num_array = self.trade_id_index.get_indexer(trade_ids)
+        if (trade_num_array < 0).any():
+            raise Exception("trade_id not in Return Index: %s" % (list(trade_ids[trade_num_array < 0])))
+        return trade_num_array
+
+    def get_positions(self, date_index):
+        return np.clip(np.asarray(date_index) - self.min_date_index, 0, self.max_date_index - self.min_date_index)
+
+    def get_log_returns(self, trade_ids, entry_date_index, exit_date_index):
+        # log returns from close of entry day to close of exit day, entry / exit may be scalars or per trade arrays
+        trade_num_array = self.get_trade_nums(trade_ids)
+        entry_position = np.broadcast_to(self.get_positions(entry_date_index), trade_num_array.shape)
+        exit_position = np.broadcast_to(self.get_positions(exit_date_index), trade_num_array.shape)
+        stock_log_return = self.stock_log_array[trade_num_array, exit_position] - \
+                           self.stock_log_array[trade_num_array, entry_position]
+        fund_log_return = self.fund_log_array[trade_num_array, exit_position] - \
+                          self.fund_log_array[trade_num_array, entry_position]
+        return stock_log_return, fund_log_return
+
+    def get_window_returns(self, trade_ids, entry_date_index, exit_date_index, flip_side=False):
+        # stock, fund and long short return (%) of each trade over one window
+        trade_ids = np.atleast_1d(trade_ids)
+        stock_log_return, fund_log_return = self.get_log_returns(trade_ids, entry_date_index, exit_date_index)
+        window_df = pd.DataFrame({"trade_id": trade_ids,
+                                  "stock_return": np.expm1(stock_log_return) * 100,
+                                  "fund_return": np.expm1(fund_log_return) * 100})
+        if flip_side:
+            window_df["long_short_return"] = window_df["fund_return"] - window_df["stock_return"]
+        else:
+            window_df["long_short_return"] = window_df["stock_return"] - window_df["fund_return"]
+        return window_df
+
@@ -0,0 +1,166 @@
+import pandas as pd
+import os
+import sys
+import io
+import json
+import time
+import tracemalloc
+import cProfile
+import pstats
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from config import log
+
+logger = log.get_logger()
+
+def get_peak_rss_mb():
+    # peak resident memory of the process, ru_maxrss is in KB on linux and in bytes on macOS,
+    # None where the resource module does not exist (Windows)
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak_rss / 1024 ** 2 if sys.platform == "darwin" else peak_rss / 1024, 2)
+
+class remote_data_source():
+    '''
+    Counts calls and returned bytes of a Bloomberg data source (xbbg blp) into a run report.
+    Bytes are the in-memory size of the returned frames, the wire size is not exposed by blp.
+    '''
+    def __init__(self, data_source, run_report):
+        self.data_source = data_source
+        self.run_report = run_report
+
+    def bdh(self, tickers, flds, start_date, end_date, **kwargs):
+        price_data = self.data_source.bdh(tickers=tickers, flds=flds, start_date=start_date, end_date=end_date,
+                                          **kwargs)
+        self.run_report.add_remote_call(remote_bytes=int(price_data.memory_usage(deep=True).sum()))
+        return price_data
+
+class run_report():
+    '''
+    Wall time, CPU time, peak RSS, row counts and remote calls of every stage of one run and of every
+    effective date, written as a JSON report. Stages nest, e.g. get_backtest_files / write_output_files.
+    trace_memory adds the peak traced Python memory per stage, tracemalloc slows every stage down a lot.
+    With profile_slowest_stage each top level stage runs under cProfile and the stats of the slowest one are kept.
+    Without report_path nothing is written, so classes can always record into a run report.
+    '''
+    def __init__(self, report_path=None, trace_memory=False, profile_slowest_stage=False, params=None):
+        self.report_path = report_path
+        self.trace_memory = trace_memory
+        self.profile_slowest_stage = profile_slowest_stage
+        self.params = {} if params is None else params
+        self.stage_list = []
+        self.event_list = []
+        self.stage_stack = []
+        self.remote_call_count = 0
+        self.remote_bytes = 0
+        # remote calls are added from the fetch scheduler threads
+        self.remote_lock = threading.Lock()
+        self.profile_dict = {}
+        self.start_time = datetime.now()
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+        if self.report_path is not None and self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def add_remote_call(self, remote_bytes=0, call_count=1):
+        with self.remote_lock:
+            self.remote_call_count += call_count
+            self.remote_bytes += remote_bytes
+
+    def get_remote_totals(self):
+        with self.remote_lock:
+            return self.remote_call_count, self.remote_bytes
+
+    @contextmanager
+    def stage(self, name):
+        # yields a dict for counts of the stage, e.g. stage_dict["rows"] = len(df.index)
+        stage_dict = {"name": name, "parent": self.stage_stack[-1]["name"] if self.stage_stack else None}
+        tracing = tracemalloc.is_tracing() and self.trace_memory and self.report_path is not None
+        if tracing:
+            # the peak of the enclosing stage so far is kept before the peak is reset for this stage
+            if self.stage_stack:
+                self.stage_stack[-1]["peak_bytes"] = max(self.stage_stack[-1]["peak_bytes"],
+                                                         tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        profiler = None
+        if self.profile_slowest_stage and not self.stage_stack:
+            profiler = cProfile.Profile()
+        self.stage_stack.append({"name": name, "peak_bytes": 0})
+        start_remote_call_count, start_remote_bytes = self.get_remote_totals()
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield stage_dict
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            stage_dict["wall_seconds"] = round(time.perf_counter() - start_wall, 4)
+            stage_dict["cpu_seconds"] = round(time.process_time() - start_cpu, 4)
+            remote_call_count, remote_bytes = self.get_remote_totals()
+            stage_dict["remote_calls"] = remote_call_count - start_remote_call_count
+            stage_dict["remote_bytes"] = remote_bytes - start_remote_bytes
+            peak_bytes = self.stage_stack.pop()["peak_bytes"]
+            if tracing:
+                peak_bytes = max(peak_bytes, tracemalloc.get_traced_memory()[1])
+                stage_dict["peak_memory_mb"] = round(peak_bytes / 1024 ** 2, 2)
+                # the enclosing stage peaked at least as high as this stage
+                if self.stage_stack:
+                    self.stage_stack[-1]["peak_bytes"] = max(self.stage_stack[-1]["peak_bytes"], peak_bytes)
+            stage_dict["peak_rss_mb"] = get_peak_rss_mb()
+            if profiler is not None:
+                self.profile_dict[name] = (stage_dict["wall_seconds"], profiler)
+            self.stage_list.append(stage_dict)
+            logger.info("Stage %s took %.2fs wall, %.2fs CPU, %s remote calls" % (
+                name, stage_dict["wall_seconds"], stage_dict["cpu_seconds"], stage_dict["remote_calls"]))
+
+    def add_event(self, effective_date, **event_info):
+        # one record per effective date, e.g. fetch wait and compute seconds and row counts
+        self.event_list.append({"effective_date": pd.Timestamp(effective_date).strftime("%Y-%m-%d"), **event_info})
+
+    def get_profile(self):
+        # cProfile stats of the slowest top level stage, dumped next to the report
+        if self.profile_dict == {}:
+            return None
+        name, (wall_seconds, profiler) = max(self.profile_dict.items(), key=lambda item: item[1][0])
+        profile_path = os.path.splitext(self.report_path)[0] + ".prof"
+        profiler.dump_stats(profile_path)
+        stats_stream = io.StringIO()
+        pstats.Stats(profiler, stream=stats_stream).sort_stats("cumulative").print_stats(25)
+        return {"stage": name, "wall_seconds": wall_seconds, "path": profile_path,
+                "top_functions": stats_stream.getvalue().splitlines()}
+
+    def get_report(self):
+        remote_call_count, remote_bytes = self.get_remote_totals()
+        return {"start_time": self.start_time.strftime("%Y-%m-%d %H:%M:%S"),
+                "end_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "wall_seconds": round(time.perf_counter() - self.start_wall, 4),
+                "cpu_seconds": round(time.process_time() - self.start_cpu, 4),
+                "peak_rss_mb": get_peak_rss_mb(),
+                "remote_calls": remote_call_count,
+                "remote_bytes": remote_bytes,
+                "params": self.params,
+                "stages": self.stage_list,
+                "events": self.event_list}
+
+    def write(self):
+        if self.report_path is None:
+            return None
+        report = self.get_report()
+        if self.profile_slowest_stage:
+            report["profile"] = self.get_profile()
+        with open(self.report_path + ".tmp", "w") as f:
+            json.dump(report, f, indent=1, default=str)
+        os.replace(self.report_path + ".tmp", self.report_path)
+        if tracemalloc.is_tracing() and self.trace_memory:
+            tracemalloc.stop()
+        logger.info('''
+        Output Run Report to:
+        %s
+        ''' % (self.report_path))
+        return report
@@ -0,0 +1,60 @@
+import numpy as np
+
+# Kernels on trades stored as contiguous segments of one values array.
+# offsets holds the start of every segment plus the end of the last one, segment n is values[offsets[n]:offsets[n + 1]].
+# Segments of the same length are accumulated together as one 2D block along axis 1, so every scan runs in row order
+# like a per trade loop would, without a groupby or temporary DataFrame columns.
+
+def get_offsets(segment_ids):
+    # offsets of the runs of equal ids in a sorted id array
+    segment_ids = np.asarray(segment_ids)
+    if len(segment_ids) == 0:
+        return np.zeros(1, dtype="int64")
+    return np.flatnonzero(np.r_[True, segment_ids[1:] != segment_ids[:-1], True])
+
+def get_segment_nums(offsets):
+    # segment number of every row
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+def get_segment_positions(offsets):
+    # position of every row within its segment, 0 on the first row
+    return np.arange(offsets[-1]) - np.repeat(offsets[:-1], np.diff(offsets))
+
+def segment_accumulate(ufunc, values, offsets):
+    values = np.asarray(values, dtype="float64")
+    accumulated = np.empty_like(values)
+    segment_length = np.diff(offsets)
+    for length in np.unique(segment_length[segment_length > 0]):
+        rows = offsets[:-1][segment_length == length][:, None] + np.arange(length)
+        accumulated[rows] = ufunc.accumulate(values[rows], axis=1)
+    return accumulated
+
+def segment_cumsum(values, offsets):
+    return segment_accumulate(np.add, values, offsets)
+
+def segment_cumprod(values, offsets):
+    return segment_accumulate(np.multiply, values, offsets)
+
+def segment_cummax(values, offsets):
+    # NaN rows are skipped by the running maximum
+    return segment_accumulate(np.fmax, values, offsets)
+
+def segment_cummin(values, offsets):
+    return segment_accumulate(np.fmin, values, offsets)
+
+def segment_drawdown(values, offsets):
+    # distance of every row below the running maximum of its segment
+    return np.asarray(values, dtype="float64") - segment_cummax(values, offsets)
+
+def segment_last(values, offsets):
+    # last row of every non empty segment
+    return np.asarray(values)[offsets[1:][np.diff(offsets) > 0] - 1]
+
+def segment_min(values, offsets):
+    # minimum of every non empty segment, NaN rows skipped
+    starts = offsets[:-1][np.diff(offsets) > 0]
+    return np.fmin.reduceat(np.asarray(values, dtype="float64"), starts) if len(starts) > 0 else np.empty(0)
+
+def segment_max(values, offsets):
+    starts = offsets[:-1][np.diff(offsets) > 0]
+    return np.fmax.reduceat(np.asarray(values, dtype="float64"), starts) if len(starts) > 0 else np.empty(0)
@@ -0,0 +1,83 @@
+import pandas as pd
+import numpy as np
+from collections import OrderedDict
+from func import returnIndex
+
+class selection_index():
+    '''
+    Trade ids and backtest row positions of every review_type x change x ipo_only selection of one loaded
+    trade df and backtest df, built once, so selecting a subset is a take instead of masks and isin.
+    Results derived from a selection are kept in an LRU memo keyed by the selection and their parameters.
+    '''
+    def __init__(self, backtest_df, trade_df, cache_size=64):
+        self.backtest_df = backtest_df
+        self.trade_df = trade_df
+        self.cache_size = max(cache_size, 0)
+        self.cache = OrderedDict()
+        self.hit_count = 0
+        self.miss_count = 0
+        self.return_index = None
+
+        # rows of the n-th trade id are row_order[trade_start[n]:trade_start[n + 1]]
+        trade_id_array = backtest_df["trade_id"].values
+        self.row_order = np.argsort(trade_id_array, kind="stable")
+        sorted_trade_id = trade_id_array[self.row_order]
+        self.trade_id_index = pd.Index(pd.unique(sorted_trade_id))
+        self.trade_start = np.searchsorted(sorted_trade_id, self.trade_id_index.values, "left")
+        self.trade_start = np.r_[self.trade_start, len(sorted_trade_id)]
+
+        # trade ids and row positions of every selection, ipo_only as in the charts
+        selection_df = trade_df[["trade_id", "review_type", "change"]].copy()
+        selection_df["ipo"] = (trade_df["ipo_date"].notnull() & (trade_df["ipo_return"] != 0)).values
+        self.selection_dict = {}
+        for (review_type, change), this_df in selection_df.groupby(["review_type", "change"]):
+            for ipo_only in [False, True]:
+                trade_ids = np.unique(this_df[this_df["ipo"]]["trade_id"] if ipo_only else this_df["trade_id"])
+                self.selection_dict[(review_type, change, ipo_only)] = (trade_ids, self.get_rows(trade_ids))
+
+    def get_rows(self, trade_ids):
+        # backtest row positions of trade_ids in the order of backtest_df
+        trade_num_array = self.trade_id_index.get_indexer(trade_ids)
+        trade_num_array = trade_num_array[trade_num_array >= 0]
+        row_count = self.trade_start[trade_num_array + 1] - self.trade_start[trade_num_array]
+        sorted_rows = np.repeat(self.trade_start[trade_num_array] - np.cumsum(row_count) + row_count, row_count) + \
+                      np.arange(row_count.sum())
+        return np.sort(self.row_order[sorted_rows])
+
+    def get_selection(self, review_type, change, ipo_only=False):
+        empty_selection = (np.empty(0, dtype=self.trade_id_index.dtype), np.empty(0, dtype="int64"))
+        return self.selection_dict.get((review_type, change, ipo_only), empty_selection)
+
+    def get_trade_ids(self, review_type, change, ipo_only=False):
+        return self.get_selection(review_type, change, ipo_only)[0]
+
+    def get_backtest_df(self, review_type, change, ipo_only=False):
+        return self.backtest_df.take(self.get_selection(review_type, change, ipo_only)[1])
+
+    def get_return_index(self):
+        # prefix return index of the whole backtest, built on first use
+        if self.return_index is None:
+            self.return_index = returnIndex.return_index(backtest_df=self.backtest_df)
+        return self.return_index
+
+    def get_result(self, key, get_function):
+        # memoized get_function(), the least recently used result is dropped beyond cache_size
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.hit_count += 1
+            return self.copy_result(self.cache[key])
+        self.miss_count += 1
+        result = get_function()
+        if self.cache_size > 0:
+            self.cache[key] = result
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return self.copy_result(result)
+
+    @staticmethod
+    def copy_result(result):
+        # callers get their own copy of frames, the memo is never changed from outside
+        return result.copy() if isinstance(result, (pd.DataFrame, pd.Series)) else result
+
+    def clear(self):
+        self.cache.clear()
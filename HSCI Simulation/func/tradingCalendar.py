@@ -0,0 +1,117 @@
+import pandas as pd
+import numpy as np
+
+calendar_start_year = 2000
+calendar_end_year = 2040
+
+class trading_calendar():
+    '''
+    Business-day calendar of one listing place over calendar_start_year to calendar_end_year.
+    ordinal_array holds, for every calendar day, the number of trading days before it,
+    so the trading-day distance between any two dates is one subtraction and shifting or
+    rolling a whole date array is one lookup into trading_day_array.
+    '''
+    def __init__(self, listing_place):
+        self.listing_place = listing_place
+        self.start_date = np.datetime64("%s-01-01" % calendar_start_year, "D")
+        self.end_date = np.datetime64("%s-12-31" % calendar_end_year, "D")
+        # holidays is imported with the first calendar, not with the package
+        import holidays
+        holiday_dict = holidays.country_holidays(listing_place,
+                                                 years=range(calendar_start_year, calendar_end_year + 1))
+        self.holiday_array = np.array(sorted(holiday_dict.keys()), dtype="datetime64[D]")
+        self.busdaycalendar = np.busdaycalendar(holidays=self.holiday_array)
+
+        day_array = np.arange(self.start_date, self.end_date + 1)
+        trading_day_flag = np.is_busday(day_array, busdaycal=self.busdaycalendar)
+        self.ordinal_array = np.r_[0, np.cumsum(trading_day_flag)].astype("int64")
+        self.trading_day_flag = np.r_[trading_day_flag, False]
+        self.trading_day_array = day_array[trading_day_flag]
+
+    def get_day_offset(self, dates):
+        day_array = np.asarray(pd.DatetimeIndex(np.atleast_1d(dates)).values.astype("datetime64[D]"))
+        day_offset = (day_array - self.start_date).astype("int64")
+        if day_offset.size > 0 and (day_offset.min() < 0 or day_offset.max() >= len(self.ordinal_array)):
+            raise Exception("Date out of trading calendar range %s - %s" % (calendar_start_year, calendar_end_year))
+        return day_offset
+
+    def get_ordinal(self, dates):
+        # number of trading days before each date, a holiday gets the ordinal of the next trading day
+        return self.ordinal_array[self.get_day_offset(dates)]
+
+    def get_trading_days(self, ordinals):
+        if ordinals.size > 0 and (ordinals.min() < 0 or ordinals.max() >= len(self.trading_day_array)):
+            raise Exception("Date out of trading calendar range %s - %s" % (calendar_start_year, calendar_end_year))
+        return pd.DatetimeIndex(self.trading_day_array[ordinals])
+
+    def is_trading_day(self, dates):
+        return self.trading_day_flag[self.get_day_offset(dates)]
+
+    def shift(self, dates, business_days):
+        # same as adding BDay(business_days) but skipping holidays, a non-trading day counts as rolled forward
+        day_offset = self.get_day_offset(dates)
+        ordinals = self.ordinal_array[day_offset] + business_days
+        if business_days > 0:
+            ordinals -= ~self.trading_day_flag[day_offset]
+        return self.get_trading_days(ordinals)
+
+    def roll(self, dates, direction):
+        # nearest trading day on or after (forward) or on or before (backward) each date
+        day_offset = self.get_day_offset(dates)
+        if direction == "forward":
+            return self.get_trading_days(self.ordinal_array[day_offset])
+        elif direction == "backward":
+            return self.get_trading_days(self.ordinal_array[day_offset + 1] - 1)
+        else:
+            raise Exception("direction only accepts forward, backward")
+
+calendar_dict = {}
+
+def get_trading_calendar(listing_place):
+    # built once per listing place
+    if listing_place not in calendar_dict:
+        calendar_dict[listing_place] = trading_calendar(listing_place=listing_place)
+    return calendar_dict[listing_place]
+
+def shift_trading_days(dates, business_days, listing_places):
+    shifted_dates = np.asarray(pd.DatetimeIndex(dates).values).copy()
+    listing_places = np.asarray(listing_places)
+    for listing_place in pd.unique(listing_places):
+        this_flag = listing_places == listing_place
+        shifted_dates[this_flag] = get_trading_calendar(listing_place).shift(
+            shifted_dates[this_flag], business_days).values
+    return pd.DatetimeIndex(shifted_dates)
+
+def roll_trading_days(dates, direction, listing_places):
+    rolled_dates = np.asarray(pd.DatetimeIndex(dates).values).copy()
+    listing_places = np.asarray(listing_places)
+    for listing_place in pd.unique(listing_places):
+        this_flag = listing_places == listing_place
+        rolled_dates[this_flag] = get_trading_calendar(listing_place).roll(
+            rolled_dates[this_flag], direction).values
+    return pd.DatetimeIndex(rolled_dates)
+
+def is_trading_day(dates, listing_places):
+    trading_day_flag = np.zeros(len(dates), dtype="bool")
+    listing_places = np.asarray(listing_places)
+    for listing_place in pd.unique(listing_places):
+        this_flag = listing_places == listing_place
+        trading_day_flag[this_flag] = get_trading_calendar(listing_place).is_trading_day(np.asarray(dates)[this_flag])
+    return trading_day_flag
+
+def get_date_index(dates, effective_dates, listing_places):
+    # trading days from effective date to date for every row,
+    # a non-trading day would share the ordinal of the next trading day so it is refused
+    date_index = np.zeros(len(dates), dtype="int64")
+    listing_places = np.asarray(listing_places)
+    for listing_place in pd.unique(listing_places):
+        this_flag = listing_places == listing_place
+        this_calendar = get_trading_calendar(listing_place)
+        non_trading_flag = ~this_calendar.is_trading_day(np.asarray(dates)[this_flag])
+        if non_trading_flag.any():
+            raise Exception("No date_index for non-trading days of %s: %s" % (
+                listing_place, ", ".join(pd.DatetimeIndex(np.asarray(dates)[this_flag][non_trading_flag])
+                                         .strftime("%Y-%m-%d").unique())))
+        date_index[this_flag] = this_calendar.get_ordinal(np.asarray(dates)[this_flag]) - \
+                                this_calendar.get_ordinal(np.asarray(effective_dates)[this_flag])
+    return date_index
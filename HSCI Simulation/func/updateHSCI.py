@@ -1,108 +1,256 @@
 import pandas as pd
 import numpy as np
 from config import log
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support.ui import Select
-from selenium.webdriver.support import expected_conditions as EC
-from pandas.tseries.offsets import BDay
+from func import tradingCalendar
+from func import workbookCache
 import os
 import time
 import glob
+import json
+import shutil
+import tempfile
+import urllib.request
+import urllib.error
 
 logger = log.get_logger()
 
-def scrape_hsci_change(download_path, download_hsci_file_path, chrome_driver_path):
+hsci_page_url = "https://www.hsi.com.hk/eng/indexes/all-indexes/hsci"
+
+def get_previous_file_path(download_hsci_file_path):
+    # the version before the last change is kept next to the file, e.g. hsci_hist_change.previous.xlsx
+    file_root, file_extension = os.path.splitext(download_hsci_file_path)
+    return file_root + ".previous" + file_extension
+
+def read_file_info(download_hsci_file_path):
+    # sha256, HTTP validators (ETag, Last-Modified) and url of the published file of the current file,
+    # kept in a sidecar json
+    info_path = download_hsci_file_path + ".json"
+    if not os.path.exists(download_hsci_file_path) or not os.path.exists(info_path):
+        return {}
+    with open(info_path) as f:
+        return json.load(f)
+
+def write_file_info(download_hsci_file_path, file_info):
+    info_path = download_hsci_file_path + ".json"
+    with open(info_path + ".tmp", "w") as f:
+        json.dump(file_info, f, indent=1)
+    os.replace(info_path + ".tmp", info_path)
+
+def install_hsci_file(new_file_path, download_hsci_file_path, file_info=None):
+    '''
+    Move a downloaded change file into place unless its content is the same as the current file.
+    The current file is kept as the previous version. Returns True if the file changed.
+    '''
+    file_info = dict({} if file_info is None else file_info)
+    file_info["sha256"] = workbookCache.get_file_hash(new_file_path)
+    file_info["checked_time"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    old_file_info = read_file_info(download_hsci_file_path)
+    if os.path.exists(download_hsci_file_path):
+        old_sha256 = old_file_info["sha256"] if "sha256" in old_file_info else \
+            workbookCache.get_file_hash(download_hsci_file_path)
+        if old_sha256 == file_info["sha256"]:
+            os.remove(new_file_path)
+            write_file_info(download_hsci_file_path, dict(old_file_info, **file_info))
+            logger.info("HSCI Historical Change File unchanged " + file_info["sha256"][:12])
+            return False
+        os.replace(download_hsci_file_path, get_previous_file_path(download_hsci_file_path))
+    os.replace(new_file_path, download_hsci_file_path)
+    write_file_info(download_hsci_file_path, file_info)
+    logger.info("HSCI Historical Change File updated " + file_info["sha256"][:12])
+    return True
+
+def download_hsci_file(file_url, download_hsci_file_path, timeout_seconds=60):
+    '''
+    Conditional GET of a published change file, If-None-Match / If-Modified-Since from the last download,
+    so an unchanged file costs one 304 response. Returns True if the file changed.
+    '''
+    file_info = read_file_info(download_hsci_file_path)
+    request = urllib.request.Request(file_url)
+    if file_info.get("url") == file_url:
+        if file_info.get("etag"):
+            request.add_header("If-None-Match", file_info["etag"])
+        if file_info.get("last_modified"):
+            request.add_header("If-Modified-Since", file_info["last_modified"])
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout_seconds)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            logger.info("HSCI Historical Change File not modified since " + file_info["checked_time"])
+            file_info["checked_time"] = time.strftime("%Y-%m-%d %H:%M:%S")
+            write_file_info(download_hsci_file_path, file_info)
+            return False
+        raise Exception("HSCI Historical Change File download failed with HTTP %s from %s" % (e.code, file_url))
+
+    # streamed next to the file, a short body is an incomplete download
+    new_file_path = download_hsci_file_path + ".download"
+    with response, open(new_file_path, "wb") as f:
+        shutil.copyfileobj(response, f, 1024 * 1024)
+        content_length = response.headers.get("Content-Length")
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+    if content_length is not None and os.path.getsize(new_file_path) != int(content_length):
+        os.remove(new_file_path)
+        raise Exception("Incomplete HSCI Historical Change File download from " + file_url)
+    return install_hsci_file(new_file_path=new_file_path, download_hsci_file_path=download_hsci_file_path,
+                             file_info={"url": file_url, "file_url": file_url, "etag": etag,
+                                        "last_modified": last_modified})
+
+def wait_for_download(download_path, timeout_seconds=60, poll_seconds=0.2):
+    # the single xlsx in download_path once chrome has finished writing it and its size is stable
+    end_time = time.time() + timeout_seconds
+    last_size = None
+    while time.time() < end_time:
+        download_files = glob.glob(download_path + "/*.xlsx")
+        partial_files = glob.glob(download_path + "/*.crdownload") + glob.glob(download_path + "/*.tmp")
+        if len(download_files) == 1 and partial_files == []:
+            size = os.path.getsize(download_files[0])
+            if size > 0 and size == last_size:
+                return download_files[0]
+            last_size = size
+        time.sleep(poll_seconds)
+    raise Exception("HSCI Historical Change File download not finished in %s seconds" % timeout_seconds)
+
+def get_logged_download_url(log_entry_list):
+    # url of the last download announced in the performance log of chrome (CDP downloadWillBegin event)
+    file_url = None
+    for log_entry in log_entry_list:
+        message = json.loads(log_entry["message"]).get("message", {})
+        if message.get("method") in ["Page.downloadWillBegin", "Browser.downloadWillBegin"]:
+            file_url = message.get("params", {}).get("url", file_url)
+    return file_url
+
+def get_download_url(driver, download_button):
+    # url of the published file: the link the View Now target points to, otherwise the download chrome logged,
+    # None when neither is an http url a conditional GET can check
+    file_url = driver.execute_script('''
+        var button = arguments[0];
+        var link = button.closest("a[href]");
+        var href = link ? link.getAttribute("href") : (button.getAttribute("href") ||
+            button.getAttribute("formaction") || button.getAttribute("data-href") || button.getAttribute("data-url"));
+        return href ? new URL(href, document.baseURI).href : null;
+    ''', download_button)
+    if file_url is None:
+        try:
+            file_url = get_logged_download_url(driver.get_log("performance"))
+        except Exception as e:
+            logger.warning("No performance log of chrome to find the download url: %s" % (e))
+    if file_url is None or not file_url.lower().startswith(("http://", "https://")):
+        return None
+    return file_url
+
+def scrape_hsci_change(download_path, download_hsci_file_path, chrome_driver_path, page_url=hsci_page_url,
+                       timeout_seconds=60):
+    # selenium is only needed to scrape, runs on an existing change file work without it
+    try:
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support.ui import Select
+        from selenium.webdriver.support import expected_conditions as EC
+    except ImportError:
+        raise Exception("No selenium. Please install selenium or change update_hsci_file to False in config.conf")
+
     # check if chromedriver exists
     if os.path.exists(chrome_driver_path):
         logger.info('''
         chromedriver exists.
-        Start scraping HSCI historical change from https://www.hsi.com.hk/eng/indexes/all-indexes/hsci
-        ''')
+        Start scraping HSCI historical change from %s
+        ''' % (page_url))
     else:
         raise Exception("No chromedriver. Please update chrome_driver_path in config.conf")
 
-    # download historical change of HSCI from internet to Raw Data Files
+    # download historical change of HSCI into an empty folder of Raw Data Files, so the new file is the only one
+    this_download_path = tempfile.mkdtemp(prefix="download_", dir=download_path)
     chrome_options = Options()
     chrome_options.headless = True
     prefs = {}
-    prefs["download.default_directory"] = download_path
+    prefs["download.default_directory"] = this_download_path
     prefs["download.prompt_for_download"] = False
     chrome_options.add_experimental_option("prefs", prefs)
+    # downloads are announced in the performance log, where the url of the published file is read from
+    chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
 
     driver = webdriver.Chrome(chrome_driver_path, chrome_options=chrome_options)
-    driver.get("https://www.hsi.com.hk/eng/indexes/all-indexes/hsci")
-    element = WebDriverWait(driver, 10).until(
-        EC.presence_of_element_located((By.ID, "constituentsSelect"))
-    )
-    hist_cons_select = Select(element)
-    hist_cons_select.select_by_visible_text("Hang Seng Composite Index")
-    download_button = driver.find_element_by_xpath('//button[text()="View Now"]')
-    driver.execute_script("arguments[0].click();", download_button)
-
-    # rename the downloaded file
-    time.sleep(0.5)
-    download_files = glob.glob(download_path + "/*.xlsx")
-    latest_file = max(download_files, key=os.path.getctime)
-    os.rename(latest_file, download_hsci_file_path)
+    try:
+        driver.get(page_url)
+        element = WebDriverWait(driver, 10).until(
+            EC.presence_of_element_located((By.ID, "constituentsSelect"))
+        )
+        hist_cons_select = Select(element)
+        hist_cons_select.select_by_visible_text("Hang Seng Composite Index")
+        download_button = driver.find_element_by_xpath('//button[text()="View Now"]')
+        driver.execute_script("arguments[0].click();", download_button)
+        new_file_path = wait_for_download(download_path=this_download_path, timeout_seconds=timeout_seconds)
+        # url of the published file, later runs check it with a conditional GET instead of starting chrome
+        file_url = get_download_url(driver=driver, download_button=download_button)
+        logger.info("Published HSCI Historical Change File at %s" % (file_url))
+        # the previous version is kept, an unchanged download is dropped
+        return install_hsci_file(new_file_path=new_file_path, download_hsci_file_path=download_hsci_file_path,
+                                 file_info={"url": page_url, "file_url": file_url})
+    finally:
+        driver.quit()
+        shutil.rmtree(this_download_path, ignore_errors=True)
+
+def refresh_hsci_file(download_path, download_hsci_file_path, chrome_driver_path, file_url=None,
+                      page_url=hsci_page_url, timeout_seconds=60):
+    # with the url of the published file, given or found by the last scrape, no browser is started,
+    # otherwise the page is scraped, which also finds the url for the next run
+    found_file_url = read_file_info(download_hsci_file_path).get("file_url") if file_url is None else None
+    if file_url is not None or found_file_url is not None:
+        logger.info("Check HSCI Historical Change File at " + (file_url or found_file_url))
+        try:
+            return download_hsci_file(file_url=file_url or found_file_url,
+                                      download_hsci_file_path=download_hsci_file_path,
+                                      timeout_seconds=timeout_seconds)
+        except Exception as e:
+            # a url found on the page may move, it is looked up again
+            if file_url is not None:
+                raise
+            logger.info("HSCI Historical Change File url failed, scrape the page again: %s" % (e))
+    return scrape_hsci_change(download_path=download_path, download_hsci_file_path=download_hsci_file_path,
+                              chrome_driver_path=chrome_driver_path, page_url=page_url,
+                              timeout_seconds=timeout_seconds)
 
 class get_hsci_trade_file():
-    def __init__(self, start_year, end_year, begin_business_day, end_business_day, download_hsci_file_path):
+    def __init__(self, start_year, end_year, begin_business_day, end_business_day, download_hsci_file_path,
+                 workbook_cache_path=None, workbook_parse_workers=2):
         self.start_year = start_year
         self.end_year = end_year
         self.begin_business_day = begin_business_day
         self.end_business_day = end_business_day
         self.download_hsci_file_path = download_hsci_file_path
+        self.workbook_cache_path = workbook_cache_path
+        self.workbook_parse_workers = workbook_parse_workers
 
-    def run(self):
+    def get_trade_file(self, main_file, sector_file):
+        # trade file from the parsed main sheet and sector sheets, every stage works on whole columns
         def clean_hsci_raw_file(main_file, start_year, end_year):
-            column_list = ["effective_date", "number_of_cons", "change", "count", "stock_code",
-                           "listing_place", "stock_name", "stock_name_chinese"]
-            main_file = main_file.iloc[5:-5, :].copy()
-            main_file.columns = column_list
-            main_file["effective_date"] = main_file["effective_date"].astype("datetime64[ns]")
             main_file["year"] = main_file["effective_date"].dt.year
             main_file = main_file[(main_file["year"] >= start_year) & (main_file["year"] <= end_year)].copy()
             main_file["change"] = main_file["change"].replace({"Add 加入": "Add", "Delete 刪除": "Delete"})
             main_file["listing_place"] = "HK"
-            main_file["count"] = [-int(num[1:]) if num[0] == "-" else int(num[1:]) for num in main_file["count"]]
+            # "+32" / "-1" / 32, only a leading sign character is stripped and anything else not a number raises
+            count = main_file["count"].astype(str).str.strip()
+            sign = np.where(count.str.startswith("-"), -1, 1)
+            count = pd.to_numeric(count.str.replace(r"^[+-]", "", regex=True), errors="raise")
+            main_file["count"] = (sign * count).astype("int64")
             return main_file
 
         def get_hsci_review_type(main_file):
-            review_type_file = main_file[["effective_date", "count"]].drop_duplicates()
-            review_type_file["month"] = review_type_file["effective_date"].dt.month
-            review_type_file["review_type"] = ["Regular" if month in [3, 9] and abs(count) >= 3 else "Interim" for
-                                               month, count in np.array(review_type_file[["month", "count"]])]
-            review_type_file = review_type_file.sort_values(["effective_date", "review_type"])
-            review_type_file = review_type_file.groupby(["effective_date"])["review_type"].last().reset_index()
-            main_file = pd.merge(main_file, review_type_file, on=["effective_date"], how="left")
+            # an effective date is Regular if any of its counts is a March / September review of 3 or more
+            regular_flag = main_file["effective_date"].dt.month.isin([3, 9]) & (main_file["count"].abs() >= 3)
+            regular_flag = regular_flag.groupby(main_file["effective_date"]).transform("any")
+            main_file["review_type"] = np.where(regular_flag, "Regular", "Interim")
             return main_file
 
         def flag_out_name_change(main_file):
-            name_change_file = main_file.groupby(["effective_date", "stock_code"])["stock_name"].count().reset_index()
-            name_change_file = name_change_file[name_change_file["stock_name"] > 1]
-            if not name_change_file.empty:
-                for date, code in np.array(name_change_file[["effective_date", "stock_code"]]):
-                    this_index = main_file[(main_file["effective_date"] == date) &
-                                           (main_file["stock_code"] == code)].index
-                    main_file.loc[this_index, "review_type"] = "Name Change"
+            name_count = main_file.groupby(["effective_date", "stock_code"])["stock_name"].transform("count")
+            main_file.loc[name_count > 1, "review_type"] = "Name Change"
             return main_file
 
-        def get_hsci_sector(hsci_excel, main_file):
-            sectorDfList = []
-            for sheet_name in hsci_excel.sheet_names:
-                if "-" in sheet_name:
-                    sector = sheet_name.split("-")[-1]
-                    this_excel = hsci_excel.parse(sheet_name)
-                    this_excel = this_excel.iloc[5:-5, [0, 2, 4]]
-                    this_excel.columns = ["effective_date", "change", "stock_code"]
-                    this_excel["effective_date"] = this_excel["effective_date"].astype("datetime64[ns]")
-                    this_excel["change"] = this_excel["change"].replace({"Add 加入": "Add", "Delete 刪除": "Delete"})
-                    this_excel["sector"] = sector
-                    sectorDfList.append(this_excel)
-            sectorDf = pd.concat(sectorDfList).drop_duplicates()
+        def get_hsci_sector(sector_file, main_file):
+            sectorDf = sector_file.copy()
             sectorDf["sector"] = sectorDf["sector"].replace({"CD": "Consumer Discretionary", "CONG": "Conglomerates",
                                                              "CS": "Consumer Staples", "ENG": "Energy",
                                                              "FIN": "Financials",
@@ -116,29 +264,19 @@ class get_hsci_trade_file():
             return main_file
 
         def get_trade_start_end_date(main_file, begin_business_day, end_business_day):
-            date_list = list(main_file["effective_date"].drop_duplicates())
-            begin_date_list = []
-            end_date_list = []
-            for date in date_list:
-                begin_date = date - BDay(begin_business_day)
-                end_date = date + BDay(end_business_day)
-
-                begin_date_list.append(begin_date)
-                end_date_list.append(end_date)
-            date_file = pd.DataFrame.from_dict({"effective_date": date_list,
-                                                "trade_start_date": begin_date_list,
-                                                "trade_end_date": end_date_list})
-            main_file = pd.merge(main_file, date_file, on=["effective_date"], how="left")
+            # shift effective date by trading days of the listing place, skipping holidays
+            main_file["trade_start_date"] = tradingCalendar.shift_trading_days(
+                dates=main_file["effective_date"], business_days=-begin_business_day,
+                listing_places=main_file["listing_place"]).values
+            main_file["trade_end_date"] = tradingCalendar.shift_trading_days(
+                dates=main_file["effective_date"], business_days=end_business_day,
+                listing_places=main_file["listing_place"]).values
             return main_file
 
         def get_bbg_ticker(main_file):
             main_file["bbg_ticker"] = main_file["stock_code"].astype(str) + " " + main_file["listing_place"] + " Equity"
             return main_file
 
-        hsci_excel = pd.ExcelFile(self.download_hsci_file_path)
-        main_file = hsci_excel.parse(hsci_excel.sheet_names[0])
-        logger.info('''Read Excel from %s''' % (self.download_hsci_file_path))
-
         # clean raw file
         main_file = clean_hsci_raw_file(main_file=main_file, start_year=self.start_year, end_year=self.end_year)
         logger.info("Cleaned Raw File")
@@ -152,7 +290,7 @@ class get_hsci_trade_file():
         logger.info("Flagged out Name Change Cases")
 
         # get hang seng sector
-        main_file = get_hsci_sector(hsci_excel=hsci_excel, main_file=main_file)
+        main_file = get_hsci_sector(sector_file=sector_file, main_file=main_file)
         logger.info("Got Hang Seng Sector")
 
         # get trade start date and trade end date
@@ -165,6 +303,18 @@ class get_hsci_trade_file():
         logger.info("Got BBG Ticker")
         return main_file
 
+    def run(self):
+        # parsed workbook is reused while the file content is unchanged
+        if self.workbook_cache_path is not None:
+            main_file, sector_file = workbookCache.read_hsci_workbook(file_path=self.download_hsci_file_path,
+                                                                      cache_path=self.workbook_cache_path,
+                                                                      max_workers=self.workbook_parse_workers)
+        else:
+            main_file, sector_file = workbookCache.parse_hsci_workbook(file_path=self.download_hsci_file_path,
+                                                                       max_workers=self.workbook_parse_workers)
+        logger.info('''Read Excel from %s''' % (self.download_hsci_file_path))
+        return self.get_trade_file(main_file=main_file, sector_file=sector_file)
+
 
 
 
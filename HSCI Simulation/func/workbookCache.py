@@ -0,0 +1,114 @@
+import pandas as pd
+import os
+import re
+import glob
+import shutil
+import hashlib
+from config import log
+from func.priceCache import get_file_format
+from concurrent.futures import ProcessPoolExecutor
+
+logger = log.get_logger()
+
+# fewer sector sheets than this are parsed in this process, a worker costs more than it saves
+min_parallel_sector_sheets = 8
+
+def get_file_hash(file_path):
+    file_hash = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+def parse_main_sheet(hsci_excel, sheet_name):
+    column_list = ["effective_date", "number_of_cons", "change", "count", "stock_code",
+                   "listing_place", "stock_name", "stock_name_chinese"]
+    main_file = hsci_excel.parse(sheet_name)
+    main_file = main_file.iloc[5:-5, :].copy()
+    main_file.columns = column_list
+    main_file["effective_date"] = main_file["effective_date"].astype("datetime64[ns]")
+    return main_file
+
+def parse_sector_sheet(hsci_excel, sheet_name):
+    sector = sheet_name.split("-")[-1]
+    this_excel = hsci_excel.parse(sheet_name)
+    this_excel = this_excel.iloc[5:-5, [0, 2, 4]]
+    this_excel.columns = ["effective_date", "change", "stock_code"]
+    this_excel["effective_date"] = this_excel["effective_date"].astype("datetime64[ns]")
+    this_excel["change"] = this_excel["change"].replace({"Add 加入": "Add", "Delete 刪除": "Delete"})
+    this_excel["sector"] = sector
+    return this_excel
+
+def parse_sector_sheets(file_path, sheet_name_list):
+    # a worker opens the workbook read only, which parses none of the sheets, and parses only its own sheets
+    hsci_excel = pd.ExcelFile(file_path)
+    return [parse_sector_sheet(hsci_excel, sheet_name) for sheet_name in sheet_name_list]
+
+def parse_hsci_workbook(file_path, max_workers):
+    '''
+    Main sheet and every sector sheet ("HSCI-FIN", ...), each parsed once.
+    With enough sector sheets and cores they are split between the workers
+    while the main sheet, the largest by far, is parsed here at the same time.
+    '''
+    hsci_excel = pd.ExcelFile(file_path)
+    sheet_names = hsci_excel.sheet_names
+    sector_sheet_names = [sheet_name for sheet_name in sheet_names[1:] if "-" in sheet_name]
+    max_workers = min(max_workers, (os.cpu_count() or 1) - 1, len(sector_sheet_names))
+    if max_workers < 1 or len(sector_sheet_names) < min_parallel_sector_sheets:
+        main_file = parse_main_sheet(hsci_excel, sheet_names[0])
+        sector_file_list = [parse_sector_sheet(hsci_excel, sheet_name) for sheet_name in sector_sheet_names]
+    else:
+        chunk_list = [sector_sheet_names[chunk_num::max_workers] for chunk_num in range(max_workers)]
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            future_list = [executor.submit(parse_sector_sheets, file_path, sheet_name_list)
+                           for sheet_name_list in chunk_list]
+            main_file = parse_main_sheet(hsci_excel, sheet_names[0])
+            sector_dict = {}
+            for sheet_name_list, future in zip(chunk_list, future_list):
+                sector_dict.update(zip(sheet_name_list, future.result()))
+        sector_file_list = [sector_dict[sheet_name] for sheet_name in sector_sheet_names]
+    sector_file = pd.concat(sector_file_list).drop_duplicates()
+    return main_file, sector_file
+
+def get_columnar_frame(df):
+    # Excel gives numbers and text in one column (stock codes), parquet needs one type per column
+    df = df.copy()
+    for column in df.columns[df.dtypes == object]:
+        df[column] = df[column].where(df[column].isnull(), df[column].astype(str))
+    return df
+
+def read_hsci_workbook(file_path, cache_path, max_workers):
+    '''
+    Parsed main sheet and sector sheets of the HSCI change workbook.
+    Results are kept under cache_path keyed by the sha256 of the workbook, so an unchanged file
+    is read back from parquet (pickle without pyarrow) without opening Excel.
+    '''
+    file_format = get_file_format()
+    file_hash = get_file_hash(file_path)
+    hash_path = cache_path + "/" + file_hash
+    main_file_path = hash_path + "/main_file." + file_format
+    sector_file_path = hash_path + "/sector_file." + file_format
+    read_file = pd.read_parquet if file_format == "parquet" else pd.read_pickle
+    if os.path.exists(main_file_path) and os.path.exists(sector_file_path):
+        logger.info("Read parsed HSCI Workbook from Workbook Cache " + file_hash[:12])
+        return read_file(main_file_path), read_file(sector_file_path)
+
+    main_file, sector_file = parse_hsci_workbook(file_path=file_path, max_workers=max_workers)
+    logger.info("Parsed HSCI Workbook %s with %s Sector Sheets" % (file_hash[:12], sector_file["sector"].nunique()))
+    # a miss returns the same frames a later hit reads back
+    main_file = get_columnar_frame(main_file)
+    sector_file = get_columnar_frame(sector_file)
+
+    # keep only the entry of the current workbook in the current format, directories not named by
+    # a sha256 key are not the cache's and are left alone
+    for old_hash_path in glob.glob(cache_path + "/*"):
+        if os.path.isdir(old_hash_path) and re.fullmatch("[0-9a-f]{64}", os.path.basename(old_hash_path)):
+            shutil.rmtree(old_hash_path)
+    os.makedirs(hash_path, exist_ok=True)
+    for df, df_file_path in [(main_file, main_file_path), (sector_file, sector_file_path)]:
+        if file_format == "parquet":
+            df.to_parquet(df_file_path + ".tmp", compression="zstd")
+        else:
+            df.to_pickle(df_file_path + ".tmp")
+        os.replace(df_file_path + ".tmp", df_file_path)
+    return main_file, sector_file
@@ -2,62 +2,186 @@ from config.conf import *
 from config import log
 from func import updateHSCI
 from func import backtestHSCI
+from func import parameterSweep
+from func import parameterOptimizer
+from func import performanceCube
+from func import runReport
 import os
 
 logger = log.get_logger()
 
 def hsciMain():
+    # working directories and the log file are only created once a run starts
+    make_working_directories()
+    log.add_log_file()
     logger.info('Start running hsciMain')
+    logger.info("Working Directories under " + program_path)
 
-    # get HSCI Historical Change File
-    update_hsci = simulation_params["update_hsci_file"]
-    download_path = working_directories['raw_data_files']
-    download_hsci_file_path = working_directories["raw_data_files"] + "/" + simulation_params["hsci_file_name"]
-    if update_hsci:
-        logger.info("Start updating HSCI Historical Change File")
-
-        if os.path.exists(download_hsci_file_path):
-            os.remove(download_hsci_file_path)
-            logger.info("Deleted old HSCI Historical Change File")
-
-        updateHSCI.scrape_hsci_change(download_path=download_path, download_hsci_file_path=download_hsci_file_path,
-                                      chrome_driver_path=chrome_driver_path)
-        logger.info('''
-        Updated HSCI Historical Change File. Path:
-        %s
-        ''' % (download_hsci_file_path))
-    else:
-        logger.info("Use existing HSCI Historical Change File")
-
-        if not os.path.exists(download_hsci_file_path):
-            raise Exception('''
-            No existing HSCI Historical Change File. 
-            Please change update_hsci_file to True in config.conf - simulation_params
-            ''')
-
-    # get a Trading Log from HSCI Historical Change File
-    start_year = simulation_params["start_year"]
-    end_year = simulation_params["end_year"]
-    begin_business_day = simulation_params["begin_business_day"]
-    end_business_day = simulation_params["end_business_day"]
-
-    logger.info("Start getting HSCI Trade File")
-    main_file = updateHSCI.get_hsci_trade_file(start_year=start_year, end_year=end_year,
-                                               begin_business_day=begin_business_day, end_business_day=end_business_day,
-                                               download_hsci_file_path=download_hsci_file_path).run()
-    # clean HSCI Trade File
-    logger.info("Start cleaning HSCI Trade File")
-    main_file = backtestHSCI.clean_trade_file(trade_file=main_file, reuse_ticker_dict=reuse_ticker_dict).run()
-
-    # get adjusted Trading Log and Backtesting File
-    logger.info("Start getting Final Trading Log and BackTesting File")
-    funding_source = simulation_params["funding_source"]
-    output_hsci_trade_file_path = working_directories["output_files"] + "/" + simulation_params["trade_file_name"]
-    output_hsci_backtest_file_path = working_directories["output_files"] + "/" + simulation_params["backtest_file_name"]
-    backtestHSCI.get_backtest_files(trade_file=main_file,
-                                    funding_source=funding_source,
-                                    output_hsci_trade_file_path=output_hsci_trade_file_path,
-                                    output_hsci_backtest_file_path=output_hsci_backtest_file_path).run()
+    # wall / CPU time, peak memory, rows and remote calls of every stage and effective date, also for failed runs
+    run_report = runReport.run_report(
+        report_path=working_directories["output_files"] + "/" + simulation_params["run_report_file_name"]
+        if simulation_params["run_report"] else None,
+        trace_memory=simulation_params["trace_memory"],
+        profile_slowest_stage=simulation_params["profile_slowest_stage"],
+        params=simulation_params)
+    try:
+        # get HSCI Historical Change File
+        update_hsci = simulation_params["update_hsci_file"]
+        download_path = working_directories['raw_data_files']
+        download_hsci_file_path = working_directories["raw_data_files"] + "/" + simulation_params["hsci_file_name"]
+        with run_report.stage("update_hsci_file") as stage_dict:
+            if update_hsci:
+                logger.info("Start updating HSCI Historical Change File")
+
+                # the file is only replaced when the published one changed, the old one is kept as previous version
+                stage_dict["changed"] = updateHSCI.refresh_hsci_file(
+                    download_path=download_path, download_hsci_file_path=download_hsci_file_path,
+                    chrome_driver_path=chrome_driver_path, file_url=simulation_params["hsci_file_url"],
+                    timeout_seconds=simulation_params["hsci_download_timeout_seconds"])
+                logger.info('''
+                %s HSCI Historical Change File. Path:
+                %s
+                ''' % ("Updated" if stage_dict["changed"] else "Unchanged", download_hsci_file_path))
+            else:
+                logger.info("Use existing HSCI Historical Change File")
+
+                if not os.path.exists(download_hsci_file_path):
+                    raise Exception('''
+                    No existing HSCI Historical Change File. 
+                    Please change update_hsci_file to True in config.conf - simulation_params
+                    ''')
+
+        # get a Trading Log from HSCI Historical Change File
+        start_year = simulation_params["start_year"]
+        end_year = simulation_params["end_year"]
+        funding_source = simulation_params["funding_source"]
+        price_cache_path = working_directories["price_cache"] if simulation_params["use_price_cache"] else None
+
+        def get_backtest_files(begin_business_day, end_business_day, trade_file_name, backtest_file_name, event_path,
+                               stage_prefix=""):
+            # trade file and backtest of one [-begin_business_day, end_business_day] window into its own files
+            with run_report.stage(stage_prefix + "get_hsci_trade_file") as stage_dict:
+                logger.info("Start getting HSCI Trade File")
+                main_file = updateHSCI.get_hsci_trade_file(
+                    start_year=start_year, end_year=end_year,
+                    begin_business_day=begin_business_day, end_business_day=end_business_day,
+                    download_hsci_file_path=download_hsci_file_path,
+                    workbook_cache_path=working_directories["workbook_cache"],
+                    workbook_parse_workers=simulation_params["workbook_parse_workers"]).run()
+                stage_dict["rows"] = len(main_file.index)
+
+            # clean HSCI Trade File
+            with run_report.stage(stage_prefix + "clean_trade_file") as stage_dict:
+                logger.info("Start cleaning HSCI Trade File")
+                main_file = backtestHSCI.clean_trade_file(trade_file=main_file,
+                                                          reuse_ticker_dict=reuse_ticker_dict).run()
+                stage_dict["rows"] = len(main_file.index)
+
+            # get adjusted Trading Log and Backtesting File
+            logger.info("Start getting Final Trading Log and BackTesting File")
+            backtest_files = backtestHSCI.get_backtest_files(
+                trade_file=main_file,
+                funding_source=funding_source,
+                output_hsci_trade_file_path=working_directories["output_files"] + "/" + trade_file_name,
+                output_hsci_backtest_file_path=working_directories["output_files"] + "/" + backtest_file_name,
+                price_cache_path=price_cache_path,
+                fetch_batch_size=simulation_params["fetch_batch_size"],
+                max_in_flight_requests=simulation_params["max_in_flight_requests"],
+                fetch_max_retries=simulation_params["fetch_max_retries"],
+                fetch_backoff_seconds=simulation_params["fetch_backoff_seconds"],
+                output_format=simulation_params["output_format"],
+                event_path=event_path,
+                resume=simulation_params["resume_backtest"],
+                event_params={"begin_business_day": begin_business_day, "end_business_day": end_business_day,
+                              "reuse_ticker_dict": reuse_ticker_dict},
+                live_update=simulation_params["live_update"],
+                run_report=run_report)
+            with run_report.stage(stage_prefix + "get_backtest_files") as stage_dict:
+                trade_df = backtest_files.run()
+                stage_dict["rows"] = len(trade_df.index)
+            return backtest_files, trade_df
+
+        # the configured window always goes to the normal output files and event store
+        backtest_files, trade_df = get_backtest_files(
+            begin_business_day=simulation_params["begin_business_day"],
+            end_business_day=simulation_params["end_business_day"],
+            trade_file_name=simulation_params["trade_file_name"],
+            backtest_file_name=simulation_params["backtest_file_name"],
+            event_path=working_directories["event_files"])
+
+        # sweep and optimization modes backtest the widest window once, into files and an event store of their own,
+        # and evaluate the grid on it
+        parameter_sweep = simulation_params["parameter_sweep"]
+        parameter_optimization = simulation_params["parameter_optimization"]
+        if parameter_sweep or parameter_optimization:
+            grid_begin_business_day = max(simulation_params["sweep_begin_business_day_list"])
+            grid_end_business_day = max(simulation_params["sweep_end_business_day_list"])
+            logger.info("Parameter Grid on widest window [-%sD, %sD]" % (grid_begin_business_day,
+                                                                         grid_end_business_day))
+            grid_backtest_files, grid_trade_df = get_backtest_files(
+                begin_business_day=grid_begin_business_day,
+                end_business_day=grid_end_business_day,
+                trade_file_name=simulation_params["grid_trade_file_name"],
+                backtest_file_name=simulation_params["grid_backtest_file_name"],
+                event_path=working_directories["grid_event_files"],
+                stage_prefix="grid_")
+            with run_report.stage("read_grid_backtest_df") as stage_dict:
+                grid_backtest_df = grid_backtest_files.read_backtest_df()
+                stage_dict["rows"] = len(grid_backtest_df.index)
+
+        # the performance cube reads the backtest returns back from the per effective date files
+        if simulation_params["performance_cube"]:
+            with run_report.stage("read_backtest_df") as stage_dict:
+                backtest_df = backtest_files.read_backtest_df()
+                stage_dict["rows"] = len(backtest_df.index)
+
+        # mean / median / count per date_index of every view of the charts, sliced by performanceVisualization
+        if simulation_params["performance_cube"]:
+            with run_report.stage("performance_cube") as stage_dict:
+                logger.info("Start building Performance Cube")
+                output_cube_file_path = working_directories["output_files"] + "/" + \
+                                        simulation_params["performance_cube_file_name"]
+                cube_df = performanceCube.get_performance_cube(
+                    backtest_df=backtest_df, trade_df=trade_df,
+                    group_by_list=simulation_params["performance_cube_group_by"])
+                performanceCube.write_performance_cube(cube_df=cube_df, cube_file_path=output_cube_file_path)
+                logger.info('''
+                Output Performance Cube to:
+                %s
+                ''' % (output_cube_file_path))
+                stage_dict["rows"] = len(cube_df.index)
+
+        # evaluate every (begin_business_day, end_business_day) of the grid
+        if parameter_sweep:
+            with run_report.stage("parameter_sweep"):
+                logger.info("Start Parameter Sweep")
+                output_sweep_file_path = working_directories["output_files"] + "/" + \
+                                         simulation_params["sweep_file_name"]
+                parameterSweep.get_sweep_file(
+                    backtest_df=grid_backtest_df, trade_df=grid_trade_df,
+                    begin_business_day_list=simulation_params["sweep_begin_business_day_list"],
+                    end_business_day_list=simulation_params["sweep_end_business_day_list"],
+                    output_sweep_file_path=output_sweep_file_path,
+                    group_by=simulation_params["sweep_group_by"]).run()
+
+        # grid search on all cores over the shared return panel, resumes from the existing optimization file
+        if parameter_optimization:
+            with run_report.stage("parameter_optimization"):
+                logger.info("Start Parameter Optimization")
+                output_optimization_file_path = working_directories["output_files"] + "/" + \
+                                                simulation_params["optimization_file_name"]
+                parameterOptimizer.get_optimization_file(
+                    backtest_df=grid_backtest_df, trade_df=grid_trade_df,
+                    begin_business_day_list=simulation_params["sweep_begin_business_day_list"],
+                    end_business_day_list=simulation_params["sweep_end_business_day_list"],
+                    review_type_list=simulation_params["optimization_review_type_list"],
+                    change_list=simulation_params["optimization_change_list"],
+                    ipo_only_list=simulation_params["optimization_ipo_only_list"],
+                    output_optimization_file_path=output_optimization_file_path,
+                    max_workers=simulation_params["optimization_workers"],
+                    chunk_size=simulation_params["optimization_chunk_size"]).run()
+    finally:
+        run_report.write()
 
 if __name__ == "__main__":
     hsciMain()
\ No newline at end of file
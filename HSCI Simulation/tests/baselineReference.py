@@ -0,0 +1,216 @@
+import pandas as pd
+import numpy as np
+import holidays
+
+# computations of the baseline the rewritten paths replaced, kept as the reference the tests compare against:
+# the workbook parse of updateHSCI, the per window pivot of backtestHSCI and the chart aggregations,
+# get_hindsight_backtest_df and get_trade_summary of performanceVisualization.
+# three changes from the baseline are intended and made here as well: trade windows and date_index count
+# trading days of the HK calendar (the baseline counted weekdays), date_index from the effective date rolled
+# forward to a trading day, and prices on holidays of that calendar are left out
+holiday_array = np.array(sorted(holidays.country_holidays("HK", years=range(2000, 2041)).keys()),
+                         dtype="datetime64[D]")
+
+def read_hsci_workbook(file_path):
+    # main sheet and sector sheets as the baseline parsed them inside get_hsci_trade_file
+    hsci_excel = pd.ExcelFile(file_path)
+    main_file = hsci_excel.parse(hsci_excel.sheet_names[0])
+    main_file = main_file.iloc[5:-5, :].copy()
+    main_file.columns = ["effective_date", "number_of_cons", "change", "count", "stock_code",
+                         "listing_place", "stock_name", "stock_name_chinese"]
+    main_file["effective_date"] = main_file["effective_date"].astype("datetime64[ns]")
+
+    sector_df_list = []
+    for sheet_name in hsci_excel.sheet_names:
+        if "-" in sheet_name:
+            this_excel = hsci_excel.parse(sheet_name)
+            this_excel = this_excel.iloc[5:-5, [0, 2, 4]]
+            this_excel.columns = ["effective_date", "change", "stock_code"]
+            this_excel["effective_date"] = this_excel["effective_date"].astype("datetime64[ns]")
+            this_excel["change"] = this_excel["change"].replace({"Add 加入": "Add", "Delete 刪除": "Delete"})
+            this_excel["sector"] = sheet_name.split("-")[-1]
+            sector_df_list.append(this_excel)
+    return main_file, pd.concat(sector_df_list).drop_duplicates()
+
+def get_trade_file(main_file, sector_file, start_year, end_year, begin_business_day, end_business_day):
+    # trade file of get_hsci_trade_file from the parsed sheets, the stages of the baseline row by row
+    main_file = main_file.copy()
+    main_file["year"] = main_file["effective_date"].dt.year
+    main_file = main_file[(main_file["year"] >= start_year) & (main_file["year"] <= end_year)].copy()
+    main_file["change"] = main_file["change"].replace({"Add 加入": "Add", "Delete 刪除": "Delete"})
+    main_file["listing_place"] = "HK"
+    main_file["count"] = [-int(num[1:]) if num[0] == "-" else int(num[1:]) for num in main_file["count"]]
+
+    review_type_file = main_file[["effective_date", "count"]].drop_duplicates()
+    review_type_file["month"] = review_type_file["effective_date"].dt.month
+    review_type_file["review_type"] = ["Regular" if month in [3, 9] and abs(count) >= 3 else "Interim" for
+                                       month, count in np.array(review_type_file[["month", "count"]])]
+    review_type_file = review_type_file.sort_values(["effective_date", "review_type"])
+    review_type_file = review_type_file.groupby(["effective_date"])["review_type"].last().reset_index()
+    main_file = pd.merge(main_file, review_type_file, on=["effective_date"], how="left")
+
+    name_change_file = main_file.groupby(["effective_date", "stock_code"])["stock_name"].count().reset_index()
+    for date, code in np.array(name_change_file[name_change_file["stock_name"] > 1][["effective_date",
+                                                                                       "stock_code"]]):
+        main_file.loc[(main_file["effective_date"] == date) & (main_file["stock_code"] == code),
+                      "review_type"] = "Name Change"
+
+    sector_df = sector_file.copy()
+    sector_df["sector"] = sector_df["sector"].replace({"CD": "Consumer Discretionary", "CONG": "Conglomerates",
+                                                       "CS": "Consumer Staples", "ENG": "Energy",
+                                                       "FIN": "Financials", "H": "Healthcare", "IND": "Industrials",
+                                                       "IT": "Information Technology", "MAT": "Materials",
+                                                       "PROP": "Properties & Construction",
+                                                       "TEL": "Telecommunications", "UTI": "Utilities"})
+    main_file = pd.merge(main_file, sector_df, on=["effective_date", "change", "stock_code"], how="left")
+    main_file["sector"] = main_file["sector"].fillna("Unknown")
+
+    # the baseline shifted by weekdays and then rolled off holidays, the windows now count HK trading days,
+    # a holiday counting as the next trading day as BDay counts a weekend
+    effective_date_array = main_file["effective_date"].values.astype("datetime64[D]")
+    main_file["trade_start_date"] = pd.DatetimeIndex(np.busday_offset(
+        effective_date_array, -begin_business_day, roll="forward", holidays=holiday_array))
+    main_file["trade_end_date"] = pd.DatetimeIndex(np.busday_offset(
+        effective_date_array, end_business_day, roll="backward" if end_business_day > 0 else "forward",
+        holidays=holiday_array))
+    main_file["bbg_ticker"] = main_file["stock_code"].astype(str) + " " + main_file["listing_place"] + " Equity"
+    return main_file
+
+def get_backtest_df(trade_df, price_data, funding_source):
+    # backtest rows of the trades of one effective date from its blp.bdh frame, one pivot per trade window
+    price_df = price_data.xs("last_price", axis=1, level=1)
+    price_df.index = pd.DatetimeIndex(price_df.index)
+    price_df = price_df[np.is_busday(price_df.index.values.astype("datetime64[D]"), holidays=holiday_array)]
+
+    backtest_df_list = []
+    for (trade_start_date, trade_end_date), this_return_df in trade_df[trade_df["halt_flag"] == False].groupby(
+            ["trade_start_date", "trade_end_date"]):
+        this_ticker_list = list(this_return_df["bbg_ticker"].drop_duplicates())
+        this_pivot_return_df = price_df[(price_df.index >= trade_start_date) & (price_df.index <= trade_end_date)]
+        this_pivot_return_df = this_pivot_return_df[this_ticker_list + [funding_source]].dropna(how="all")
+
+        # calculate return [stock, funding, long_short]
+        this_pivot_return_df = this_pivot_return_df.pct_change().fillna(0)
+        this_daily_df = this_pivot_return_df.stack().reset_index()
+        this_daily_df.columns = ["date", "bbg_ticker", "daily_stock_return"]
+        this_pivot_return_df = (1 + this_pivot_return_df).cumprod() - 1
+        this_cumulative_df = this_pivot_return_df.stack().reset_index()
+        this_cumulative_df.columns = ["date", "bbg_ticker", "stock_return"]
+        this_stock_df = pd.merge(this_daily_df, this_cumulative_df, on=["date", "bbg_ticker"])
+        this_fund_df = this_stock_df[this_stock_df["bbg_ticker"] == funding_source].drop(columns=["bbg_ticker"])
+        this_fund_df = this_fund_df.rename(columns={"daily_stock_return": "daily_fund_return",
+                                                    "stock_return": "fund_return"})
+
+        this_backtest_df = this_return_df[["trade_id", "bbg_ticker", "effective_date"]].copy()
+        this_backtest_df = pd.merge(this_backtest_df, this_stock_df, on=["bbg_ticker"], how="left")
+        this_backtest_df = pd.merge(this_backtest_df, this_fund_df, on=["date"], how="left")
+        this_backtest_df[["stock_return", "fund_return", "daily_fund_return", "daily_stock_return"]] *= 100
+        this_backtest_df["long_short_return"] = this_backtest_df["stock_return"] - this_backtest_df["fund_return"]
+        this_backtest_df["date_index"] = np.busday_count(
+            np.busday_offset(this_backtest_df["effective_date"].values.astype("datetime64[D]"), 0, roll="forward",
+                             holidays=holiday_array),
+            this_backtest_df["date"].values.astype("datetime64[D]"), holidays=holiday_array)
+        backtest_df_list.append(this_backtest_df)
+
+    if backtest_df_list == []:
+        return pd.DataFrame()
+    backtest_df = pd.concat(backtest_df_list).sort_values(["trade_id", "date_index"])
+    return add_drawdown(backtest_df)
+
+def add_drawdown(backtest_df):
+    backtest_df = backtest_df.copy()
+    backtest_df["roll_abs_drawdown"] = backtest_df["stock_return"] - \
+        backtest_df.groupby(["trade_id"])["stock_return"].cummax()
+    backtest_df["roll_ls_drawdown"] = backtest_df["long_short_return"] - \
+        backtest_df.groupby(["trade_id"])["long_short_return"].cummax()
+    return backtest_df
+
+def get_selection_id_list(trade_df, review_type, change, ipo_only=False):
+    trade_flag = (trade_df["review_type"] == review_type) & (trade_df["change"] == change)
+    if ipo_only:
+        trade_flag &= (trade_df["ipo_date"].isnull() == False) & (trade_df["ipo_return"] != 0)
+    return list(trade_df[trade_flag]["trade_id"])
+
+def get_aggregate_performance_df(backtest_df, trade_df, review_type, change, ipo_only=False):
+    # mean returns and trade count per date_index of the aggregate performance chart
+    this_backtest_df = backtest_df[backtest_df["trade_id"].isin(get_selection_id_list(trade_df, review_type, change,
+                                                                                      ipo_only))]
+    return this_backtest_df.groupby(["date_index"]).agg({"long_short_return": "mean", "stock_return": "mean",
+                                                         "fund_return": "mean", "trade_id": "count"})
+
+def get_group_performance_df_dict(backtest_df, trade_df, review_type, change, group_by, ipo_only=False):
+    # mean long short return and trade count per date_index of every group of the group performance chart
+    this_backtest_df = backtest_df[backtest_df["trade_id"].isin(get_selection_id_list(trade_df, review_type, change,
+                                                                                      ipo_only))].copy()
+    effective_date = pd.to_datetime(this_backtest_df["effective_date"])
+    this_backtest_df["year"] = effective_date.dt.year
+    this_backtest_df["month"] = effective_date.dt.month
+    this_backtest_df["year_month"] = this_backtest_df["year"].astype(str) + "-" + this_backtest_df["month"].astype(str)
+    return {group: df.groupby(["date_index"]).agg({"long_short_return": "mean", "trade_id": "count"})
+            for group, df in this_backtest_df.groupby(group_by)}
+
+def get_hindsight_backtest_df(backtest_df, trade_df, review_type, change, begin_business_day, end_business_day,
+                              flip_side=False, ipo_only=False):
+    # returns re-based on the window [-begin_business_day, end_business_day] of one review type and change
+    this_id_list = get_selection_id_list(trade_df, review_type, change, ipo_only)
+    this_backtest_df = backtest_df[(backtest_df["trade_id"].isin(this_id_list)) &
+                                   (backtest_df["date_index"] >= -begin_business_day) &
+                                   (backtest_df["date_index"] <= end_business_day)].copy()
+    this_backtest_df = this_backtest_df[["trade_id", "daily_stock_return", "daily_fund_return", "date_index"]]
+    if this_backtest_df.empty:
+        return this_backtest_df
+
+    return_df_list = []
+    for column, return_column in [("daily_stock_return", "stock_return"), ("daily_fund_return", "fund_return")]:
+        this_pivot_df = pd.pivot_table(this_backtest_df, index="date_index", columns="trade_id", values=column)
+        # assume entering the trade at close on the first day
+        this_pivot_df.iloc[0, :] = 0
+        this_pivot_df = (1 + this_pivot_df.fillna(0) / 100).cumprod() - 1
+        this_return_df = this_pivot_df.stack().reset_index()
+        this_return_df.columns = ["date_index", "trade_id", return_column]
+        return_df_list.append(this_return_df)
+
+    for this_return_df in return_df_list:
+        this_backtest_df = pd.merge(this_backtest_df, this_return_df, on=["trade_id", "date_index"], how="left")
+    this_backtest_df[["stock_return", "fund_return"]] *= 100
+    if flip_side:
+        this_backtest_df["long_short_return"] = this_backtest_df["fund_return"] - this_backtest_df["stock_return"]
+    else:
+        this_backtest_df["long_short_return"] = this_backtest_df["stock_return"] - this_backtest_df["fund_return"]
+    return add_drawdown(this_backtest_df.sort_values(["trade_id", "date_index"]))
+
+def get_trade_summary(backtest_df, trade_df):
+    # return, drawdown, Sharpe, win / loss and hit ratio over the trades of backtest_df, rounded as the baseline
+    this_trade_df = trade_df[trade_df["trade_id"].isin(backtest_df["trade_id"])][["trade_id"]]
+    backtest_df = backtest_df.sort_values(["trade_id", "date_index"])
+    trade_data_df = backtest_df.groupby("trade_id").agg({"long_short_return": "last",
+                                                         "roll_ls_drawdown": "min"}).reset_index()
+    this_trade_df = pd.merge(this_trade_df, trade_data_df, on=["trade_id"], how="left")
+    long_short_return = this_trade_df["long_short_return"]
+    win_return = long_short_return[long_short_return > 0]
+    loss_return = long_short_return[long_short_return <= 0]
+
+    this_pivot_df = pd.pivot_table(backtest_df, index="date_index", columns="trade_id", values="long_short_return")
+    this_pivot_df = this_pivot_df.diff().iloc[1:, :]
+    holding_business_days = abs(this_pivot_df.index[0]) + abs(this_pivot_df.index[-1])
+    this_std_df = this_pivot_df.std().reset_index()
+    this_std_df.columns = ["trade_id", "ls_return_std"]
+    this_trade_df = pd.merge(this_trade_df, this_std_df, on=["trade_id"], how="left")
+
+    mean_return = long_short_return.mean()
+    median_return = long_short_return.median()
+    mean_std = this_trade_df["ls_return_std"].mean()
+    median_std = this_trade_df["ls_return_std"].median()
+    return pd.Series({
+        "mean_return": mean_return,
+        "mean_trade_max_drawdown": this_trade_df["roll_ls_drawdown"].mean(),
+        "mean_sharpe_ratio": ((1 + mean_return / 100) ** (252 / holding_business_days) - 1) /
+                             ((252 ** 0.5) * mean_std / 100),
+        "mean_win_loss_ratio": abs(win_return.mean() / loss_return.mean()),
+        "hit_ratio": len(win_return.index) / len(this_trade_df.index) * 100,
+        "median_return": median_return,
+        "median_max_drawdown": this_trade_df["roll_ls_drawdown"].median(),
+        "median_sharpe_ratio": ((1 + median_return / 100) ** (252 / holding_business_days) - 1) /
+                               ((252 ** 0.5) * median_std / 100),
+        "median_win_loss_ratio": abs(win_return.median() / loss_return.median()),
+        "trade_count": this_trade_df["trade_id"].count()}).round(2)
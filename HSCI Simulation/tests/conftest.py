@@ -0,0 +1,84 @@
+import os
+import sys
+import importlib.util
+import numpy as np
+import pandas as pd
+import pytest
+
+# modules import config and func from the HSCI Simulation directory, as hsciMain does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from func import updateHSCI
+from func import backtestHSCI
+from benchmark import syntheticData
+
+funding_source = "2800 HK Equity"
+
+class gappy_data_source(syntheticData.synthetic_data_source):
+    '''
+    Synthetic data source with last_price missing on some days of some tickers while volume is still there,
+    so prices are padded inside the trade windows as they are with Bloomberg.
+    '''
+    def bdh(self, tickers, flds, start_date, end_date, **kwargs):
+        price_data = super().bdh(tickers, flds, start_date, end_date, **kwargs)
+        if price_data.empty or "last_price" not in flds:
+            return price_data
+        price_data = price_data.copy()
+        day_number = (pd.DatetimeIndex(price_data.index) - pd.Timestamp("2000-01-01")).days
+        for ticker in price_data.columns.get_level_values(0).drop_duplicates():
+            if ticker != funding_source and int(ticker.split(" ")[0]) % 3 == 0:
+                price_data.loc[day_number % 7 == 3, (ticker, "last_price")] = np.nan
+        return price_data
+
+@pytest.fixture
+def data_source():
+    # a short history with many IPOs, delistings and halts, so they fall inside the trade windows
+    return gappy_data_source(history_start="2014-06-02", history_end="2017-06-30", ipo_ratio=0.2, delist_ratio=0.3,
+                             halt_ratio=0.05, seed=0, full_history_tickers=[funding_source])
+
+@pytest.fixture(scope="session")
+def get_trade_file(tmp_path_factory):
+    # cleaned trade file of a synthetic change workbook (2015 - 2016) for one entry / exit window
+    trade_file_dict = {}
+    workbook_path = str(tmp_path_factory.mktemp("workbook") / "hsci_hist_change.xlsx")
+    syntheticData.write_synthetic_change_workbook(file_path=workbook_path, row_num=240, start_year=2015,
+                                                  end_year=2016, seed=0, date_num=6, stock_num=300)
+
+    def get_trade_file(begin_business_day, end_business_day):
+        if (begin_business_day, end_business_day) not in trade_file_dict:
+            trade_file = updateHSCI.get_hsci_trade_file(start_year=2015, end_year=2016,
+                                                        begin_business_day=begin_business_day,
+                                                        end_business_day=end_business_day,
+                                                        download_hsci_file_path=workbook_path,
+                                                        workbook_parse_workers=1).run()
+            trade_file_dict[(begin_business_day, end_business_day)] = backtestHSCI.clean_trade_file(
+                trade_file=trade_file, reuse_ticker_dict={}).run()
+        return trade_file_dict[(begin_business_day, end_business_day)].copy()
+    return get_trade_file
+
+def get_backtest_files(trade_file, output_path, data_source, **kwargs):
+    # trade df and backtest df of one run writing into output_path
+    backtest_files = backtestHSCI.get_backtest_files(
+        trade_file=trade_file, funding_source=funding_source,
+        output_hsci_trade_file_path=str(output_path) + "/hsci_trade_file.csv",
+        output_hsci_backtest_file_path=str(output_path) + "/hsci_backtest_file.csv",
+        data_source=data_source, **kwargs)
+    trade_df = backtest_files.run()
+    return trade_df, backtest_files.read_backtest_df(), backtest_files
+
+@pytest.fixture
+def run_backtest():
+    return get_backtest_files
+
+def get_performance_visualization():
+    # the chart module lives in Output Files next to the notebook, loaded from its path
+    module_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + \
+        "/Output Files/performanceVisualization.py"
+    module_spec = importlib.util.spec_from_file_location("performanceVisualization", module_path)
+    performance_visualization = importlib.util.module_from_spec(module_spec)
+    module_spec.loader.exec_module(performance_visualization)
+    return performance_visualization
+
+@pytest.fixture(scope="session")
+def performance_visualization():
+    return get_performance_visualization()
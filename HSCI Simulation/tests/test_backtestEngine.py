@@ -0,0 +1,67 @@
+import pandas as pd
+import numpy as np
+import baselineReference
+from conftest import funding_source
+from func import backtestEngine
+from func import pricePanel
+
+backtest_columns = ["trade_id", "bbg_ticker", "date", "date_index", "effective_date", "daily_stock_return",
+                    "daily_fund_return", "stock_return", "fund_return", "long_short_return",
+                    "roll_abs_drawdown", "roll_ls_drawdown"]
+
+def get_sorted_df(backtest_df):
+    backtest_df = backtest_df[backtest_columns].copy()
+    backtest_df["date"] = pd.to_datetime(backtest_df["date"])
+    backtest_df["effective_date"] = pd.to_datetime(backtest_df["effective_date"])
+    return backtest_df.sort_values(["trade_id", "date"]).reset_index(drop=True)
+
+def get_baseline_backtest_df(trade_file, trade_df, data_source):
+    # one blp.bdh request per effective date over its window, as the baseline fetched it
+    backtest_df_list = []
+    for (date, start_date, end_date), event_trade_file in trade_file.groupby(
+            ["effective_date", "trade_start_date", "trade_end_date"]):
+        price_data = data_source.bdh(tickers=list(event_trade_file["bbg_ticker"].drop_duplicates()) + [funding_source],
+                                     flds=["last_price"], start_date=start_date.strftime("%Y-%m-%d"),
+                                     end_date=end_date.strftime("%Y-%m-%d"))
+        backtest_df_list.append(baselineReference.get_backtest_df(
+            trade_df=trade_df[trade_df["effective_date"] == date], price_data=price_data,
+            funding_source=funding_source))
+    return pd.concat(backtest_df_list)
+
+def test_backtest_matches_baseline(tmp_path, get_trade_file, data_source, run_backtest):
+    # bulk requests fetched concurrently, all trades computed at once on the price panel with the segment kernels
+    trade_file = get_trade_file(begin_business_day=20, end_business_day=10)
+    trade_df, backtest_df, _ = run_backtest(trade_file=trade_file, output_path=tmp_path, data_source=data_source,
+                                            fetch_batch_size=5, max_in_flight_requests=4, resume=False)
+    baseline_df = get_baseline_backtest_df(trade_file=trade_file, trade_df=trade_df, data_source=data_source)
+
+    # halted, IPO and delisted stocks all inside the windows
+    assert trade_df["halt_flag"].any() and trade_df["ipo_date"].notnull().any() and \
+        trade_df["delist_date"].notnull().any()
+    pd.testing.assert_frame_equal(get_sorted_df(backtest_df), get_sorted_df(baseline_df),
+                                  check_dtype=False, rtol=1e-9, atol=1e-9)
+
+def test_backtest_has_one_row_per_trading_day(tmp_path, get_trade_file, data_source, run_backtest):
+    # the synthetic source prices every weekday, holidays of the HK calendar are left out
+    trade_file = get_trade_file(begin_business_day=20, end_business_day=10)
+    _, backtest_df, _ = run_backtest(trade_file=trade_file, output_path=tmp_path, data_source=data_source,
+                                     resume=False)
+    assert not backtest_df.duplicated(["trade_id", "date_index"]).any()
+    assert np.is_busday(pd.to_datetime(backtest_df["date"]).values.astype("datetime64[D]"),
+                        holidays=baselineReference.holiday_array).all()
+
+def test_one_pass_over_the_whole_run(tmp_path, get_trade_file, data_source, run_backtest):
+    # all trades of the run on one panel from one request, the same rows as the per effective date passes
+    trade_file = get_trade_file(begin_business_day=20, end_business_day=10)
+    trade_df, backtest_df, _ = run_backtest(trade_file=trade_file, output_path=tmp_path, data_source=data_source,
+                                            resume=False)
+    price_data = data_source.bdh(tickers=list(trade_df["bbg_ticker"].drop_duplicates()) + [funding_source],
+                                 flds=["last_price"],
+                                 start_date=trade_df["trade_start_date"].min().strftime("%Y-%m-%d"),
+                                 end_date=trade_df["trade_end_date"].max().strftime("%Y-%m-%d"))
+    price_panel = pricePanel.get_price_panel_from_bdh(price_data=price_data, flds=["last_price"])
+    run_backtest_df = backtestEngine.get_backtest_returns(trade_df=trade_df, price_panel=price_panel,
+                                                          funding_source=funding_source)
+    assert trade_df["effective_date"].nunique() > 1
+    pd.testing.assert_frame_equal(get_sorted_df(run_backtest_df), get_sorted_df(backtest_df),
+                                  check_dtype=False, rtol=1e-9, atol=1e-9)
@@ -0,0 +1,71 @@
+import pandas as pd
+import pytest
+from func import backtestEngine
+from test_backtestEngine import get_sorted_df
+
+def get_stage_dict(backtest_files, name):
+    return [stage_dict for stage_dict in backtest_files.run_report.stage_list if stage_dict["name"] == name][0]
+
+def read_output_files(output_path):
+    trade_df = pd.read_csv(str(output_path) + "/hsci_trade_file.csv")
+    backtest_df = pd.read_csv(str(output_path) + "/hsci_backtest_file.csv")
+    return trade_df.sort_values("trade_id").reset_index(drop=True), get_sorted_df(backtest_df)
+
+def test_resume_matches_full_run(tmp_path, get_trade_file, data_source, run_backtest, monkeypatch):
+    # a run stopped after two effective dates picks up at the third, the output files as of one full run
+    trade_file = get_trade_file(begin_business_day=20, end_business_day=10)
+    run_backtest(trade_file=trade_file, output_path=tmp_path / "full", data_source=data_source, resume=False)
+    event_count = trade_file["effective_date"].nunique()
+
+    get_backtest_returns = backtestEngine.get_backtest_returns
+    call_list = []
+
+    def stop_after_two_events(**kwargs):
+        if len(call_list) == 2:
+            raise KeyboardInterrupt
+        call_list.append(kwargs["trade_df"]["effective_date"].iloc[0])
+        return get_backtest_returns(**kwargs)
+
+    monkeypatch.setattr(backtestEngine, "get_backtest_returns", stop_after_two_events)
+    with pytest.raises(KeyboardInterrupt):
+        run_backtest(trade_file=trade_file, output_path=tmp_path / "resume", data_source=data_source)
+    monkeypatch.setattr(backtestEngine, "get_backtest_returns", get_backtest_returns)
+
+    _, backtest_df, backtest_files = run_backtest(trade_file=trade_file, output_path=tmp_path / "resume",
+                                                  data_source=data_source)
+    assert get_stage_dict(backtest_files, "backtest_events")["events"] == event_count - 2
+    full_trade_df, full_backtest_df = read_output_files(tmp_path / "full")
+    resume_trade_df, resume_backtest_df = read_output_files(tmp_path / "resume")
+    pd.testing.assert_frame_equal(resume_trade_df, full_trade_df)
+    pd.testing.assert_frame_equal(resume_backtest_df, full_backtest_df)
+    pd.testing.assert_frame_equal(get_sorted_df(backtest_df), full_backtest_df, check_dtype=False)
+
+    # a finished run is read back from the event store without a remote call or a recompute
+    _, _, backtest_files = run_backtest(trade_file=trade_file, output_path=tmp_path / "resume",
+                                        data_source=data_source)
+    assert get_stage_dict(backtest_files, "backtest_events")["events"] == 0
+    assert backtest_files.run_report.get_remote_totals()[0] == 0
+    pd.testing.assert_frame_equal(read_output_files(tmp_path / "resume")[1], full_backtest_df)
+
+def test_renumbered_events_match_full_run(tmp_path, get_trade_file, data_source, run_backtest):
+    # a review added before the others moves every trade id, only the new effective date is computed again
+    trade_file = get_trade_file(begin_business_day=20, end_business_day=10)
+    first_date = trade_file["effective_date"].min()
+    old_trade_file = trade_file[trade_file["effective_date"] != first_date].copy()
+    old_trade_file["trade_id"] = range(len(old_trade_file.index))
+    assert (old_trade_file["trade_id"] != trade_file.loc[old_trade_file.index, "trade_id"]).all()
+    run_backtest(trade_file=old_trade_file, output_path=tmp_path / "store", data_source=data_source,
+                 resume=False)
+
+    _, backtest_df, backtest_files = run_backtest(trade_file=trade_file, output_path=tmp_path / "store",
+                                                  data_source=data_source)
+    assert get_stage_dict(backtest_files, "backtest_events")["events"] == 1
+    for date, event_trade_df in trade_file.groupby("effective_date"):
+        assert backtest_files.event_store.get_trade_ids(date) == sorted(event_trade_df["trade_id"])
+
+    run_backtest(trade_file=trade_file, output_path=tmp_path / "full", data_source=data_source, resume=False)
+    full_trade_df, full_backtest_df = read_output_files(tmp_path / "full")
+    store_trade_df, store_backtest_df = read_output_files(tmp_path / "store")
+    pd.testing.assert_frame_equal(store_trade_df, full_trade_df)
+    pd.testing.assert_frame_equal(store_backtest_df, full_backtest_df)
+    pd.testing.assert_frame_equal(get_sorted_df(backtest_df), full_backtest_df, check_dtype=False)
@@ -0,0 +1,40 @@
+import pandas as pd
+from func import tradingCalendar
+from test_backtestEngine import get_sorted_df
+
+def get_trade_file_on(trade_file, today):
+    # trade file as clean_trade_file leaves it on today: started trades, end dates clipped to the last trading day
+    trade_file = trade_file[trade_file["trade_start_date"] < today].copy()
+    trade_file["trade_end_date"] = trade_file["trade_end_date"].where(trade_file["trade_end_date"] < today,
+                                                                      today - pd.Timedelta(days=1))
+    trade_file["trade_end_date"] = tradingCalendar.roll_trading_days(trade_file["trade_end_date"], "backward",
+                                                                     trade_file["listing_place"]).values
+    return trade_file
+
+def test_live_update_matches_full_backtest(tmp_path, get_trade_file, data_source, run_backtest):
+    # one event store extended day after day against a full backtest of every day,
+    # the days run through the windows of every effective date and the HK holidays in them
+    trade_file = get_trade_file(begin_business_day=20, end_business_day=10)
+    effective_dates = pd.DatetimeIndex(trade_file["effective_date"].drop_duplicates())
+    today_list = sorted(set(pd.DatetimeIndex(tradingCalendar.shift_trading_days(
+        effective_dates.repeat(3), business_days=0, listing_places=["HK"] * len(effective_dates) * 3)) +
+        pd.to_timedelta([3, 8, 16] * len(effective_dates), unit="D")))
+
+    live_update_count = 0
+    for today in today_list:
+        this_trade_file = get_trade_file_on(trade_file=trade_file, today=today)
+        live_trade_df, live_backtest_df, backtest_files = run_backtest(
+            trade_file=this_trade_file, output_path=tmp_path / "live", data_source=data_source,
+            event_params={"end_business_day": 10}, live_update=True)
+        full_trade_df, full_backtest_df, _ = run_backtest(
+            trade_file=this_trade_file, output_path=tmp_path / today.strftime("%Y%m%d"), data_source=data_source,
+            event_params={"end_business_day": 10}, resume=False)
+        live_update_count += [stage_dict for stage_dict in backtest_files.run_report.stage_list
+                              if stage_dict["name"] == "live_update"][0]["events"]
+
+        pd.testing.assert_frame_equal(live_trade_df.sort_values("trade_id").reset_index(drop=True),
+                                      full_trade_df.sort_values("trade_id").reset_index(drop=True),
+                                      check_dtype=False)
+        pd.testing.assert_frame_equal(get_sorted_df(live_backtest_df), get_sorted_df(full_backtest_df),
+                                      check_dtype=False, rtol=1e-9, atol=1e-9)
+    assert live_update_count > 0
@@ -0,0 +1,66 @@
+import os
+import pandas as pd
+import pytest
+from func import outputStore
+
+def read_csv_file(file_path, dtypes):
+    # csv output read back as the notebook did, dates parsed by name
+    date_columns = [column for column, dtype in dtypes.items() if str(dtype).startswith("datetime64")]
+    return pd.read_csv(file_path, parse_dates=date_columns)
+
+def get_sorted_df(df, sort_columns, text_columns=()):
+    # text columns compared as text, csv reads digits back as numbers where parquet keeps the strings
+    df = df.sort_values(sort_columns).reset_index(drop=True).sort_index(axis=1)
+    for column in text_columns:
+        df[column] = df[column].where(df[column].isnull(), df[column].astype(str))
+    return df
+
+def test_parquet_matches_csv_output(tmp_path, get_trade_file, data_source, run_backtest, performance_visualization):
+    # one run written in both formats, the typed parquet datasets read back to the same frames as the csv files
+    trade_file = get_trade_file(begin_business_day=20, end_business_day=10)
+    run_backtest(trade_file=trade_file, output_path=tmp_path, data_source=data_source, resume=False,
+                 output_format="both")
+    trade_file_path = str(tmp_path / "hsci_trade_file.csv")
+    backtest_file_path = str(tmp_path / "hsci_backtest_file.csv")
+    assert sorted(os.listdir(outputStore.get_dataset_path(backtest_file_path))) == \
+        sorted("effective_year=%s" % year for year in trade_file["effective_date"].dt.year.unique())
+
+    parquet_trade_df, parquet_backtest_df = performance_visualization.read_parquet_output_files(
+        trade_file_path=trade_file_path, backtest_file_path=backtest_file_path)
+    assert str(parquet_backtest_df["date"].dtype) == "datetime64[ns]"
+    assert str(parquet_trade_df["trade_start_date"].dtype) == "datetime64[ns]"
+    csv_trade_df = read_csv_file(trade_file_path, parquet_trade_df.dtypes)
+    csv_backtest_df = read_csv_file(backtest_file_path, parquet_backtest_df.dtypes)
+    text_columns = parquet_trade_df.columns[parquet_trade_df.dtypes == object]
+    pd.testing.assert_frame_equal(get_sorted_df(parquet_trade_df, ["trade_id"], text_columns),
+                                  get_sorted_df(csv_trade_df, ["trade_id"], text_columns), check_dtype=False)
+    pd.testing.assert_frame_equal(get_sorted_df(parquet_backtest_df, ["trade_id", "date_index"]),
+                                  get_sorted_df(csv_backtest_df, ["trade_id", "date_index"]),
+                                  check_dtype=False, rtol=1e-9, atol=1e-9)
+
+    # trade filters only read the backtest rows of the selected trades, in the columns asked for
+    review_type = csv_trade_df["review_type"].iloc[0]
+    for trade_filters in [[("review_type", "==", review_type)],
+                          [("review_type", "==", review_type), ("effective_year", "==", 2016)]]:
+        filter_trade_df, filter_backtest_df = performance_visualization.read_parquet_output_files(
+            trade_file_path=trade_file_path, backtest_file_path=backtest_file_path, trade_filters=trade_filters,
+            backtest_columns=["trade_id", "date_index", "long_short_return"])
+        this_trade_df = csv_trade_df[csv_trade_df["review_type"] == review_type]
+        if len(trade_filters) > 1:
+            this_trade_df = this_trade_df[this_trade_df["effective_date"].dt.year == 2016]
+        assert sorted(filter_trade_df["trade_id"]) == sorted(this_trade_df["trade_id"])
+        assert list(filter_backtest_df.columns) == ["trade_id", "date_index", "long_short_return"]
+        this_backtest_df = csv_backtest_df[csv_backtest_df["trade_id"].isin(this_trade_df["trade_id"])]
+        pd.testing.assert_frame_equal(get_sorted_df(filter_backtest_df, ["trade_id", "date_index"]),
+                                      get_sorted_df(this_backtest_df[list(filter_backtest_df.columns)],
+                                                    ["trade_id", "date_index"]),
+                                      check_dtype=False, rtol=1e-9, atol=1e-9)
+
+def test_csv_file_kept_on_failed_write(tmp_path):
+    file_path = str(tmp_path / "hsci_backtest_file.csv")
+    pd.DataFrame({"trade_id": [0], "date_index": [1]}).to_csv(file_path, index=False)
+    with pytest.raises(Exception, match="missing"):
+        outputStore.write_csv_file([pd.DataFrame({"trade_id": [1], "date_index": [2]}),
+                                    pd.DataFrame({"trade_id": [2]})], file_path)
+    pd.testing.assert_frame_equal(pd.read_csv(file_path), pd.DataFrame({"trade_id": [0], "date_index": [1]}))
+    assert os.listdir(str(tmp_path)) == ["hsci_backtest_file.csv"]
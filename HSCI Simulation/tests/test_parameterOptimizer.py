@@ -0,0 +1,62 @@
+import os
+import numpy as np
+import baselineReference
+from func import parameterOptimizer
+
+def get_optimization_df(backtest_df, trade_df, output_path, flip_side=False):
+    return parameterOptimizer.get_optimization_file(
+        backtest_df=backtest_df, trade_df=trade_df, begin_business_day_list=[5, 20], end_business_day_list=[3, 10],
+        review_type_list=["Regular", "Interim"], change_list=["Add", "Delete"], ipo_only_list=[False, True],
+        output_optimization_file_path=str(output_path / "hsci_optimization_file.csv"), max_workers=2,
+        chunk_size=5, flip_side=flip_side).run()
+
+def assert_matches_hindsight_summary(optimization_df, backtest_df, trade_df, flip_side):
+    # every grid point against the baseline hindsight window of that point, rounded to 2 decimals there
+    for point in optimization_df.itertuples(index=False):
+        hindsight_backtest_df = baselineReference.get_hindsight_backtest_df(
+            backtest_df=backtest_df, trade_df=trade_df, review_type=point.review_type, change=point.change,
+            begin_business_day=point.begin_business_day, end_business_day=point.end_business_day,
+            flip_side=flip_side, ipo_only=point.ipo_only)
+        if hindsight_backtest_df.empty:
+            assert point.trade_count == 0
+            continue
+        trade_summary = baselineReference.get_trade_summary(hindsight_backtest_df, trade_df)
+        np.testing.assert_allclose(np.array([getattr(point, column) for column in parameterOptimizer.summary_keys],
+                                            dtype="float64"),
+                                   trade_summary[parameterOptimizer.summary_keys].values.astype("float64"), rtol=0,
+                                   atol=0.005 + 1e-9, err_msg=str(point))
+
+def test_optimizer_matches_hindsight_summary(tmp_path, get_trade_file, data_source, run_backtest):
+    trade_file = get_trade_file(begin_business_day=20, end_business_day=10)
+    trade_df, backtest_df, _ = run_backtest(trade_file=trade_file, output_path=tmp_path, data_source=data_source,
+                                            resume=False)
+    optimization_df = get_optimization_df(backtest_df=backtest_df, trade_df=trade_df, output_path=tmp_path)
+    assert len(optimization_df.index) == 2 * 2 * 2 * 2 * 2
+    assert (optimization_df[optimization_df["ipo_only"] == True]["trade_count"] > 0).any()
+    assert_matches_hindsight_summary(optimization_df=optimization_df, backtest_df=backtest_df, trade_df=trade_df,
+                                     flip_side=False)
+
+def test_optimizer_starts_over_on_changed_input(tmp_path, get_trade_file, data_source, run_backtest):
+    trade_file = get_trade_file(begin_business_day=20, end_business_day=10)
+    trade_df, backtest_df, _ = run_backtest(trade_file=trade_file, output_path=tmp_path, data_source=data_source,
+                                            resume=False)
+    optimization_file_path = str(tmp_path / "hsci_optimization_file.csv")
+    get_optimization_df(backtest_df=backtest_df, trade_df=trade_df, output_path=tmp_path)
+
+    # same input resumes from the finished grid points without touching the file
+    modified_time = os.path.getmtime(optimization_file_path)
+    get_optimization_df(backtest_df=backtest_df, trade_df=trade_df, output_path=tmp_path)
+    assert os.path.getmtime(optimization_file_path) == modified_time
+
+    # another side or another backtest is searched again
+    optimization_df = get_optimization_df(backtest_df=backtest_df, trade_df=trade_df, output_path=tmp_path,
+                                          flip_side=True)
+    assert len(optimization_df.index) == 2 * 2 * 2 * 2 * 2
+    assert_matches_hindsight_summary(optimization_df=optimization_df, backtest_df=backtest_df, trade_df=trade_df,
+                                     flip_side=True)
+    this_backtest_df = backtest_df[backtest_df["trade_id"] % 2 == 0]
+    optimization_df = get_optimization_df(backtest_df=this_backtest_df, trade_df=trade_df, output_path=tmp_path,
+                                          flip_side=True)
+    assert len(optimization_df.index) == 2 * 2 * 2 * 2 * 2
+    assert_matches_hindsight_summary(optimization_df=optimization_df, backtest_df=this_backtest_df,
+                                     trade_df=trade_df, flip_side=True)
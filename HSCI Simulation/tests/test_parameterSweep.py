@@ -0,0 +1,36 @@
+import numpy as np
+import baselineReference
+from func import parameterSweep
+
+def test_sweep_matches_hindsight_summary(tmp_path, get_trade_file, data_source, run_backtest):
+    # every grid point of one run over the widest window against the baseline hindsight window of that point
+    begin_business_day_list, end_business_day_list = [5, 10, 20], [3, 5, 10]
+    trade_file = get_trade_file(begin_business_day=max(begin_business_day_list),
+                                end_business_day=max(end_business_day_list))
+    trade_df, backtest_df, _ = run_backtest(trade_file=trade_file, output_path=tmp_path, data_source=data_source,
+                                            resume=False)
+    sweep_df = parameterSweep.get_sweep_file(backtest_df=backtest_df, trade_df=trade_df,
+                                             begin_business_day_list=begin_business_day_list,
+                                             end_business_day_list=end_business_day_list,
+                                             output_sweep_file_path=str(tmp_path / "hsci_sweep_file.csv"),
+                                             group_by=["review_type", "change"]).run()
+
+    group_list = list(trade_df[trade_df["halt_flag"] == False][["review_type", "change"]].drop_duplicates()
+                      .itertuples(index=False))
+    assert len(sweep_df.index) == len(begin_business_day_list) * len(end_business_day_list) * len(group_list)
+    for begin_business_day in begin_business_day_list:
+        for end_business_day in end_business_day_list:
+            for review_type, change in group_list:
+                hindsight_backtest_df = baselineReference.get_hindsight_backtest_df(
+                    backtest_df=backtest_df, trade_df=trade_df, review_type=review_type, change=change,
+                    begin_business_day=begin_business_day, end_business_day=end_business_day)
+                trade_summary = baselineReference.get_trade_summary(hindsight_backtest_df, trade_df)
+                sweep_summary = sweep_df[(sweep_df["begin_business_day"] == begin_business_day) &
+                                         (sweep_df["end_business_day"] == end_business_day) &
+                                         (sweep_df["review_type"] == review_type) &
+                                         (sweep_df["change"] == change)].iloc[0][trade_summary.index]
+                # the baseline summary is rounded to 2 decimals
+                np.testing.assert_allclose(sweep_summary.values.astype("float64"),
+                                           trade_summary.values.astype("float64"), rtol=0, atol=0.005 + 1e-9,
+                                           err_msg="%s %s %s %s" % (begin_business_day, end_business_day,
+                                                                    review_type, change))
@@ -0,0 +1,44 @@
+import numpy as np
+import baselineReference
+from func import performanceCube
+
+def test_cube_matches_baseline_charts(tmp_path, get_trade_file, data_source, run_backtest):
+    # every view of the aggregate and group charts is a slice of the cube
+    trade_file = get_trade_file(begin_business_day=20, end_business_day=10)
+    trade_df, backtest_df, _ = run_backtest(trade_file=trade_file, output_path=tmp_path, data_source=data_source,
+                                            resume=False)
+    cube_df = performanceCube.get_performance_cube(backtest_df=backtest_df, trade_df=trade_df)
+    cube_file_path = str(tmp_path / "hsci_performance_cube.pkl")
+    performanceCube.write_performance_cube(cube_df=cube_df, cube_file_path=cube_file_path)
+    cube_df = performanceCube.read_performance_cube(cube_file_path)
+
+    view_num = 0
+    for (review_type, change), _ in trade_df.groupby(["review_type", "change"]):
+        for ipo_only in [False, True]:
+            aggregate_df = baselineReference.get_aggregate_performance_df(
+                backtest_df=backtest_df, trade_df=trade_df, review_type=review_type, change=change, ipo_only=ipo_only)
+            if aggregate_df.empty:
+                continue
+            cube_slice = performanceCube.get_cube_slice(cube_df=cube_df, review_type=review_type, change=change,
+                                                        ipo_only=ipo_only)
+            for column in ["long_short_return", "stock_return", "fund_return"]:
+                np.testing.assert_allclose(cube_slice[column + "_mean"].values, aggregate_df[column].values,
+                                           rtol=1e-9, atol=1e-9)
+            assert list(cube_slice.index) == list(aggregate_df.index)
+            assert list(cube_slice["count"]) == list(aggregate_df["trade_id"])
+
+            for group_by in ["year", "month", "year_month"]:
+                group_df_dict = baselineReference.get_group_performance_df_dict(
+                    backtest_df=backtest_df, trade_df=trade_df, review_type=review_type, change=change,
+                    group_by=group_by, ipo_only=ipo_only)
+                cube_slice = performanceCube.get_cube_slice(cube_df=cube_df, review_type=review_type, change=change,
+                                                            ipo_only=ipo_only, group_by=group_by)
+                assert sorted(cube_slice.index.get_level_values("group").unique()) == \
+                    sorted(str(group) for group in group_df_dict)
+                for group, group_df in group_df_dict.items():
+                    this_cube_slice = cube_slice.xs(str(group), level="group")
+                    np.testing.assert_allclose(this_cube_slice["long_short_return_mean"].values,
+                                               group_df["long_short_return"].values, rtol=1e-9, atol=1e-9)
+                    assert list(this_cube_slice["count"]) == list(group_df["trade_id"])
+            view_num += 1
+    assert view_num > 4
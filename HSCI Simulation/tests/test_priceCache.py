@@ -0,0 +1,86 @@
+import threading
+import time
+import pandas as pd
+from func import priceCache
+
+class counting_data_source():
+    # requests of every remote call, slow enough for concurrent calls to overlap
+    def __init__(self, data_source, latency_seconds=0):
+        self.data_source = data_source
+        self.latency_seconds = latency_seconds
+        self.request_list = []
+        self.lock = threading.Lock()
+
+    def bdh(self, tickers, flds, start_date, end_date):
+        with self.lock:
+            self.request_list.append((tuple(tickers), tuple(flds), start_date, end_date))
+        time.sleep(self.latency_seconds)
+        return self.data_source.bdh(tickers=tickers, flds=flds, start_date=start_date, end_date=end_date)
+
+def assert_same_price_data(price_data, expected_price_data):
+    pd.testing.assert_frame_equal(price_data.sort_index(axis=1), expected_price_data.sort_index(axis=1),
+                                  check_freq=False, check_column_type=False, check_dtype=False)
+
+def test_missing_date_ranges():
+    covered_ranges = [["2015-01-01", "2015-01-31"], ["2015-02-01", "2015-02-10"], ["2015-03-01", "2015-03-31"]]
+    assert priceCache.merge_date_ranges(covered_ranges) == [
+        [pd.Timestamp("2015-01-01"), pd.Timestamp("2015-02-10")],
+        [pd.Timestamp("2015-03-01"), pd.Timestamp("2015-03-31")]]
+    assert priceCache.get_missing_date_ranges(covered_ranges, "2014-12-15", "2015-04-10") == [
+        [pd.Timestamp("2014-12-15"), pd.Timestamp("2014-12-31")],
+        [pd.Timestamp("2015-02-11"), pd.Timestamp("2015-02-28")],
+        [pd.Timestamp("2015-04-01"), pd.Timestamp("2015-04-10")]]
+    assert priceCache.get_missing_date_ranges(covered_ranges, "2015-01-05", "2015-02-10") == []
+    assert priceCache.get_missing_date_ranges([], "2015-01-05", "2015-01-09") == [
+        [pd.Timestamp("2015-01-05"), pd.Timestamp("2015-01-09")]]
+
+def test_cache_fetches_only_gaps(tmp_path, data_source):
+    tickers = ["1 HK Equity", "3 HK Equity", "2800 HK Equity"]
+    flds = ["last_price", "volume"]
+    remote_data_source = counting_data_source(data_source)
+    cache = priceCache.price_cache(cache_path=str(tmp_path), data_source=remote_data_source)
+
+    for start_date, end_date in [("2015-03-02", "2015-03-31"), ("2015-03-16", "2015-04-30"),
+                                 ("2015-02-02", "2015-05-29")]:
+        assert_same_price_data(cache.bdh(tickers=tickers, flds=flds, start_date=start_date, end_date=end_date),
+                               data_source.bdh(tickers=tickers, flds=flds, start_date=start_date, end_date=end_date))
+    assert [request[2:] for request in remote_data_source.request_list] == [
+        ("2015-03-02", "2015-03-31"), ("2015-04-01", "2015-04-30"),
+        ("2015-02-02", "2015-03-01"), ("2015-05-01", "2015-05-29")]
+
+    # a new field is a gap of its own, a cache opened again from disk holds everything fetched before
+    cache.bdh(tickers=tickers, flds=["beta_adj_overridable"], start_date="2015-03-02", end_date="2015-03-31")
+    assert remote_data_source.request_list[-1] == (tuple(tickers), ("beta_adj_overridable",),
+                                                   "2015-03-02", "2015-03-31")
+    request_count = len(remote_data_source.request_list)
+    cache = priceCache.price_cache(cache_path=str(tmp_path), data_source=remote_data_source)
+    assert_same_price_data(cache.bdh(tickers=tickers, flds=flds, start_date="2015-02-16", end_date="2015-05-15"),
+                           data_source.bdh(tickers=tickers, flds=flds, start_date="2015-02-16", end_date="2015-05-15"))
+    assert len(remote_data_source.request_list) == request_count
+
+def test_overlapping_calls_fetch_once(tmp_path, data_source):
+    # calls running at the same time wait for gaps already in flight instead of requesting them again
+    remote_data_source = counting_data_source(data_source, latency_seconds=0.2)
+    cache = priceCache.price_cache(cache_path=str(tmp_path), data_source=remote_data_source)
+    tickers = ["1 HK Equity", "2800 HK Equity"]
+    result_dict = {}
+
+    def get_price_data(call_num, start_date, end_date):
+        result_dict[call_num] = cache.bdh(tickers=tickers, flds=["last_price"], start_date=start_date,
+                                          end_date=end_date)
+
+    thread_list = [threading.Thread(target=get_price_data, args=(call_num, "2015-01-02", "2015-06-30"))
+                   for call_num in range(4)]
+    thread_list.append(threading.Thread(target=get_price_data, args=(4, "2015-03-02", "2015-09-30")))
+    for thread in thread_list:
+        thread.start()
+    for thread in thread_list:
+        thread.join()
+
+    request_range_list = sorted(request[2:] for request in remote_data_source.request_list)
+    assert request_range_list in [[("2015-01-02", "2015-06-30"), ("2015-07-01", "2015-09-30")],
+                                  [("2015-01-02", "2015-03-01"), ("2015-03-02", "2015-09-30")]]
+    for call_num, (start_date, end_date) in enumerate([("2015-01-02", "2015-06-30")] * 4 +
+                                                      [("2015-03-02", "2015-09-30")]):
+        assert_same_price_data(result_dict[call_num], data_source.bdh(tickers=tickers, flds=["last_price"],
+                                                                      start_date=start_date, end_date=end_date))
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import baselineReference
+from func import returnIndex
+
+hindsight_columns = ["trade_id", "date_index", "stock_return", "fund_return", "long_short_return",
+                     "roll_abs_drawdown", "roll_ls_drawdown"]
+
+def get_sorted_df(backtest_df):
+    return backtest_df[hindsight_columns].sort_values(["trade_id", "date_index"]).reset_index(drop=True)
+
+def test_window_returns_match_compounded_rows(tmp_path, get_trade_file, data_source, run_backtest):
+    # any (entry, exit) per trade against compounding the daily returns of the rows in between
+    trade_file = get_trade_file(begin_business_day=20, end_business_day=10)
+    _, backtest_df, _ = run_backtest(trade_file=trade_file, output_path=tmp_path, data_source=data_source,
+                                     resume=False)
+    return_index = returnIndex.return_index(backtest_df=backtest_df)
+    trade_ids = backtest_df["trade_id"].drop_duplicates().values
+    random_state = np.random.RandomState(0)
+    entry_date_index = random_state.randint(-25, 5, len(trade_ids))
+    exit_date_index = entry_date_index + random_state.randint(0, 20, len(trade_ids))
+    window_df = return_index.get_window_returns(trade_ids=trade_ids, entry_date_index=entry_date_index,
+                                                exit_date_index=exit_date_index, flip_side=True)
+
+    for trade_id, entry, exit_, (_, window) in zip(trade_ids, entry_date_index, exit_date_index, window_df.iterrows()):
+        this_df = backtest_df[(backtest_df["trade_id"] == trade_id) & (backtest_df["date_index"] > entry) &
+                              (backtest_df["date_index"] <= exit_)]
+        stock_return = ((1 + this_df["daily_stock_return"] / 100).prod() - 1) * 100
+        fund_return = ((1 + this_df["daily_fund_return"] / 100).prod() - 1) * 100
+        np.testing.assert_allclose([window["stock_return"], window["fund_return"], window["long_short_return"]],
+                                   [stock_return, fund_return, fund_return - stock_return], rtol=1e-9, atol=1e-9)
+
+def test_hindsight_matches_baseline(tmp_path, get_trade_file, data_source, run_backtest, performance_visualization):
+    # hindsight windows from the return index of the selection and of the whole backtest against the pivots
+    trade_file = get_trade_file(begin_business_day=20, end_business_day=10)
+    trade_df, backtest_df, _ = run_backtest(trade_file=trade_file, output_path=tmp_path, data_source=data_source,
+                                            resume=False)
+    return_index = performance_visualization.get_return_index(backtest_df)
+    window_num = 0
+    for (review_type, change), _ in trade_df.groupby(["review_type", "change"]):
+        for begin_business_day, end_business_day, flip_side, ipo_only in [(20, 10, False, False), (5, 3, True, False),
+                                                                           (10, 0, False, True), (0, 5, True, True)]:
+            baseline_df = baselineReference.get_hindsight_backtest_df(
+                backtest_df=backtest_df, trade_df=trade_df, review_type=review_type, change=change,
+                begin_business_day=begin_business_day, end_business_day=end_business_day, flip_side=flip_side,
+                ipo_only=ipo_only)
+            if baseline_df.empty:
+                continue
+            for this_return_index in [None, return_index]:
+                hindsight_df = performance_visualization.get_hindsight_backtest_df(
+                    backtest_df=backtest_df, trade_df=trade_df, review_type=review_type, change=change,
+                    begin_business_day=begin_business_day, end_business_day=end_business_day, flip_side=flip_side,
+                    ipo_only=ipo_only, return_index=this_return_index)
+                pd.testing.assert_frame_equal(get_sorted_df(hindsight_df), get_sorted_df(baseline_df),
+                                              check_dtype=False, rtol=1e-9, atol=1e-9)
+            window_num += 1
+    assert window_num > 8
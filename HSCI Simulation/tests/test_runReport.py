@@ -0,0 +1,18 @@
+import threading
+from func import runReport
+
+def test_remote_calls_from_threads():
+    # every call counted once while fetch threads add to the stage at the same time
+    report = runReport.run_report()
+    with report.stage("fetch") as stage_dict:
+        def add_remote_calls():
+            for _ in range(20000):
+                report.add_remote_call(remote_bytes=3)
+
+        thread_list = [threading.Thread(target=add_remote_calls) for _ in range(8)]
+        for thread in thread_list:
+            thread.start()
+        for thread in thread_list:
+            thread.join()
+    assert (stage_dict["remote_calls"], stage_dict["remote_bytes"]) == (160000, 480000)
+    assert (report.get_report()["remote_calls"], report.get_report()["remote_bytes"]) == (160000, 480000)
@@ -0,0 +1,84 @@
+import pandas as pd
+import baselineReference
+
+def test_selection_matches_baseline(tmp_path, get_trade_file, data_source, run_backtest, performance_visualization):
+    # selections taken from the index against the baseline masks, the charts the same with and without it
+    trade_file = get_trade_file(begin_business_day=20, end_business_day=10)
+    trade_df, backtest_df, _ = run_backtest(trade_file=trade_file, output_path=tmp_path, data_source=data_source,
+                                            resume=False)
+    selection_index = performance_visualization.get_selection_index(backtest_df=backtest_df, trade_df=trade_df)
+
+    selection_num = 0
+    for (review_type, change), _ in trade_df.groupby(["review_type", "change"]):
+        for ipo_only in [False, True]:
+            selection_id_list = baselineReference.get_selection_id_list(trade_df=trade_df, review_type=review_type,
+                                                                        change=change, ipo_only=ipo_only)
+            assert list(selection_index.get_trade_ids(review_type, change, ipo_only)) == sorted(selection_id_list)
+            pd.testing.assert_frame_equal(selection_index.get_backtest_df(review_type, change, ipo_only),
+                                          backtest_df[backtest_df["trade_id"].isin(selection_id_list)])
+            if not selection_id_list:
+                continue
+
+            pd.testing.assert_frame_equal(
+                performance_visualization.get_aggregate_performance_df(
+                    backtest_df=backtest_df, trade_df=trade_df, review_type=review_type, change=change,
+                    ipo_only=ipo_only, selection_index=selection_index),
+                baselineReference.get_aggregate_performance_df(
+                    backtest_df=backtest_df, trade_df=trade_df, review_type=review_type, change=change,
+                    ipo_only=ipo_only).reset_index(), check_dtype=False)
+            df_list, group_list = performance_visualization.get_group_performance_df(
+                backtest_df=backtest_df, trade_df=trade_df, review_type=review_type, change=change,
+                group_by="year", ipo_only=ipo_only, selection_index=selection_index)
+            group_df_dict = baselineReference.get_group_performance_df_dict(
+                backtest_df=backtest_df, trade_df=trade_df, review_type=review_type, change=change,
+                group_by="year", ipo_only=ipo_only)
+            assert sorted(group_list) == sorted(group_df_dict)
+            for group, group_df in zip(group_list, df_list):
+                pd.testing.assert_frame_equal(
+                    group_df.groupby(["date_index"]).agg({"long_short_return": "mean", "trade_id": "count"}),
+                    group_df_dict[group], check_dtype=False)
+
+            for begin_business_day, end_business_day, flip_side in [(20, 10, False), (5, 3, True)]:
+                baseline_df = baselineReference.get_hindsight_backtest_df(
+                    backtest_df=backtest_df, trade_df=trade_df, review_type=review_type, change=change,
+                    begin_business_day=begin_business_day, end_business_day=end_business_day, flip_side=flip_side,
+                    ipo_only=ipo_only)
+                if baseline_df.empty:
+                    continue
+                pd.testing.assert_frame_equal(
+                    performance_visualization.get_hindsight_trade_summary(
+                        selection_index=selection_index, review_type=review_type, change=change,
+                        begin_business_day=begin_business_day, end_business_day=end_business_day,
+                        flip_side=flip_side, ipo_only=ipo_only),
+                    performance_visualization.get_trade_summary(baseline_df, trade_df), check_dtype=False)
+            selection_num += 1
+    assert selection_num > 4
+
+def test_results_are_memoized(tmp_path, get_trade_file, data_source, run_backtest, performance_visualization):
+    trade_file = get_trade_file(begin_business_day=20, end_business_day=10)
+    trade_df, backtest_df, _ = run_backtest(trade_file=trade_file, output_path=tmp_path, data_source=data_source,
+                                            resume=False)
+    selection_index = performance_visualization.get_selection_index(backtest_df=backtest_df, trade_df=trade_df,
+                                                                    cache_size=2)
+    review_type, change = trade_df[["review_type", "change"]].iloc[0]
+
+    def get_hindsight_df(begin_business_day):
+        return performance_visualization.get_hindsight_backtest_df(
+            backtest_df=backtest_df, trade_df=trade_df, review_type=review_type, change=change,
+            begin_business_day=begin_business_day, end_business_day=10, selection_index=selection_index)
+
+    hindsight_df = get_hindsight_df(20)
+    assert (selection_index.hit_count, selection_index.miss_count) == (0, 1)
+
+    # a hit hands out a copy, changing it leaves the memo as it was
+    hindsight_df["stock_return"] = 0
+    pd.testing.assert_frame_equal(get_hindsight_df(20), get_hindsight_df(20))
+    assert (selection_index.hit_count, selection_index.miss_count) == (2, 1)
+    assert (get_hindsight_df(20)["stock_return"] != 0).any()
+
+    # beyond cache_size the least recently used window is computed again
+    get_hindsight_df(5)
+    get_hindsight_df(10)
+    assert selection_index.miss_count == 3
+    get_hindsight_df(20)
+    assert (selection_index.hit_count, selection_index.miss_count) == (3, 4)
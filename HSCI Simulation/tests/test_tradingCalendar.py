@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import holidays
+import pytest
+from pandas.tseries.offsets import BDay
+from func import tradingCalendar
+
+date_list = list(pd.date_range("2014-12-01", "2017-01-31", freq="D"))
+
+def get_holiday_set(listing_place):
+    return set(pd.Timestamp(day) for day in holidays.country_holidays(listing_place, years=range(2014, 2018)))
+
+def shift_by_bday(day, business_days, holiday_set):
+    # BDay steps skipping holidays one by one, as adjust_holiday of the baseline rolled a single date
+    if business_days == 0:
+        return roll_by_bday(day, 1, holiday_set)
+    step = 1 if business_days > 0 else -1
+    for _ in range(abs(business_days)):
+        day = day + BDay(step)
+        while day in holiday_set:
+            day = day + BDay(step)
+    return day
+
+def roll_by_bday(day, step, holiday_set):
+    while day.weekday() >= 5 or day in holiday_set:
+        day = day + pd.Timedelta(days=step)
+    return day
+
+@pytest.mark.parametrize("listing_place", ["HK", "US"])
+def test_calendar_matches_bday_loops(listing_place):
+    holiday_set = get_holiday_set(listing_place)
+    listing_places = [listing_place] * len(date_list)
+    expected_trading_day = [day.weekday() < 5 and day not in holiday_set for day in date_list]
+    assert list(tradingCalendar.is_trading_day(dates=np.array(date_list, dtype="datetime64[ns]"),
+                                               listing_places=listing_places)) == expected_trading_day
+
+    for direction, step in [("forward", 1), ("backward", -1)]:
+        assert list(tradingCalendar.roll_trading_days(dates=date_list, direction=direction,
+                                                      listing_places=listing_places)) == \
+            [roll_by_bday(day, step, holiday_set) for day in date_list]
+    for business_days in [-60, -20, -1, 0, 1, 10, 30]:
+        assert list(tradingCalendar.shift_trading_days(dates=date_list, business_days=business_days,
+                                                       listing_places=listing_places)) == \
+            [shift_by_bday(day, business_days, holiday_set) for day in date_list]
+
+def test_date_index_counts_trading_days():
+    # trading days from the effective date rolled forward, the same count as np.busday_count on the HK holidays
+    holiday_array = np.array(sorted(get_holiday_set("HK")), dtype="datetime64[D]")
+    effective_date_array = np.array(date_list[::7], dtype="datetime64[D]")
+    dates = np.busday_offset(effective_date_array, np.arange(len(effective_date_array)) % 50 - 25, roll="forward",
+                             holidays=holiday_array)
+    dates = dates[(dates >= np.datetime64("2014-12-01")) & (dates <= np.datetime64("2017-01-31"))]
+    effective_date_array = effective_date_array[:len(dates)]
+    expected_date_index = np.busday_count(np.busday_offset(effective_date_array, 0, roll="forward",
+                                                           holidays=holiday_array), dates, holidays=holiday_array)
+    date_index = tradingCalendar.get_date_index(dates=dates.astype("datetime64[ns]"),
+                                                effective_dates=effective_date_array.astype("datetime64[ns]"),
+                                                listing_places=["HK"] * len(dates))
+    assert list(date_index) == list(expected_date_index)
+
+    # a holiday would share the date_index of the next trading day
+    with pytest.raises(Exception, match="non-trading days"):
+        tradingCalendar.get_date_index(dates=np.array(["2016-02-08"], dtype="datetime64[ns]"),
+                                       effective_dates=np.array(["2016-02-01"], dtype="datetime64[ns]"),
+                                       listing_places=["HK"])
@@ -0,0 +1,97 @@
+import os
+import json
+import pandas as pd
+import baselineReference
+from func import updateHSCI
+from benchmark import benchRefresh
+from benchmark import syntheticData
+
+def read_file(file_path):
+    with open(file_path, "rb") as f:
+        return f.read()
+
+def test_refresh_with_conditional_get(tmp_path):
+    # against the local stand in of the HSI site, no browser is started once the url of the file is known
+    content = benchRefresh.get_workbook_content(str(tmp_path), row_num=50, seed=0)
+    new_content = benchRefresh.get_workbook_content(str(tmp_path), row_num=50, seed=1)
+    download_hsci_file_path = str(tmp_path / "hsci_hist_change.xlsx")
+    previous_file_path = updateHSCI.get_previous_file_path(download_hsci_file_path)
+
+    with benchRefresh.hsi_stand_in(content=content) as stand_in:
+        assert updateHSCI.refresh_hsci_file(download_path=str(tmp_path),
+                                            download_hsci_file_path=download_hsci_file_path,
+                                            chrome_driver_path=None, file_url=stand_in.file_url)
+        assert read_file(download_hsci_file_path) == content and not os.path.exists(previous_file_path)
+
+        # unchanged file is one 304 answer without a body, at the url kept from the last download
+        stand_in.request_count, stand_in.body_bytes = 0, 0
+        assert not updateHSCI.refresh_hsci_file(download_path=str(tmp_path),
+                                                download_hsci_file_path=download_hsci_file_path,
+                                                chrome_driver_path=None)
+        assert (stand_in.request_count, stand_in.body_bytes) == (1, 0)
+
+        # a new version replaces the file and keeps the one before
+        stand_in.set_content(new_content)
+        assert updateHSCI.refresh_hsci_file(download_path=str(tmp_path),
+                                            download_hsci_file_path=download_hsci_file_path,
+                                            chrome_driver_path=None)
+        assert read_file(download_hsci_file_path) == new_content and read_file(previous_file_path) == content
+
+        # the same content from a server without validators is found unchanged by its hash
+        stand_in.validators = False
+        assert not updateHSCI.refresh_hsci_file(download_path=str(tmp_path),
+                                                download_hsci_file_path=download_hsci_file_path,
+                                                chrome_driver_path=None)
+        assert read_file(download_hsci_file_path) == new_content and read_file(previous_file_path) == content
+
+class logged_driver():
+    # driver whose View Now target has no link, so the url comes from the performance log
+    def __init__(self, log_entry_list):
+        self.log_entry_list = log_entry_list
+
+    def execute_script(self, script, *args):
+        return None
+
+    def get_log(self, log_type):
+        return self.log_entry_list
+
+def get_log_entry(method, params):
+    return {"message": json.dumps({"message": {"method": method, "params": params}})}
+
+def test_download_url_from_performance_log():
+    log_entry_list = [get_log_entry("Network.requestWillBeSent", {"request": {"url": "https://www.hsi.com.hk/"}}),
+                      get_log_entry("Page.downloadWillBegin", {"url": "https://www.hsi.com.hk/static/old.xlsx"}),
+                      get_log_entry("Browser.downloadWillBegin", {"url": "https://www.hsi.com.hk/static/hsci.xlsx"})]
+    assert updateHSCI.get_download_url(driver=logged_driver(log_entry_list), download_button=None) == \
+        "https://www.hsi.com.hk/static/hsci.xlsx"
+    # a file made in the page has no url to check
+    assert updateHSCI.get_download_url(driver=logged_driver([get_log_entry("Page.downloadWillBegin",
+                                                                            {"url": "blob:https://www.hsi.com.hk/1"})]),
+                                       download_button=None) is None
+    assert updateHSCI.get_download_url(driver=logged_driver([]), download_button=None) is None
+
+def test_trade_file_matches_baseline(tmp_path):
+    # columnar stages against the row by row stages of the baseline on the same parsed sheets
+    workbook_path = str(tmp_path / "hsci_hist_change.xlsx")
+    syntheticData.write_synthetic_change_workbook(file_path=workbook_path, row_num=3000, start_year=2012,
+                                                  end_year=2018, seed=0, date_num=40, stock_num=400)
+    main_file, sector_file = baselineReference.read_hsci_workbook(workbook_path)
+    for begin_business_day, end_business_day in [(60, 30), (5, 0)]:
+        trade_file = updateHSCI.get_hsci_trade_file(start_year=2013, end_year=2017,
+                                                    begin_business_day=begin_business_day,
+                                                    end_business_day=end_business_day,
+                                                    download_hsci_file_path=workbook_path,
+                                                    workbook_parse_workers=1).run()
+        baseline_trade_file = baselineReference.get_trade_file(
+            main_file=main_file, sector_file=sector_file, start_year=2013, end_year=2017,
+            begin_business_day=begin_business_day, end_business_day=end_business_day)
+        assert (trade_file["review_type"] == "Name Change").any() and (trade_file["review_type"] == "Regular").any()
+        pd.testing.assert_frame_equal(get_sorted_trade_file(trade_file), get_sorted_trade_file(baseline_trade_file),
+                                      check_dtype=False)
+
+def get_sorted_trade_file(trade_file):
+    # stock codes are text in the cached sheets and numbers in the workbook
+    trade_file = trade_file.copy()
+    trade_file["stock_code"] = trade_file["stock_code"].astype(str)
+    trade_file = trade_file[sorted(trade_file.columns)]
+    return trade_file.sort_values(["effective_date", "change", "stock_code", "stock_name"]).reset_index(drop=True)
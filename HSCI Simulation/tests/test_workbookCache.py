@@ -0,0 +1,45 @@
+import os
+import pandas as pd
+import baselineReference
+from func import workbookCache
+from benchmark import syntheticData
+
+def get_text_frame(df):
+    # numbers and text of one Excel column are both kept as text in the cache
+    df = df.reset_index(drop=True).copy()
+    for column in df.columns[df.dtypes == object]:
+        df[column] = df[column].where(df[column].isnull(), df[column].astype(str))
+    return df
+
+def test_workbook_cache_matches_baseline_parse(tmp_path, monkeypatch):
+    workbook_path = str(tmp_path / "hsci_hist_change.xlsx")
+    syntheticData.write_synthetic_change_workbook(file_path=workbook_path, row_num=300, seed=0)
+    cache_path = str(tmp_path / "Workbook Cache")
+    os.makedirs(cache_path)
+    baseline_main_file, baseline_sector_file = baselineReference.read_hsci_workbook(workbook_path)
+
+    # a miss parses the workbook, a hit reads the same frames back without opening Excel
+    frame_list = [workbookCache.read_hsci_workbook(file_path=workbook_path, cache_path=cache_path, max_workers=2)]
+    monkeypatch.setattr(workbookCache, "parse_hsci_workbook", lambda **kwargs: 1 / 0)
+    frame_list.append(workbookCache.read_hsci_workbook(file_path=workbook_path, cache_path=cache_path, max_workers=2))
+    for main_file, sector_file in frame_list:
+        pd.testing.assert_frame_equal(get_text_frame(main_file), get_text_frame(baseline_main_file))
+        pd.testing.assert_frame_equal(get_text_frame(sector_file), get_text_frame(baseline_sector_file))
+    assert baseline_sector_file["sector"].nunique() == len(syntheticData.sector_list)
+
+def test_workbook_cache_keeps_other_directories(tmp_path):
+    # entries of older workbooks are removed on a miss, anything else in the directory is left alone
+    cache_path = str(tmp_path)
+    old_hash_path = cache_path + "/" + "0" * 64
+    user_path = cache_path + "/Backup"
+    for path in [old_hash_path, user_path]:
+        os.makedirs(path)
+        with open(path + "/file.txt", "w") as f:
+            f.write("data")
+    workbook_path = str(tmp_path / "hsci_hist_change.xlsx")
+    syntheticData.write_synthetic_change_workbook(file_path=workbook_path, row_num=100, seed=1)
+    workbookCache.read_hsci_workbook(file_path=workbook_path, cache_path=cache_path, max_workers=1)
+
+    assert not os.path.exists(old_hash_path)
+    assert os.path.exists(user_path + "/file.txt")
+    assert os.path.isdir(cache_path + "/" + workbookCache.get_file_hash(workbook_path))